@@ -13,12 +13,16 @@ class RegimeOnlineTab(ttk.LabelFrame):
         ttk.Label(self, text="Out JSON:").grid(row=1, column=0, sticky="e", padx=6)
         ttk.Entry(self, textvariable=self.var_out, width=60).grid(row=1, column=1, sticky="we", padx=6)
         ttk.Button(self, text="Run", command=self._run).grid(row=1, column=2, padx=4)
+        self.var_follow = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self, text="Follow (tail features CSV)", variable=self.var_follow).grid(row=2, column=1, sticky="w", padx=6)
         self.grid_columnconfigure(1, weight=1)
     def _pick_in(self):
         p = filedialog.askopenfilename(title="Features CSV", filetypes=[("CSV","*.csv"),("All","*.*")])
         if p: self.var_in.set(p)
     def _run(self):
         cmd = f".venv\\Scripts\\python.exe -m elbotto_ob.regime.online --in {self.var_in.get()} --out {self.var_out.get()}"
+        if self.var_follow.get():
+            cmd += " --follow"
         try:
             subprocess.Popen(shlex.split(cmd))
             messagebox.showinfo("Regime", "Regime detector started.")
@@ -0,0 +1,143 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Mapping, Sequence
+
+import numpy as np
+
+# kolumny ważone czasem trwania snapshotu w barze
+TWAP_COLUMNS = ('microprice_imb', 'q_imb', 'depth_imbalance')
+BAR_COLUMNS = (
+    'ts', 'mid', 'spread', 'microprice', 'microprice_imb', 'q_imb', 'depth_imbalance', 'ofi', 'book_slope',
+    'mid_open', 'mid_high', 'mid_low', 'spread_max', 'n',
+)
+
+def ts_to_ms(values: Sequence[str]):
+    """Znaczniki czasu -> ms od epoki; liczby < 1e11 traktowane jako sekundy, reszta jako ISO."""
+    try:
+        t = np.asarray(values, dtype=np.float64)
+        return np.where(t < 1e11, t * 1000.0, t), True
+    except (TypeError, ValueError):
+        out = []
+        for v in values:
+            try:
+                dt = datetime.fromisoformat(str(v).replace('Z', '+00:00'))
+            except ValueError:
+                raise ValueError(f"niepoprawny znacznik czasu {v!r}: bary wymagają kolumny ts/timestamp") from None
+            if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
+            out.append(dt.timestamp() * 1000.0)
+        return np.asarray(out, dtype=np.float64), False
+
+def _format_ts(ms, numeric):
+    if numeric:
+        return str(int(ms))
+    return datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc).isoformat()
+
+class BarAggregator:
+    """Strumieniowa agregacja snapshotów cech do barów ``seconds``-sekundowych.
+
+    ``push`` przyjmuje blok cech (jak z ``compute_feature_columns``) o
+    niemalejących znacznikach czasu i zwraca zamknięte bary; wiersze otwartego baru czekają na kolejny blok, więc
+    pamięć nie zależy od długości wejścia. Semantyka kolumn: ``mid`` to
+    zamknięcie z OHLC (``mid_open/high/low``), ``spread`` średnia i
+    ``spread_max``, ``microprice`` ostatnia wartość, nierównowagi ważone
+    czasem trwania snapshotu, ``ofi`` suma przepływu w barze, ``book_slope``
+    średnia, ``n`` liczba snapshotów. ``ts`` to początek baru.
+    """
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("seconds musi być dodatnie")
+        self.bucket_ms = float(seconds) * 1000.0
+        self._pending: Dict[str, np.ndarray] | None = None
+        self._prev: Dict[str, float] | None = None
+        self._numeric = True
+
+    def push(self, feats: Mapping[str, object]) -> List[list]:
+        t, self._numeric = ts_to_ms(feats['ts'])
+        block = {name: np.asarray(feats[name], dtype=np.float64) for name in BAR_COLUMNS[1:9]}
+        block['_t'] = t
+        if self._pending is not None:
+            block = {name: np.concatenate((self._pending[name], block[name])) for name in block}
+        if not len(block['_t']):
+            return []
+        back = np.flatnonzero(np.diff(block['_t']) < 0)
+        if len(back):
+            raise ValueError(f"znaczniki czasu maleją ({block['_t'][back[0]]:.0f} -> {block['_t'][back[0] + 1]:.0f} ms)")
+        bucket = np.floor(block['_t'] / self.bucket_ms)
+        cut = int(np.searchsorted(bucket, bucket[-1], side='left'))
+        self._pending = {name: values[cut:] for name, values in block.items()}
+        if cut == 0:
+            return []
+        return self._emit({name: values[:cut] for name, values in block.items()}, float(block['_t'][cut]))
+
+    @property
+    def pending_rows(self) -> int:
+        """Liczba wierszy otwartego baru (jeszcze nie wyemitowanych)."""
+        return 0 if self._pending is None else len(self._pending['_t'])
+
+    def checkpoint(self) -> dict:
+        """Stan potrzebny do wznowienia od pierwszego wiersza otwartego baru."""
+        return {'prev': self._prev, 'numeric': self._numeric}
+
+    def restore(self, state: Mapping[str, object]) -> None:
+        self._prev = dict(state['prev']) if state.get('prev') else None
+        self._numeric = bool(state.get('numeric', True))
+        self._pending = None
+
+    def close(self) -> List[list]:
+        if self._pending is None or not len(self._pending['_t']):
+            return []
+        rows = self._emit(self._pending, None)
+        self._pending = None
+        return rows
+
+    def _emit(self, block: Dict[str, np.ndarray], next_ts: float | None) -> List[list]:
+        t = block['_t']
+        bucket = np.floor(t / self.bucket_ms)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+        ends = np.concatenate((starts[1:], [len(t)]))
+        counts = (ends - starts).astype(np.float64)
+        following = np.concatenate((t[1:], [np.nan if next_ts is None else next_ts]))
+        weights = np.nan_to_num(np.minimum(following, (bucket + 1) * self.bucket_ms) - t, nan=0.0)
+        weights = np.maximum(weights, 0.0)
+        bar_start = bucket[starts] * self.bucket_ms
+        lead = t[starts] - bar_start
+        has_prev = np.concatenate(([self._prev is not None], np.ones(len(starts) - 1, dtype=bool)))
+        lead = np.where(has_prev, lead, 0.0)
+
+        def total(values):
+            return np.add.reduceat(values, starts)
+
+        out = {
+            'mid': block['mid'][ends - 1],
+            'mid_open': block['mid'][starts],
+            'mid_high': np.maximum.reduceat(block['mid'], starts),
+            'mid_low': np.minimum.reduceat(block['mid'], starts),
+            'spread': total(block['spread']) / counts,
+            'spread_max': np.maximum.reduceat(block['spread'], starts),
+            'microprice': block['microprice'][ends - 1],
+            'ofi': total(block['ofi']),
+            'book_slope': total(block['book_slope']) / counts,
+            'n': counts,
+        }
+        weight_sum = total(weights) + lead
+        for name in TWAP_COLUMNS:
+            values = block[name]
+            previous = np.concatenate(([self._prev[name] if self._prev else 0.0], values[ends[:-1] - 1]))
+            weighted = total(values * weights) + previous * lead
+            mean = total(values) / counts
+            out[name] = np.divide(weighted, weight_sum, out=mean, where=weight_sum > 0)
+
+        self._prev = {name: float(block[name][-1]) for name in TWAP_COLUMNS}
+        columns = [[_format_ts(ms, self._numeric) for ms in bar_start.tolist()]]
+        columns += [out[name].tolist() if name != 'n' else out[name].astype(int).tolist() for name in BAR_COLUMNS[1:]]
+        return [list(row) for row in zip(*columns)]
+
+def aggregate_bars(feats: Mapping[str, object], seconds: float, batch_rows: int = 65536) -> Iterator[list]:
+    """Bary dla gotowego bloku cech, podawanego do agregatora partiami."""
+    agg = BarAggregator(seconds)
+    size = len(feats['ts'])
+    for start in range(0, size, batch_rows):
+        stop = min(size, start + batch_rows)
+        yield from agg.push({name: values[start:stop] for name, values in feats.items()})
+    yield from agg.close()
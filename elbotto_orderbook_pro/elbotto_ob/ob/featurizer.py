@@ -1,80 +1,258 @@
 from __future__ import annotations
-import argparse, csv, math
+import argparse, csv, io, itertools, json, math, os
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Mapping, Sequence
+
+import numpy as np
+
+from elbotto.data.recorder import RECORDING_SUFFIX, DepthRecording
+from elbotto_ob.ob.aggregate import BAR_COLUMNS, BarAggregator
+
+OUTPUT_COLUMNS = ('ts', 'mid', 'spread', 'microprice', 'microprice_imb', 'q_imb', 'depth_imbalance', 'ofi', 'book_slope')
+SLOPE_LEVELS = 5
 
 def microprice(b1, a1, q_bid, q_ask):
     if (q_bid+q_ask) <= 0: return (b1+a1)/2.0
     return (a1*q_bid + b1*q_ask)/(q_bid+q_ask)
 
+def _side_slope(prices, qty):
+    """Nachylenie MNK ceny względem skumulowanej ilości, wiersz po wierszu w formie zamkniętej.
+
+    Poziomy z ilością <= 0 są pomijane (jak w filtrze per wiersz); wiersze
+    z mniej niż dwoma poziomami mają nachylenie 0.
+    """
+    valid = qty > 0
+    n = valid.sum(axis=1)
+    x = np.cumsum(np.where(valid, qty, 0.0), axis=1)
+    safe_n = np.maximum(n, 1)
+    x_mean = np.where(valid, x, 0.0).sum(axis=1) / safe_n
+    y_mean = np.where(valid, prices, 0.0).sum(axis=1) / safe_n
+    dx = np.where(valid, x - x_mean[:, None], 0.0)
+    dy = np.where(valid, prices - y_mean[:, None], 0.0)
+    sxx = (dx * dx).sum(axis=1)
+    sxy = (dx * dy).sum(axis=1)
+    ok = (n >= 2) & (sxx > 0)
+    return np.divide(sxy, sxx, out=np.zeros_like(sxy), where=ok)
+
+def book_slope_matrix(bid_px, bid_qty, ask_px, ask_qty):
+    """Różnica nachyleń bid i ask dla macierzy (wiersze × poziomy)."""
+    return _side_slope(bid_px, bid_qty) - _side_slope(ask_px, ask_qty)
+
 def book_slope(levels: List[Dict[str,float]]):
     # linear fit of price vs cum_qty on bid/ask separately, return slope diff
-    import numpy as np
-    bids = [(l['bid_price'], l['bid_qty']) for l in levels if l['bid_qty']>0]
-    asks = [(l['ask_price'], l['ask_qty']) for l in levels if l['ask_qty']>0]
-    def slope(pairs):
-        if len(pairs) < 2: return 0.0
-        px = np.array([p for p,_ in pairs], dtype=float)
-        q  = np.array([q for _,q in pairs], dtype=float).cumsum()
-        X = np.vstack([q, np.ones_like(q)]).T
-        m, c = np.linalg.lstsq(X, px, rcond=None)[0]
-        return float(m)
-    return slope(bids) - slope(asks)
+    if not levels: return 0.0
+    def side(key):
+        return np.array([[l[f'{key}_price'] for l in levels]], dtype=float), np.array([[l[f'{key}_qty'] for l in levels]], dtype=float)
+    return float(book_slope_matrix(*side('bid'), *side('ask'))[0])
+
+def _to_float(values, default):
+    """Kolumna tekstowa -> float64; puste komórki dostają ``default`` (skalar lub kolumnę)."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.array([float(v) if v not in ('', None) else math.nan for v in values], dtype=np.float64)
+        missing = np.isnan(out)
+        if missing.any():
+            out[missing] = default[missing] if isinstance(default, np.ndarray) else default
+        return out
+
+def _pick(columns: Mapping[str, Sequence[str]], names: Sequence[str], default, size):
+    for name in names:
+        if name in columns:
+            return _to_float(columns[name], default)
+    if isinstance(default, np.ndarray):
+        return default
+    return np.full(size, float(default))
+
+def compute_feature_columns(columns: Mapping[str, Sequence[str]], levels=10) -> Dict[str, object]:
+    """Cechy dla całego bloku wierszy naraz; ``columns`` to kolumny tekstowe CSV.
+
+    Kolumny głębokości mapowane są raz do macierzy (wiersze × poziomy), a
+    mid/spread/microprice/nierównowagi i nachylenie księgi liczone wektorowo.
+    """
+    size = len(next(iter(columns.values()))) if columns else 0
+    b1 = _pick(columns, ('bid1', 'best_bid'), 0.0, size)
+    a1 = _pick(columns, ('ask1', 'best_ask'), 0.0, size)
+    q_bid = _pick(columns, ('bid1_qty', 'bid_qty1'), 0.0, size)
+    q_ask = _pick(columns, ('ask1_qty', 'ask_qty1'), 0.0, size)
+    mid = (b1+a1)/2.0
+    spread = np.maximum(0.0, a1-b1)
+    total = q_bid + q_ask
+    mp = mid.copy()
+    np.divide(a1*q_bid + b1*q_ask, total, out=mp, where=total > 0)
+
+    bid_qty = np.column_stack([_pick(columns, (f'bid{i}_qty', f'bid_qty{i}'), 0.0, size) for i in range(1, levels+1)]) if levels > 0 else np.zeros((size, 0))
+    ask_qty = np.column_stack([_pick(columns, (f'ask{i}_qty', f'ask_qty{i}'), 0.0, size) for i in range(1, levels+1)]) if levels > 0 else np.zeros((size, 0))
+    bsum = np.zeros(size); asum = np.zeros(size)
+    for i in range(levels):
+        bsum = bsum + bid_qty[:, i]
+        asum = asum + ask_qty[:, i]
+
+    depth = min(levels, SLOPE_LEVELS)
+    if depth > 0:
+        bid_px = np.column_stack([_pick(columns, (f'bid{i}', f'bid_price{i}'), b1, size) for i in range(1, depth+1)])
+        ask_px = np.column_stack([_pick(columns, (f'ask{i}', f'ask_price{i}'), a1, size) for i in range(1, depth+1)])
+        slope = book_slope_matrix(bid_px, bid_qty[:, :depth], ask_px, ask_qty[:, :depth])
+    else:
+        slope = np.zeros(size)
+
+    ts = columns.get('ts', columns.get('timestamp', [''] * size))
+    return {
+        'ts': list(ts),
+        'mid': mid, 'spread': spread, 'microprice': mp,
+        'microprice_imb': (mp - mid) / (spread + 1e-9),
+        'q_imb': (q_bid - q_ask) / (q_bid + q_ask + 1e-9),
+        'depth_imbalance': (bsum - asum) / (bsum + asum + 1e-9),
+        'ofi': _pick(columns, ('ofi',), 0.0, size),
+        'book_slope': slope,
+    }
+
+def rows_to_columns(header: Sequence[str], rows: Sequence[Sequence[str]]) -> Dict[str, Sequence[str]]:
+    width = len(header)
+    rows = [r if len(r) == width else (list(r) + [''] * width)[:width] for r in rows]
+    if not rows:
+        return {name: () for name in header}
+    return dict(zip(header, zip(*rows)))
+
+def read_columns(path) -> Dict[str, Sequence[str]]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rd = csv.reader(f)
+        header = next(rd, [])
+        return rows_to_columns(header, list(rd))
+
+def feature_rows(feats: Mapping[str, object]):
+    """Wiersze wyjściowe (listy) w kolejności ``OUTPUT_COLUMNS``."""
+    cols = [feats[name] if name == 'ts' else feats[name].tolist() for name in OUTPUT_COLUMNS]
+    return zip(*cols)
 
 def compute_features(rows: List[Dict[str,str]], levels=10):
-    out = []
-    for r in rows:
-        b1 = float(r.get('bid1', r.get('best_bid', 0.0))); a1 = float(r.get('ask1', r.get('best_ask', 0.0)))
-        mid = (b1+a1)/2.0; spread = max(0.0, a1-b1)
-        q_bid = float(r.get('bid1_qty', r.get('bid_qty1', 0.0))); q_ask = float(r.get('ask1_qty', r.get('ask_qty1', 0.0)))
-        mp = microprice(b1,a1,q_bid,q_ask)
-        # depth imbalance (top-N)
-        bsum = 0.0; asum = 0.0
-        for i in range(1, levels+1):
-            bsum += float(r.get(f'bid{i}_qty', r.get(f'bid_qty{i}', 0.0)) or 0.0)
-            asum += float(r.get(f'ask{i}_qty', r.get(f'ask_qty{i}', 0.0)) or 0.0)
-        dib = (bsum - asum) / (bsum + asum + 1e-9)
-        # queue imbalance top1
-        q_imb = (q_bid - q_ask) / (q_bid + q_ask + 1e-9)
-        # microprice imbalance
-        mp_imb = (mp - mid) / (spread + 1e-9)
-        # order flow imbalance (naive, requires last trade volumes – if absent, use delta top qty)
-        ofi = float(r.get('ofi', 0.0))
-        # book slope diff
-        lvl = []
-        for i in range(1, min(levels,5)+1):
-            lvl.append({
-                'bid_price': float(r.get(f'bid{i}', r.get(f'bid_price{i}', b1)) or b1),
-                'bid_qty': float(r.get(f'bid{i}_qty', r.get(f'bid_qty{i}', 0.0)) or 0.0),
-                'ask_price': float(r.get(f'ask{i}', r.get(f'ask_price{i}', a1)) or a1),
-                'ask_qty': float(r.get(f'ask{i}_qty', r.get(f'ask_qty{i}', 0.0)) or 0.0),
+    header = list(rows[0].keys()) if rows else []
+    feats = compute_feature_columns(rows_to_columns(header, [[r.get(k) if r.get(k) is not None else '' for k in header] for r in rows]), levels=levels)
+    return [dict(zip(OUTPUT_COLUMNS, row)) for row in feature_rows(feats)]
+
+def iter_column_batches(path, batch_rows=50_000, offset=0):
+    """Czyta CSV partiami po ``batch_rows`` wierszy, bez wczytywania całego pliku.
+
+    Zwraca ``(kolumny, granice)``: ``granice[i]`` to bajtowy offset początku
+    i-tego wiersza partii, a ``granice[-1]`` koniec partii. ``offset`` (za
+    nagłówkiem) wznawia odczyt od początku wskazanej linii.
+    """
+    with open(path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+        if offset > f.tell():
+            f.seek(offset)
+        pos = f.tell()
+        while True:
+            lines = list(itertools.islice(f, batch_rows))
+            if not lines:
+                return
+            bounds = list(itertools.accumulate((len(line) for line in lines), initial=pos))
+            pos = bounds[-1]
+            rows = list(csv.reader(line.decode('utf-8') for line in lines))
+            keep = [i for i, row in enumerate(rows) if row]
+            if len(keep) != len(rows):
+                rows = [rows[i] for i in keep]; bounds = [bounds[i] for i in keep] + [pos]
+            yield rows_to_columns(header, rows), bounds
+
+def iter_batches(path, batch_rows=50_000, offset=0):
+    """Partie z CSV albo z nagrania ``.elbrec`` (bez parsowania tekstu; ``offset`` to wtedy numer wiersza)."""
+    if str(path).endswith(RECORDING_SUFFIX):
+        with DepthRecording(path) as rec:
+            yield from rec.iter_batches(batch_rows, offset)
+    else:
+        yield from iter_column_batches(path, batch_rows, offset)
+
+def has_timestamps(path) -> bool:
+    """Czy wejście ma kolumnę ``ts``/``timestamp`` (nagrania ``.elbrec`` zawsze mają)."""
+    if str(path).endswith(RECORDING_SUFFIX):
+        return True
+    with open(path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+    return 'ts' in header or 'timestamp' in header
+
+def _write_state(path, state):
+    tmp = Path(str(path) + '.tmp')
+    tmp.write_text(json.dumps(state), encoding='utf-8')
+    os.replace(tmp, path)
+
+def _encode_rows(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+def featurize_file(infile, outfile, levels=10, agg_sec=0.0, batch_rows=50_000, state_path=None, resume=False):
+    """Strumieniowe cechy ``infile`` -> ``outfile`` przy stałej pamięci.
+
+    ``agg_sec > 0`` składa snapshoty w bary (kolumny ``BAR_COLUMNS``, wymaga
+    znaczników czasu); domyślnie zapisywane są surowe ``OUTPUT_COLUMNS``.
+    Po każdej partii wyjście jest zrzucane na dysk, a do ``state_path``
+    (domyślnie ``<out>.state``) trafia punkt kontrolny: offset wejścia
+    (początek otwartego baru), rozmiar wyjścia i stan agregatora.
+    ``resume=True`` przycina wyjście do zapisanego rozmiaru i czyta dalej od
+    offsetu, więc po przerwaniu nic się nie dubluje. Ostatni bar zapisany
+    przy zamknięciu leży za punktem kontrolnym, dlatego wznowienie na
+    dopisanym pliku policzy go ponownie z kompletem wierszy.
+    """
+    state_path = Path(state_path) if state_path else Path(str(outfile) + '.state')
+    agg = BarAggregator(agg_sec) if agg_sec > 0 else None
+    if agg is not None and not has_timestamps(infile):
+        raise ValueError(f"{infile}: brak kolumny ts/timestamp – bary wymagają czasu (agg_sec=0 zapisuje surowe snapshoty)")
+    state = None
+    if resume and state_path.exists() and Path(outfile).exists():
+        state = json.loads(state_path.read_text(encoding='utf-8'))
+        if state.get('infile') != str(infile) or state.get('agg_sec') != agg_sec or state.get('levels') != levels:
+            raise ValueError(f"punkt kontrolny {state_path} dotyczy innego przebiegu")
+    safe, rows_out = (state['offset'], state['rows']) if state else (0, 0)
+    with open(outfile, 'r+b' if state else 'wb') as out:
+        if state:
+            out.truncate(state['out_size']); out.seek(state['out_size'])
+            if agg is not None: agg.restore(state['aggregator'])
+        else:
+            out.write(_encode_rows([BAR_COLUMNS if agg is not None else OUTPUT_COLUMNS]))
+        for cols, bounds in iter_batches(infile, batch_rows, safe):
+            feats = compute_feature_columns(cols, levels=levels)
+            if agg is None:
+                out_rows = list(feature_rows(feats)); safe = bounds[-1]
+            else:
+                out_rows = agg.push(feats)
+                size = len(bounds) - 1
+                if agg.pending_rows <= size: safe = bounds[size - agg.pending_rows]
+            out.write(_encode_rows(out_rows)); rows_out += len(out_rows)
+            out.flush(); os.fsync(out.fileno())
+            _write_state(state_path, {
+                'infile': str(infile), 'levels': levels, 'agg_sec': agg_sec,
+                'offset': safe, 'out_size': out.tell(), 'rows': rows_out,
+                'aggregator': agg.checkpoint() if agg is not None else None,
             })
-        slope = book_slope(lvl) if lvl else 0.0
-        out.append({
-            'ts': r.get('ts', r.get('timestamp', '')),
-            'mid': mid, 'spread': spread, 'microprice': mp, 'microprice_imb': mp_imb,
-            'q_imb': q_imb, 'depth_imbalance': dib, 'ofi': ofi, 'book_slope': slope
-        })
-    return out
+        if agg is not None:
+            tail = agg.close()
+            out.write(_encode_rows(tail)); rows_out += len(tail)
+    return rows_out
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--in', dest='infile', required=True, help='CSV z L2/L3 (kolumny: bid1,ask1,bid1_qty,ask1_qty, ... )')
+    ap.add_argument('--in', dest='infile', required=True, help='CSV z L2/L3 (kolumny: bid1,ask1,bid1_qty,ask1_qty, ... ) albo nagranie .elbrec')
     ap.add_argument('--out', dest='outfile', required=True, help='CSV z cechami')
     ap.add_argument('--levels', type=int, default=10)
-    ap.add_argument('--agg-sec', type=int, default=1, help='agregacja do n sekund (opcjonalnie)')
+    ap.add_argument('--agg-sec', type=float, default=0, help='agregacja do barów n-sekundowych (kolumny barów; 0 = surowe snapshoty)')
+    ap.add_argument('--batch-rows', type=int, default=50_000, help='wiersze wejścia na partię (ogranicza pamięć)')
+    ap.add_argument('--state', default=None, help='plik punktu kontrolnego (domyślnie <out>.state)')
+    ap.add_argument('--resume', action='store_true', help='wznów od punktu kontrolnego')
+    ap.add_argument('--workers', type=int, default=None, help='procesy dla katalogu/glob z plikami godzinnymi')
     args = ap.parse_args()
 
-    rows = []
-    with open(args.infile, 'r', encoding='utf-8') as f:
-        rd = csv.DictReader(f)
-        for r in rd:
-            rows.append(r)
-    feats = compute_features(rows, levels=args.levels)
-    with open(args.outfile, 'w', encoding='utf-8', newline='') as f:
-        w = csv.DictWriter(f, fieldnames=list(feats[0].keys()))
-        w.writeheader(); w.writerows(feats)
-    print("[OB] wrote", args.outfile)
+    try:
+        if Path(args.infile).is_dir() or any(c in args.infile for c in '*?['):
+            from elbotto_ob.ob.hourly import featurize_hourly
+            for path in featurize_hourly(args.infile, args.outfile, levels=args.levels, agg_sec=args.agg_sec,
+                                         workers=args.workers, batch_rows=args.batch_rows):
+                print("[OB] wrote", path)
+            return
+        rows = featurize_file(args.infile, args.outfile, levels=args.levels, agg_sec=args.agg_sec,
+                              batch_rows=args.batch_rows, state_path=args.state, resume=args.resume)
+    except ValueError as e:
+        ap.error(str(e))
+    print("[OB] wrote", args.outfile, f"({rows} rows)")
 
 if __name__ == '__main__':
     main()
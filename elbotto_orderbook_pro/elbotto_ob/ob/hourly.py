@@ -0,0 +1,175 @@
+from __future__ import annotations
+import csv, glob, math, os, re, shutil, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from elbotto_ob.ob.aggregate import BAR_COLUMNS, BarAggregator, ts_to_ms
+from elbotto_ob.ob.featurizer import (
+    OUTPUT_COLUMNS, _encode_rows, compute_feature_columns, feature_rows, has_timestamps, iter_column_batches, rows_to_columns,
+)
+
+# nazwy plików rotowanych przez live_allinone.py: {SYMBOL}_depth{N}_{YYYYMMDD_HH}.csv
+HOURLY_PATTERN = re.compile(r'^(?P<symbol>[A-Za-z0-9]+)_depth(?P<depth>\d+)_(?P<hour>\d{8}_\d{2})$')
+
+def collect_files(source) -> Dict[str, List[Path]]:
+    """Pliki CSV z katalogu albo wzorca glob, pogrupowane po ``{SYMBOL}_depth{N}`` w kolejności godzin."""
+    src = Path(source)
+    paths = sorted(src.glob('*.csv')) if src.is_dir() else sorted(Path(p) for p in glob.glob(str(source)))
+    groups: Dict[str, List[Path]] = {}
+    for p in paths:
+        m = HOURLY_PATTERN.match(p.stem)
+        groups.setdefault(f"{m['symbol'].upper()}_depth{m['depth']}" if m else p.stem, []).append(p)
+    return groups
+
+def _header(f):
+    return next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+
+def _ts_index(header):
+    for name in ('ts', 'timestamp'):
+        if name in header: return header.index(name)
+    return None
+
+def tail_columns(path, count):
+    """Ostatnie ``count`` wierszy pliku jako kolumny (czytane od końca, bez skanu całości)."""
+    with open(path, 'rb') as f:
+        header = _header(f); start = f.tell()
+        pos = f.seek(0, os.SEEK_END); data = b''; block = 4096
+        while pos > start and data.count(b'\n') <= count:
+            step = min(block, pos - start); pos -= step; block *= 2
+            f.seek(pos); data = f.read(step) + data
+    lines = data.split(b'\n')
+    if pos > start: lines = lines[1:]
+    rows = [r for r in csv.reader(l.decode('utf-8') for l in lines if l.strip())][-count:] if count > 0 else []
+    return rows_to_columns(header, rows)
+
+def _bucket(ts, bucket_ms):
+    return float(np.floor(ts_to_ms([ts])[0][0] / bucket_ms))
+
+def lookahead_columns(paths: Sequence[Path], last_bucket, bucket_ms):
+    """Wiersze kolejnych plików należące do ostatniego baru plus pierwszy wiersz następnego.
+
+    Domykają bar przecinający granicę pliku i wyznaczają czas trwania jego
+    ostatniego snapshotu.
+    """
+    blocks = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            header = _header(f); idx = _ts_index(header); rows = []
+            if idx is None: continue
+            for line in f:
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if not row: continue
+                rows.append(row)
+                if _bucket(row[idx], bucket_ms) > last_bucket:
+                    blocks.append(rows_to_columns(header, rows))
+                    return blocks
+            if rows: blocks.append(rows_to_columns(header, rows))
+    return blocks
+
+def featurize_segment(path, out_path, levels=10, agg_sec=0.0, batch_rows=50_000, warmup=None, lookahead=()):
+    """Cechy jednego pliku godzinnego; ``warmup``/``lookahead`` to kolumny z sąsiednich plików.
+
+    Rozgrzewka (ogon poprzedniego pliku) ustawia stan agregatora, a wiersze
+    następnych plików domykają ostatni bar, więc bary na granicy godzin są
+    identyczne jak przy jednym ciągłym strumieniu. Zapisywane są tylko bary,
+    których pierwszy snapshot leży w tym pliku. Zwraca liczbę wierszy.
+    """
+    with open(out_path, 'wb') as out:
+        if agg_sec <= 0:
+            out.write(_encode_rows([OUTPUT_COLUMNS])); n = 0
+            for cols, _ in iter_column_batches(path, batch_rows):
+                rows = list(feature_rows(compute_feature_columns(cols, levels=levels)))
+                out.write(_encode_rows(rows)); n += len(rows)
+            return n
+
+        agg = BarAggregator(agg_sec)
+        out.write(_encode_rows([BAR_COLUMNS]))
+        lo = hi = -math.inf; n = 0
+
+        def write(rows):
+            nonlocal n
+            if not rows: return
+            buckets = np.floor(ts_to_ms([r[0] for r in rows])[0] / agg.bucket_ms)
+            kept = [r for r, b in zip(rows, buckets) if lo < b <= hi]
+            out.write(_encode_rows(kept)); n += len(kept)
+
+        if warmup:
+            feats = compute_feature_columns(warmup, levels=levels)
+            if feats['ts']:
+                agg.push(feats); lo = _bucket(feats['ts'][-1], agg.bucket_ms)
+        for cols, _ in iter_column_batches(path, batch_rows):
+            feats = compute_feature_columns(cols, levels=levels)
+            if feats['ts']: hi = _bucket(feats['ts'][-1], agg.bucket_ms)
+            write(agg.push(feats))
+        for cols in lookahead:
+            write(agg.push(compute_feature_columns(cols, levels=levels)))
+        write(agg.close())
+    return n
+
+def _segment_task(args):
+    path, out_path, kwargs = args
+    return featurize_segment(path, out_path, **kwargs)
+
+def featurize_hourly(source, out, levels=10, agg_sec=0.0, workers=None, batch_rows=50_000, warmup_rows=1):
+    """Featurizacja wielu plików godzinnych w puli procesów.
+
+    ``out`` zakończone na ``.csv`` daje jeden scalony plik na grupę
+    (``{group}`` w ścieżce zastępowane prefiksem ``{SYMBOL}_depth{N}``,
+    wymagane przy kilku grupach); w przeciwnym razie to katalog na pliki
+    ``<nazwa>_features.csv`` dla każdej godziny. Zwraca zapisane ścieżki.
+    """
+    groups = collect_files(source)
+    if not groups:
+        raise FileNotFoundError(f"brak plików CSV dla {source}")
+    out = str(out)
+    merged = out.lower().endswith('.csv')
+    if merged and len(groups) > 1 and '{group}' not in out:
+        raise ValueError("kilka grup plików: dodaj {group} do ścieżki wyjścia albo podaj katalog")
+    if agg_sec > 0:
+        missing = [str(p) for paths in groups.values() for p in paths if not has_timestamps(p)]
+        if missing:
+            raise ValueError(f"brak kolumny ts/timestamp – bary wymagają czasu (agg_sec=0 zapisuje surowe snapshoty): {missing[0]}")
+
+    tmp = Path(tempfile.mkdtemp(prefix='elbotto_ob_')) if merged else None
+    out_dir = None if merged else Path(out)
+    if out_dir: out_dir.mkdir(parents=True, exist_ok=True)
+    tasks, parts = [], {}
+    for key, paths in groups.items():
+        bucket_ms = agg_sec * 1000.0
+        warm = None
+        for i, path in enumerate(paths):
+            kwargs = {'levels': levels, 'agg_sec': agg_sec, 'batch_rows': batch_rows}
+            tail = tail_columns(path, max(1, warmup_rows)) if agg_sec > 0 else {}
+            ts = tail.get('ts', tail.get('timestamp', ()))
+            if agg_sec > 0:
+                kwargs['warmup'] = warm
+                if ts: kwargs['lookahead'] = lookahead_columns(paths[i+1:], _bucket(ts[-1], bucket_ms), bucket_ms)
+                if ts: warm = tail
+            part = (tmp / f'{key}_{i:05d}.csv') if merged else out_dir / f'{path.stem}_features.csv'
+            parts.setdefault(key, []).append(part)
+            tasks.append((str(path), str(part), kwargs))
+
+    try:
+        if workers is not None and workers <= 1:
+            list(map(_segment_task, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_segment_task, tasks))
+        if not merged:
+            return [p for key in parts for p in parts[key]]
+        written = []
+        for key, files in parts.items():
+            target = Path(out.replace('{group}', key))
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, 'wb') as dst:
+                for j, part in enumerate(files):
+                    with open(part, 'rb') as src:
+                        if j: src.readline()
+                        shutil.copyfileobj(src, dst)
+            written.append(target)
+        return written
+    finally:
+        if tmp: shutil.rmtree(tmp, ignore_errors=True)
@@ -1,6 +1,9 @@
-import argparse, time, json, csv, statistics
+import argparse, json, csv, math, os, time
 from pathlib import Path
-from collections import deque
+
+from elbotto.microstructure.rolling import RollingMoments, RollingQuantile
+
+STATE_KEYS = ("rv", "spread_p80", "ofi_var")
 
 def classify(rv, spread_p, ofi_var):
     if rv > 2.0 or ofi_var > 1.0: return "high_vol"
@@ -8,38 +11,146 @@ def classify(rv, spread_p, ofi_var):
     if rv < 0.5 and ofi_var < 0.2: return "calm"
     return "trending"
 
+class RegimeTracker:
+    """Kroczące rv / p80 spreadu / wariancja OFI, O(1) na tick (bez sortowania okna)."""
+
+    def __init__(self, window=300):
+        self.rv = RollingMoments(window)
+        self.ofi_var = RollingMoments(window)
+        self.spread_p80 = RollingQuantile(window, 0.8)
+        self.last_mid = None
+        self.last_ofi = None
+        self.ticks = 0
+
+    def push(self, mid, spread, ofi):
+        self.ticks += 1
+        self.spread_p80.push(spread)
+        if self.last_mid is not None:
+            ret = (mid - self.last_mid) / (self.last_mid + 1e-9)
+            self.rv.push(ret * ret)
+            self.ofi_var.push((ofi - self.last_ofi) ** 2)
+        self.last_mid, self.last_ofi = mid, ofi
+
+    def push_row(self, row):
+        self.push(float(row.get("mid", 0) or 0), float(row.get("spread", 0) or 0), float(row.get("ofi", 0) or 0))
+
+    def state(self):
+        st = {
+            "rv": self.rv.mean,
+            "spread_p80": self.spread_p80.value,
+            "ofi_var": self.ofi_var.mean,
+        }
+        st["regime"] = classify(st["rv"], st["spread_p80"], st["ofi_var"])
+        return st
+
+class RegimeEngine:
+    """Długo działający detektor: ticki z ``push`` lub z ogona pliku cech.
+
+    ``regime_state.json`` jest nadpisywany (atomowo) tylko gdy zmienia się
+    klasyfikacja albo któraś wartość odchodzi od ostatnio zapisanej o więcej
+    niż ``tolerance`` (względnie).
+    """
+
+    def __init__(self, out_path, window=300, tolerance=0.05, abs_tol=1e-12):
+        self.out_path = Path(out_path)
+        self.tracker = RegimeTracker(window)
+        self.tolerance = tolerance
+        self.abs_tol = abs_tol
+        self.written = None
+        self.writes = 0
+
+    def push(self, mid, spread, ofi):
+        self.tracker.push(mid, spread, ofi)
+        return self.maybe_write()
+
+    def push_row(self, row):
+        self.tracker.push_row(row)
+        return self.maybe_write()
+
+    def changed(self, state):
+        if self.written is None or state["regime"] != self.written["regime"]:
+            return True
+        return any(
+            not math.isclose(state[k], self.written[k], rel_tol=self.tolerance, abs_tol=self.abs_tol)
+            for k in STATE_KEYS
+        )
+
+    def maybe_write(self, force=False):
+        state = self.tracker.state()
+        if not force and not self.changed(state):
+            return False
+        state["ticks"] = self.tracker.ticks
+        state["ts"] = time.time()
+        self.out_path.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self.out_path.with_name(self.out_path.name + ".tmp")
+        tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(tmp, self.out_path)
+        self.written = state
+        self.writes += 1
+        return True
+
+def tail_csv_rows(path, poll_sec=0.5, follow=True, stop=None):
+    """Zwraca wiersze CSV jako słowniki; przy ``follow`` czeka na dopisywane linie.
+
+    Niepełna ostatnia linia jest buforowana do czasu dopisania ``\\n``;
+    skrócenie pliku (rotacja) powoduje odczyt od początku z nowym nagłówkiem.
+    """
+    path = Path(path)
+    header = None; buf = b""; pos = 0
+    while True:
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = None
+        if size is not None and size < pos:
+            header = None; buf = b""; pos = 0
+        if size is not None and size > pos:
+            with open(path, "rb") as f:
+                f.seek(pos)
+                chunk = f.read()
+            pos += len(chunk)
+            lines = (buf + chunk).split(b"\n")
+            buf = lines.pop()
+            for raw in lines:
+                line = raw.decode("utf-8").rstrip("\r")
+                if not line:
+                    continue
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = values
+                    continue
+                yield dict(zip(header, values))
+        if not follow or (stop is not None and stop()):
+            return
+        time.sleep(poll_sec)
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--in", dest="feat_csv", required=True)
     ap.add_argument("--out", dest="out_json", default="results/regime_state.json")
     ap.add_argument("--window", type=int, default=300, help="rolling window (rows)")
+    ap.add_argument("--follow", action="store_true", help="śledź dopisywane wiersze (tail -f)")
+    ap.add_argument("--tolerance", type=float, default=0.05, help="względna zmiana wymuszająca zapis")
+    ap.add_argument("--poll-sec", type=float, default=0.5)
     a = ap.parse_args()
 
-    rows = []
-    with open(a.feat_csv, "r", encoding="utf-8") as f:
-        rd = csv.DictReader(f)
-        for r in rd: rows.append(r)
-    mid = [float(r.get("mid",0)) for r in rows]
-    spread = [float(r.get("spread",0)) for r in rows]
-    ofi = [float(r.get("ofi",0)) for r in rows]
-
-    out = Path(a.out_json); out.parent.mkdir(exist_ok=True, parents=True)
-    rv = []; ofivar = []
-    for i in range(1,len(mid)):
-        ret = (mid[i]-mid[i-1])/(mid[i-1]+1e-9)
-        rv.append(ret*ret)
-        ofivar.append((ofi[i]-ofi[i-1])**2)
-    def pct(v):
-        if not v: return 0.0
-        x = sorted(v); return x[int(0.8*(len(x)-1))]
-    state = {
-        "rv": sum(rv[-a.window:])/max(1,len(rv[-a.window:])),
-        "spread_p80": pct(spread[-a.window:]),
-        "ofi_var": sum(ofivar[-a.window:])/max(1,len(ofivar[-a.window:])),
-    }
-    state["regime"] = classify(state["rv"], state["spread_p80"], state["ofi_var"])
-    out.write_text(json.dumps(state, indent=2), encoding="utf-8")
-    print("[REGIME]", state)
+    engine = RegimeEngine(a.out_json, window=a.window, tolerance=a.tolerance)
+    if not a.follow:
+        with open(a.feat_csv, "r", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                engine.tracker.push_row(r)
+        engine.maybe_write(force=True)
+        print("[REGIME]", engine.written)
+        return
+
+    last = None
+    try:
+        for r in tail_csv_rows(a.feat_csv, poll_sec=a.poll_sec):
+            if engine.push_row(r) and engine.written["regime"] != last:
+                last = engine.written["regime"]
+                print("[REGIME]", engine.written)
+    except KeyboardInterrupt:
+        engine.maybe_write(force=True)
 
 if __name__ == "__main__":
     main()
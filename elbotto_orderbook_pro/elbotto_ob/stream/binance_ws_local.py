@@ -0,0 +1,211 @@
+"""
+Lokalna atrapa serwera WebSocket Binance: nagrane snapshoty (``data/live/*.csv`` / ``*.elbrec``)
+wysyłane jako ramki ``@depthN@100ms`` i ``@bookTicker`` – do testów reconnectu, dekodowania i opóźnień bez sieci.
+
+  python -m elbotto_ob.stream.binance_ws_local --in data/live --port 8765 --rate 100 --disconnect-every 30
+  python live_allinone.py --symbol BTCUSDT --ws-base ws://127.0.0.1:8765
+"""
+from __future__ import annotations
+import argparse, asyncio, glob, json, math, random, re, time
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from elbotto_ob.ob.featurizer import iter_batches
+
+# {SYMBOL}_depth{N}_{YYYYMMDD[_HH]}.csv|.elbrec z live_allinone.py
+RECORDING_NAME = re.compile(r'^(?P<symbol>[A-Za-z0-9]+)_depth\d+_')
+STREAM_NAME = re.compile(r'^(?P<symbol>[a-z0-9]+)@(?:depth(?P<depth>5|10|20)(?:@(?P<ms>100|1000)ms)?|(?P<ticker>bookTicker))$')
+
+Book = Tuple[List[List[str]], List[List[str]]]
+
+def collect_recordings(source) -> Dict[str, List[Path]]:
+    """Nagrania z pliku, katalogu albo wzorca glob, pogrupowane po parze (kolejność nazw = kolejność godzin)."""
+    src = Path(source)
+    if src.is_dir():
+        paths = sorted(p for p in src.iterdir() if p.suffix in ('.csv', '.elbrec'))
+    else:
+        paths = [src] if src.is_file() else sorted(Path(p) for p in glob.glob(str(source)))
+    groups: Dict[str, List[Path]] = {}
+    for p in paths:
+        if p.suffix not in ('.csv', '.elbrec'): continue
+        m = RECORDING_NAME.match(p.name)
+        groups.setdefault((m['symbol'] if m else p.stem).upper(), []).append(p)
+    if not groups:
+        raise FileNotFoundError(f"brak nagrań dla {source}")
+    return groups
+
+def iter_books(paths: Sequence[Path], batch_rows=10_000) -> Iterator[Book]:
+    """Snapshoty jako listy ``[cena, ilość]`` w tekstowym formacie Binance (8 miejsc); puste poziomy pominięte."""
+    for path in paths:
+        for cols, _ in iter_batches(path, batch_rows):
+            depth = sum(1 for k in cols if re.fullmatch(r'bid\d+', k))
+            names = [f'{side}{i+1}{suffix}' for side in ('bid', 'ask') for suffix in ('', '_qty') for i in range(depth)]
+            for row in zip(*(cols[n] for n in names)):
+                v = [float(x) if x != '' else 0.0 for x in row]
+                bids = [[f'{p:.8f}', f'{q:.8f}'] for p, q in zip(v[:depth], v[depth:2*depth]) if p]
+                asks = [[f'{p:.8f}', f'{q:.8f}'] for p, q in zip(v[2*depth:3*depth], v[3*depth:]) if p]
+                if bids and asks:
+                    yield bids, asks
+
+def parse_streams(path: str) -> Tuple[List[str], bool]:
+    """Nazwy strumieni z URL-a: ``/ws/a/b`` (surowe ramki) albo ``/stream?streams=a/b`` (``{"stream", "data"}``)."""
+    url = urlsplit(path)
+    if url.path.rstrip('/') == '/stream':
+        names = '/'.join(parse_qs(url.query).get('streams', [])).split('/')
+        combined = True
+    elif url.path.startswith('/ws/'):
+        names = url.path[4:].split('/')
+        combined = False
+    else:
+        raise ValueError(f"nieznana ścieżka: {path}")
+    names = [n for n in names if n]
+    bad = [n for n in names if not STREAM_NAME.match(n)]
+    if not names or bad:
+        raise ValueError(f"niepoprawne strumienie: {bad or path}")
+    return names, combined
+
+class StreamFeed:
+    """Kolejne ramki jednego strumienia: snapshoty nagrania w pętli, ``lastUpdateId``/``u`` rosnące.
+
+    Z prawdopodobieństwem ``stale_prob`` zamiast nowej ramki idzie ponownie
+    poprzednia (ten sam ``lastUpdateId``, stara księga) – jak spóźniony duplikat.
+    """
+
+    def __init__(self, name, paths, rate=10.0, loop=True, stale_prob=0.0, event_time=False, combined=False, rng=None):
+        m = STREAM_NAME.match(name)
+        self.name, self.symbol = name, m['symbol'].upper()
+        self.depth = int(m['depth']) if m['depth'] else None
+        # @depthN bez @100ms to na Binance ramka co 1000 ms
+        self.interval = 1.0 / rate * (10.0 if self.depth and m['ms'] != '100' else 1.0)
+        self.paths, self.loop, self.stale_prob = list(paths), loop, stale_prob
+        self.event_time, self.combined = event_time, combined
+        self.rng = rng or random.Random(0)
+        self.books = iter_books(self.paths)
+        self.update_id = 1000
+        self.last = None
+        self.next_at = 0.0
+        self.sent = self.stale = 0
+
+    def _book(self):
+        book = next(self.books, None)
+        if book is None and self.loop:
+            self.books = iter_books(self.paths)
+            book = next(self.books, None)
+        return book
+
+    def payload(self, bids, asks):
+        self.update_id += 1
+        if self.depth is None:
+            return {'u': self.update_id, 's': self.symbol, 'b': bids[0][0], 'B': bids[0][1], 'a': asks[0][0], 'A': asks[0][1]}
+        data = {'lastUpdateId': self.update_id, 'bids': bids[:self.depth], 'asks': asks[:self.depth]}
+        if self.event_time:
+            data = {'E': int(time.time() * 1000), **data}
+        return data
+
+    def next_message(self):
+        """Tekst kolejnej ramki albo None, gdy nagranie się skończyło (``loop=False``)."""
+        if self.last is not None and self.stale_prob > 0 and self.rng.random() < self.stale_prob:
+            self.stale += 1; self.sent += 1
+            return self.last
+        book = self._book()
+        if book is None:
+            return None
+        data = self.payload(*book)
+        self.last = json.dumps({'stream': self.name, 'data': data} if self.combined else data, separators=(',', ':'))
+        self.sent += 1
+        return self.last
+
+class LocalBinanceServer:
+    """Serwer atrapy: każde połączenie dostaje własne strumienie z nagrań ``recordings`` (para -> pliki).
+
+    ``rate`` to ramki/s strumienia ``@100ms`` i ``@bookTicker`` (Binance: 10);
+    co ``burst_every`` s każdy strumień wysyła dodatkowo ``burst_size`` ramek
+    naraz, a po ``disconnect_every`` s połączenie jest zamykane (kod 1001).
+    Pary bez nagrania dostają dane pierwszego z nich – wygodne przy testach
+    obciążenia wieloma symbolami.
+    """
+
+    def __init__(self, recordings: Dict[str, List[Path]], rate=10.0, burst_every=0.0, burst_size=0, disconnect_every=0.0,
+                 stale_prob=0.0, loop=True, event_time=False, seed=0):
+        self.recordings = {k.upper(): v for k, v in recordings.items()}
+        self.fallback = next(iter(self.recordings.values()))
+        self.rate, self.burst_every, self.burst_size = rate, burst_every, burst_size
+        self.disconnect_every, self.stale_prob, self.loop, self.event_time = disconnect_every, stale_prob, loop, event_time
+        self.rng = random.Random(seed)
+        self.connections = 0
+
+    def feeds(self, names, combined):
+        return [StreamFeed(n, self.recordings.get(STREAM_NAME.match(n)['symbol'].upper(), self.fallback), self.rate, self.loop,
+                           self.stale_prob, self.event_time, combined, random.Random(self.rng.random())) for n in names]
+
+    async def handler(self, ws, path=None):
+        path = path or getattr(ws, 'path', None) or ws.request.path
+        try:
+            names, combined = parse_streams(path)
+        except ValueError as e:
+            await ws.close(1008, str(e)[:120]); return
+        self.connections += 1
+        conn = self.connections
+        feeds = self.feeds(names, combined)
+        print(f"[LOCAL-WS] #{conn} {path} ({len(feeds)} strumieni)")
+        try:
+            reason = await self.send_loop(ws, feeds)
+        except Exception as e:  # klient rozłączył się sam
+            reason = f"klient: {e.__class__.__name__}"
+        print(f"[LOCAL-WS] #{conn} koniec ({reason}): ramek {sum(f.sent for f in feeds)}, nieświeżych {sum(f.stale for f in feeds)}")
+
+    async def send_loop(self, ws, feeds: List[StreamFeed]):
+        started = time.monotonic()
+        for f in feeds: f.next_at = started
+        next_burst = started + self.burst_every if self.burst_every > 0 and self.burst_size > 0 else math.inf
+        close_at = started + self.disconnect_every if self.disconnect_every > 0 else math.inf
+        while True:
+            now = time.monotonic()
+            if now >= close_at:
+                await ws.close(1001, 'local stand-in: disconnect'); return 'rozłączenie'
+            burst = now >= next_burst
+            if burst: next_burst += self.burst_every
+            for f in feeds:
+                count = self.burst_size if burst else 0
+                if f.next_at <= now:
+                    count += 1
+                    # przy zaległości nie nadrabiamy wszystkiego naraz – tempo wraca do `rate`
+                    f.next_at = max(f.next_at + f.interval, now - f.interval)
+                for _ in range(count):
+                    msg = f.next_message()
+                    if msg is None:
+                        await ws.close(1000, 'local stand-in: end of recording'); return 'koniec nagrania'
+                    await ws.send(msg)
+            wake = min(min(f.next_at for f in feeds), next_burst, close_at)
+            await asyncio.sleep(max(0.0, wake - time.monotonic()))
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        import websockets
+        async with websockets.serve(self.handler, host, port, max_size=2**24):
+            print(f"[LOCAL-WS] ws://{host}:{port} pary: {', '.join(self.recordings)}")
+            await asyncio.Future()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--in', dest='source', default='data/live', help='plik, katalog albo glob nagrań (.csv / .elbrec)')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--rate', type=float, default=10.0, help='ramki/s strumienia @100ms i @bookTicker (Binance: 10)')
+    ap.add_argument('--burst-every', type=float, default=0.0, help='co ile sekund seria ramek (0 = bez serii)')
+    ap.add_argument('--burst-size', type=int, default=0, help='dodatkowych ramek na strumień w serii')
+    ap.add_argument('--disconnect-every', type=float, default=0.0, help='zamknij połączenie po tylu sekundach (0 = nigdy)')
+    ap.add_argument('--stale-prob', type=float, default=0.0, help='prawdopodobieństwo ponownego wysłania poprzedniej ramki')
+    ap.add_argument('--event-time', action='store_true', help='dodaj pole E (czas zdarzenia) do ramek depth')
+    ap.add_argument('--once', action='store_true', help='bez zapętlania: zamknij połączenie na końcu nagrania')
+    ap.add_argument('--seed', type=int, default=0)
+    a = ap.parse_args()
+    server = LocalBinanceServer(collect_recordings(a.source), a.rate, a.burst_every, a.burst_size, a.disconnect_every,
+                                a.stale_prob, not a.once, a.event_time, a.seed)
+    try:
+        asyncio.run(server.serve(a.host, a.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -5,8 +5,9 @@ Uwaga: ten plik jest szkicem – dostosuj do swoich potrzeb i strumieni.
 import asyncio, json, gzip
 import websockets
 
-async def main(symbol="btcusdt"):
-    url = f"wss://stream.binance.com:9443/ws/{symbol}@bookTicker"
+async def main(symbol="btcusdt", base="wss://stream.binance.com:9443"):
+    # base="ws://127.0.0.1:8765" -> lokalna atrapa z binance_ws_local.py
+    url = f"{base}/ws/{symbol}@bookTicker"
     async with websockets.connect(url, max_size=2**24) as ws:
         while True:
             msg = await ws.recv()
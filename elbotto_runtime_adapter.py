@@ -1,5 +1,5 @@
 """
-Reads results/news_state.json and best_config.json, evaluates rules.json,
+Reads results/news_state.json and best_config.json (written by `python -m elbotto.backtest.search`), evaluates rules.json,
 produces results/runtime_overrides.json for the bot to hot-reload mid-run.
 """
 import time, json, argparse, sys
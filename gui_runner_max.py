@@ -411,7 +411,7 @@ class ControlCenter(ttk.Frame):
             step  = float(self.var_sw_step.get())
             thresholds = [round(start + i*step, 10) for i in range(int((stop-start)/step)+1)]
             self._append(f">> Sweep thresholds: {thresholds}\n")
-            threading.Thread(target=self._run_sweep, args=(args, thresholds), daemon=True).start()
+            threading.Thread(target=self._run_sweep, args=(cfg, thresholds), daemon=True).start()
             self.btn_run.config(state="disabled"); self.btn_stop.config(state="normal")
             return
 
@@ -430,16 +430,38 @@ class ControlCenter(ttk.Frame):
         else:
             self._start_process(args)
 
-    def _run_sweep(self, base_args, thresholds):
-        for t in thresholds:
-            args = list(base_args)
-            for i in range(len(args)-1):
-                if args[i] == "--threshold":
-                    args[i+1] = str(t); break
-            self._append(f"\n>> Running threshold={t}\n")
-            self._start_process(args, wait=True, csv_suffix=f"sweep_{t}")
+    def _run_sweep(self, cfg, thresholds):
+        # Sweep w jednym procesie: cechy i model liczone raz, progi odtwarzane wektorowo.
+        try:
+            from elbotto.backtest.sweep import sweep_thresholds
+            from elbotto.core.config import StrategyConfig
+            from elbotto.data.orderbook import load_order_book_csv
+
+            # GUI powtarza sweep na tym samym pliku – cache obok danych się opłaca
+            series_map = load_order_book_csv(cfg["dataset"], cache=True)
+            symbols = cfg["symbols"].split()
+            if symbols:
+                series_map = {s: series_map[s] for s in symbols if s in series_map}
+            base = StrategyConfig(
+                decision_threshold=float(cfg["threshold"]),
+                capital=float(cfg["capital"]),
+                max_position=float(cfg["max_position"]),
+                fee_rate=float(cfg["fee"]),
+                evaluation_windows=tuple(int(w) for w in cfg["windows"].split()),
+            )
+            table = sweep_thresholds(series_map, thresholds, base)
+            for row in table.rows:
+                self.q.put(
+                    f"{row['symbol']} thr={row['decision_threshold']}: trades={row['trade_count']} "
+                    f"equity={row['final_equity']:.2f} pnl={row['pnl']:.4f} val_loss={row['validation_loss']:.5f}\n"
+                )
+            ts = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            out = table.to_csv(RESULTS_DIR / f"sweep_{ts}.csv")
+            self.q.put(f"\n>> Sweep table: {out}\n")
+        except Exception as e:
+            self.q.put(f"[ERROR] {e!r}\n")
 
-        self._append("\n[SWEET DONE]\n")
+        self.q.put("\n[SWEEP DONE]\n")
         self.btn_run.config(state="normal"); self.btn_stop.config(state="disabled")
 
     def _start_process(self, args, wait=False, csv_suffix="run", extra_env=None):
@@ -1,7 +1,9 @@
-import asyncio, json, csv, os, time, argparse
+import asyncio, json, csv, glob, hashlib, io, math, os, queue, signal, threading, time, argparse, multiprocessing
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-import websockets
 
 def ensure_dirs():
     Path("data/live").mkdir(parents=True, exist_ok=True)
@@ -20,8 +22,11 @@ def features_from_book(bids, asks):
     micro_imb = micro - mid
     return mid, spread, imb, micro_imb
 
-async def ws_depth(symbol: str, levels: int, q: asyncio.Queue):
-    url = f"wss://stream.binance.com:9443/ws/{symbol.lower()}@depth{levels}@100ms"
+BINANCE_WS = "wss://stream.binance.com:9443"
+
+async def ws_stream(url: str, raw_q: asyncio.Queue):
+    """Odbiera surowe ramki z `url` i wrzuca `(ramka, czas_odbioru_ms)` do `raw_q`; dekodowanie robi `decode_loop`."""
+    import websockets  # tylko tryb na żywo – replay działa bez tej zależności
     while True:
         try:
             print("[WS] connecting:", url)
@@ -29,111 +34,681 @@ async def ws_depth(symbol: str, levels: int, q: asyncio.Queue):
                 print("[WS] connected")
                 while True:
                     msg = await ws.recv()
-                    data = json.loads(msg)
-                    # obsłuż oba formaty (czasem jest data:{bids,asks})
-                    payload = data.get("data", data)
-                    bids_raw = payload.get("bids")
-                    asks_raw = payload.get("asks")
-                    if not bids_raw or not asks_raw:
-                        continue
-                    bids = [[float(p), float(q)] for p, q in bids_raw[:levels]]
-                    asks = [[float(p), float(q)] for p, q in asks_raw[:levels]]
-                    t_ms = int(payload.get("E") or time.time() * 1000)
-                    await q.put((t_ms, bids, asks))
+                    await raw_q.put((msg, time.time() * 1000))
         except Exception as e:
             print("[WS] reconnect in 2s:", e)
             await asyncio.sleep(2)
 
-def read_overrides():
+async def ws_depth(symbol: str, levels: int, raw_q: asyncio.Queue, base: str = BINANCE_WS):
+    await ws_stream(f"{base}/ws/{symbol.lower()}@depth{levels}@100ms", raw_q)
+
+def combined_url(symbols, levels, base=BINANCE_WS):
+    """URL strumienia łączonego Binance (`/stream?streams=a@depthN@100ms/b@...`)."""
+    return f"{base}/stream?streams=" + "/".join(f"{s.lower()}@depth{levels}@100ms" for s in symbols)
+
+def decode_depth_frames(frames, levels):
+    """Dekoduje paczkę ramek depth do prealokowanych tablic (wątek lub proces roboczy).
+
+    Zwraca `(ts, values, counts, recv, symbols, errors)`: `values` ma na każdy
+    snapshot `4*levels` pól w układzie surowego LOB-a (ceny bid, ilości bid,
+    ceny ask, ilości ask), `counts` liczby poziomów bid/ask, a `symbols` parę
+    z nazwy strumienia łączonego (`None` dla pojedynczego). Ramki bez obu
+    stron księgi są pomijane; ramki uszkodzone (nie-JSON, zły kształt, cena
+    nie-liczba) też, a `errors` to ich liczba.
+    """
+    width = 4 * levels
+    ts = array("q", bytes(8 * len(frames)))
+    recv = array("d", bytes(8 * len(frames)))
+    values = array("d", bytes(8 * width * len(frames)))
+    counts = array("H", bytes(4 * len(frames)))
+    symbols = []
+    n = errors = 0
+    for msg, recv_ms in frames:
+        try:
+            data = json.loads(msg)
+            # obsłuż oba formaty (czasem jest data:{bids,asks})
+            payload = data.get("data", data)
+            bids_raw = payload.get("bids")
+            asks_raw = payload.get("asks")
+            if not bids_raw or not asks_raw:
+                continue
+            sides = [[(float(p), float(q)) for p, q in rows[:levels]] for rows in (bids_raw, asks_raw)]
+            t_ms = int(payload.get("E") or recv_ms)
+            stream = data.get("stream")
+            symbol = stream.split("@", 1)[0].upper() if stream else None
+        except (ValueError, TypeError, AttributeError, OverflowError):
+            errors += 1
+            continue
+        base = n * width
+        for side, rows in zip((0, 2), sides):
+            offset = base + side * levels
+            for i, (p, q) in enumerate(rows):
+                values[offset + i] = p
+                values[offset + levels + i] = q
+        counts[2 * n] = len(sides[0])
+        counts[2 * n + 1] = len(sides[1])
+        ts[n] = t_ms
+        recv[n] = recv_ms
+        symbols.append(symbol)
+        n += 1
+    return ts[:n], values[:n * width], counts[:2 * n], recv[:n], symbols, errors
+
+def iter_snapshots(ts, values, counts, levels):
+    """`(t_ms, bids, asks)` dla `live_loop` z tablic `decode_depth_frames` (poziomy jako krotki `(cena, ilość)`)."""
+    width = 4 * levels
+    for n, t_ms in enumerate(ts):
+        base = n * width
+        nb, na = counts[2 * n], counts[2 * n + 1]
+        ask = base + 2 * levels
+        yield (t_ms, list(zip(values[base:base + nb], values[base + levels:base + levels + nb])),
+               list(zip(values[ask:ask + na], values[ask + levels:ask + levels + na])))
+
+def qdepth(q):
+    """Głębokość kolejki; dla słownika kolejek per para – największa z nich."""
+    if isinstance(q, dict):
+        return max((x.qsize() for x in q.values()), default=0)
+    return q.qsize()
+
+class DecodeStats:
+    """Liczniki etapu dekodowania za bieżący okres raportu."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.frames = self.snapshots = self.batches = self.errors = 0
+        self.decode_sec = self.decode_max = 0.0
+        self.lag_ms = self.lag_max = 0.0
+        self.raw_max = self.q_max = 0
+
+    def record(self, frames, recv, decode_sec, raw_depth, q_depth, errors=0):
+        now_ms = time.time() * 1000
+        self.frames += frames
+        self.errors += errors
+        self.snapshots += len(recv)
+        self.batches += 1
+        self.decode_sec += decode_sec
+        self.decode_max = max(self.decode_max, decode_sec)
+        for r in recv:
+            lag = now_ms - r
+            self.lag_ms += lag
+            self.lag_max = max(self.lag_max, lag)
+        self.raw_max = max(self.raw_max, raw_depth)
+        self.q_max = max(self.q_max, q_depth)
+
+    def summary(self, raw_q, q):
+        elapsed = max(1e-9, time.monotonic() - self.started)
+        return {
+            "frames_per_sec": self.frames / elapsed,
+            "batch_avg": self.frames / max(1, self.batches),
+            "errors": self.errors,
+            "decode_ms_avg": 1000 * self.decode_sec / max(1, self.batches),
+            "decode_ms_max": 1000 * self.decode_max,
+            "lag_ms_avg": self.lag_ms / max(1, self.snapshots),
+            "lag_ms_max": self.lag_max,
+            "raw_q": raw_q.qsize(), "raw_q_max": self.raw_max,
+            "q": qdepth(q), "q_max": self.q_max,
+        }
+
+async def decode_loop(raw_q: asyncio.Queue, q, levels: int, stats: DecodeStats = None,
+                      executor=None, max_batch: int = 256):
+    """Zbiera dostępne ramki z `raw_q` w paczki i dekoduje je w `executor` poza pętlą zdarzeń.
+
+    `q` to kolejka `live_loop` albo słownik `{SYMBOL: kolejka}` dla strumieni
+    łączonych (ramki nieznanych par są pomijane). Opóźnienie (lag) to czas od
+    odbioru ramki do wydania snapshotu. Błąd dekodowania paczki (np. zepsuta
+    pula procesów) jest liczony w `errors` i pętla działa dalej.
+    """
+    loop = asyncio.get_running_loop()
+    routed = isinstance(q, dict)
+    while True:
+        frames = [await raw_q.get()]
+        while len(frames) < max_batch and not raw_q.empty():
+            frames.append(raw_q.get_nowait())
+        started = time.perf_counter()
+        try:
+            ts, values, counts, recv, symbols, errors = await loop.run_in_executor(executor, decode_depth_frames, frames, levels)
+        except Exception as e:
+            print(f"[DECODE] paczka {len(frames)} ramek pominięta: {e!r}")
+            ts, values, counts, recv, symbols, errors = (), (), (), (), [], len(frames)
+        if stats:
+            stats.record(len(frames), recv, time.perf_counter() - started, raw_q.qsize(), qdepth(q), errors)
+        for symbol, snapshot in zip(symbols, iter_snapshots(ts, values, counts, levels)):
+            target = q.get(symbol) if routed else q
+            if target is not None:
+                await target.put(snapshot)
+
+async def report_loop(stats: DecodeStats, raw_q: asyncio.Queue, q: asyncio.Queue, every: float = 10.0, writer=None):
+    while True:
+        await asyncio.sleep(every)
+        s = dict(stats.summary(raw_q, q), deferred=writer.deferred if writer else 0)
+        print("[DECODE] {frames_per_sec:.1f} fr/s batch={batch_avg:.1f} errors={errors} decode={decode_ms_avg:.2f}/{decode_ms_max:.2f}ms "
+              "lag={lag_ms_avg:.1f}/{lag_ms_max:.1f}ms raw_q={raw_q}(max {raw_q_max}) q={q}(max {q_max}) "
+              "write_deferred={deferred}".format(**s))
+        stats.reset()
+
+class BatchedWriter:
+    """Zapis CSV w wątku tła: otwarte uchwyty, ograniczona kolejka paczek, flush co `flush_rows` wierszy lub `flush_sec`.
+
+    `write` tylko dokłada wiersz do bieżącej paczki (formatowanie i I/O dzieją się
+    w wątku), więc pętla asyncio nie czeka na dysk. Gdy w kolejce czeka już
+    `max_chunks` niezapisanych paczek, wiersze zostają w bieżącej paczce (rośnie,
+    aż wątek nadrobi), a `deferred` liczy takie odłożone zapisy. `close` dopisuje
+    resztę, robi fsync i zamyka pliki.
+    """
+
+    def __init__(self, flush_rows=500, flush_sec=1.0, chunk_rows=128, max_chunks=256):
+        self.flush_rows, self.flush_sec, self.chunk_rows = flush_rows, flush_sec, chunk_rows
+        self.q = queue.Queue(maxsize=max_chunks)
+        self.lock = threading.Lock()
+        self.chunk = []
+        self.files = {}
+        self.error = None
+        self.deferred = 0
+        self.thread = threading.Thread(target=self._run, name="batched-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, path, row, header=None):
+        if self.error:
+            raise self.error
+        with self.lock:
+            self.chunk.append((path, row, header))
+            if len(self.chunk) < self.chunk_rows:
+                return
+            try:
+                self.q.put_nowait(self.chunk)
+            except queue.Full:
+                # wątek nie nadąża z dyskiem: paczka rośnie dalej, pętla nie czeka
+                self.deferred += 1
+                return
+            self.chunk = []
+
+    def release(self, path):
+        """Zamyka uchwyt (np. po rotacji pliku godzinnego)."""
+        self.write(path, None)
+
+    def close(self):
+        if self.thread.is_alive():
+            with self.lock:
+                chunk, self.chunk = self.chunk, []
+            self.q.put(chunk)
+            self.q.put(None)
+            self.thread.join()
+        if self.error:
+            raise self.error
+
+    def _handle(self, path, header):
+        """Zwraca funkcję zapisu wiersza; dla `.elbrec` `header` to argumenty `DepthRecorder`."""
+        entry = self.files.get(path)
+        if entry is None:
+            path = Path(path)
+            if path.suffix == ".elbrec":
+                from elbotto.data.recorder import DepthRecorder
+                rec = DepthRecorder(path, **header)
+                entry = self.files[path] = (rec, rec.append)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                f = path.open("a", newline="")
+                w = csv.writer(f)
+                if header and f.tell() == 0:
+                    w.writerow(header)
+                entry = self.files[path] = (f, w.writerow)
+        return entry[1]
+
+    def _write_chunk(self, chunk):
+        for path, row, header in chunk:
+            if row is not None:
+                self._handle(path, header)(row)
+            elif path in self.files:
+                self.files.pop(path)[0].close()
+        return len(chunk)
+
+    def _flush(self, sync=False):
+        for f, _ in self.files.values():
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+    def _run(self):
+        last, pending = time.monotonic(), 0
+        try:
+            while True:
+                try:
+                    chunk = self.q.get(timeout=max(0.0, self.flush_sec - (time.monotonic() - last)))
+                except queue.Empty:
+                    # cisza na wejściu: zabierz niepełną paczkę, żeby flush_sec obowiązywał
+                    with self.lock:
+                        chunk, self.chunk = self.chunk, []
+                if chunk is None:
+                    break
+                pending += self._write_chunk(chunk)
+                if pending >= self.flush_rows or time.monotonic() - last >= self.flush_sec:
+                    self._flush()
+                    last, pending = time.monotonic(), 0
+        except Exception as e:
+            self.error = e
+        finally:
+            self._flush(sync=True)
+            for f, _ in self.files.values():
+                f.close()
+            self.files.clear()
+
+OVERRIDES_PATH = Path("results/runtime_overrides.json")
+
+def read_overrides(path=OVERRIDES_PATH, online=False):
+    """`(thr, risk, maxpos)` z pliku nadpisań; braki i błędy dają wartości domyślne.
+
+    `threshold` to próg surowego `micro_imb`; sygnał z `--online-model`
+    (przewaga `2p-1`) czyta `online_threshold`, gdy plik go zawiera.
+    """
     thr, risk, maxpos = 0.10, 0.005, 1
     try:
-        d = json.loads(Path("results/runtime_overrides.json").read_text(encoding="utf-8"))
-        thr = float(d.get("threshold", thr))
+        d = json.loads(Path(path).read_text(encoding="utf-8"))
+        thr = float(d.get("online_threshold", d.get("threshold", thr)) if online else d.get("threshold", thr))
         risk = float(d.get("risk_per_trade", risk))
         maxpos = int(d.get("max_position", maxpos))
     except Exception:
         pass
     return thr, risk, maxpos
 
-async def live_loop(q: asyncio.Queue, symbol: str, levels: int):
-    feat_path = Path("results/lob_features_live.csv")
-    eq_path = Path("results/equity_paper.csv")
-    if not feat_path.exists():
-        with feat_path.open("w", newline="") as f:
-            csv.writer(f).writerow(["ts", "mid", "spread", "imbalance", "microprice_imb"])
-    if not eq_path.exists():
-        with eq_path.open("w", newline="") as f:
-            csv.writer(f).writerow(["ts", "mid", "signal", "pos", "equity", "thr", "risk"])
+class CachedOverrides:
+    """`read_overrides` bez czytania pliku co tick: `mtime` sprawdzane najwyżej co `every` s, JSON parsowany tylko po zmianie."""
+
+    def __init__(self, path=OVERRIDES_PATH, every=0.5):
+        self.path, self.every = Path(path), every
+        self.checked = -math.inf
+        self.mtime = None
+        self.values = {}
+
+    def get(self, online=False):
+        now = time.monotonic()
+        if now - self.checked >= self.every:
+            self.checked = now
+            try:
+                mtime = self.path.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != self.mtime:
+                self.mtime, self.values = mtime, {}
+        if online not in self.values:
+            self.values[online] = read_overrides(self.path, online)
+        return self.values[online]
+
+class OnlineSignal:
+    """Douczany na bieżąco model logistyczny z elbotto jako źródło sygnału.
+
+    Cel ticka znany jest po `horizon` kolejnych tickach (czy mid wzrósł);
+    co `every` oznaczonych wierszy model robi `partial_fit` z wygaszaniem `decay`.
+    """
+
+    def __init__(self, horizon=10, every=50, decay=0.999, fee_rate=0.0004):
+        from elbotto.ml.models import LogisticModel
+        self.model = LogisticModel(weights=[0.0, 0.0, 0.0], bias=0.0)
+        self.horizon, self.every, self.decay, self.fee_rate = horizon, every, decay, fee_rate
+        self.pending = deque()
+        self.rows, self.targets, self.spreads = [], [], []
+
+    def update(self, mid, spread, imb, micro_imb):
+        """Zwraca prawdopodobieństwo wzrostu albo None, dopóki model się nie douczył."""
+        x = [spread, imb, micro_imb]
+        self.pending.append((x, mid, spread))
+        if len(self.pending) > self.horizon:
+            old_x, old_mid, old_spread = self.pending.popleft()
+            self.rows.append(old_x)
+            self.targets.append(1.0 if mid > old_mid else 0.0)
+            self.spreads.append(old_spread)
+            if len(self.rows) >= self.every:
+                self.model.partial_fit(self.rows, self.targets, self.spreads, self.fee_rate, decay=self.decay)
+                self.rows, self.targets, self.spreads = [], [], []
+        if self.model.state is None:
+            return None
+        return float(self.model.predict_proba([x])[0])
+
+FEAT_HEADER = ["ts", "mid", "spread", "imbalance", "microprice_imb"]
+EQ_HEADER = ["ts", "mid", "signal", "pos", "equity", "thr", "risk"]
+
+def lob_header(levels):
+    return ["ts"] + \
+           [f"bid{i+1}" for i in range(levels)] + \
+           [f"bid{i+1}_qty" for i in range(levels)] + \
+           [f"ask{i+1}" for i in range(levels)] + \
+           [f"ask{i+1}_qty" for i in range(levels)]
+
+def lob_row(t_ms, bids, asks, levels):
+    """Wiersz surowego LOB-a w układzie `lob_header`; brakujące poziomy (Binance przysłał mniej) to zera."""
+    bids = bids[:levels] + [(0.0, 0.0)] * (levels - len(bids))
+    asks = asks[:levels] + [(0.0, 0.0)] * (levels - len(asks))
+    return [t_ms] + [p for p, _ in bids] + [q for _, q in bids] + [p for p, _ in asks] + [q for _, q in asks]
+
+async def live_loop(q: asyncio.Queue, symbol: str, levels: int, online: OnlineSignal = None, writer: BatchedWriter = None,
+                    raw_format: str = "csv", raw_codec: str = "zlib", per_symbol_files: bool = False,
+                    results_dir: str = "results"):
+    """Cechy, sygnał i paper trading dla snapshotów `(t_ms, bids, asks)` z `q`.
+
+    `None` w kolejce kończy pętlę (koniec replayu) i zwraca podsumowanie
+    `{"ticks", "equity", "pos"}`; `raw_format="none"` wyłącza zapis surowego LOB-a.
+    Bez podanego `writer` pętla tworzy własny i zamyka go przy wyjściu.
+    """
+    tag = f"_{symbol.upper()}" if per_symbol_files else ""
+    feat_path = Path(results_dir) / f"lob_features_live{tag}.csv"
+    eq_path = Path(results_dir) / f"equity_paper{tag}.csv"
+    own_writer = writer is None
+    writer = writer or BatchedWriter()
+    overrides = CachedOverrides()
 
     prev_mid = None
     equity = 0.0
     pos = 0
+    ticks = 0
 
     # mały „ticker” do rotacji surowego LOB-a (opcjonalnie, godzinne pliki)
+    # "bin": dzienny plik .elbrec (bloki z indeksem godzin) zamiast godzinnych CSV
     current_hour = None
-    lob_file = None
-    lob_writer = None
+    raw_path = None
+    if raw_format == "bin":
+        raw_header = {"symbol": symbol, "levels": levels, "codec": raw_codec}
+    else:
+        raw_header = lob_header(levels)
 
-    while True:
-        t_ms, bids, asks = await q.get()
+    try:
+        while True:
+            item = await q.get()
+            if item is None:
+                if raw_path:
+                    writer.release(raw_path)
+                return {"ticks": ticks, "equity": equity, "pos": pos}
+            t_ms, bids, asks = item
+            mid, spread, imb, micro_imb = features_from_book(bids, asks)
+
+            # zapisz featury (ciągły CSV)
+            writer.write(feat_path, [t_ms, mid, spread, imb, micro_imb], FEAT_HEADER)
+
+            # prosty sygnał i paper
+            prob = online.update(mid, spread, imb, micro_imb) if online else None
+            thr, risk, maxpos = overrides.get(online=prob is not None)
+            edge = micro_imb if prob is None else 2.0 * prob - 1.0
+            sig = 1 if edge > thr else (-1 if edge < -thr else 0)
+
+            # aktualizacja pozycji (skokowo, do +/- maxpos)
+            if sig > 0 and pos < maxpos:
+                pos += 1
+            elif sig < 0 and pos > -maxpos:
+                pos -= 1
+
+            if prev_mid is not None:
+                equity += pos * (mid - prev_mid)
+            prev_mid = mid
+
+            writer.write(eq_path, [t_ms, mid, sig, pos, equity, thr, risk], EQ_HEADER)
+            ticks += 1
+
+            # (opcjonalnie) surowy LOB per godzina
+            if raw_format == "none":
+                continue
+            dt = datetime.utcfromtimestamp(t_ms / 1000)
+            hour_tag = dt.strftime("%Y%m%d" if raw_format == "bin" else "%Y%m%d_%H")
+            if hour_tag != current_hour:
+                current_hour = hour_tag
+                if raw_path:
+                    writer.release(raw_path)
+                suffix = "elbrec" if raw_format == "bin" else "csv"
+                raw_path = Path(f"data/live/{symbol.upper()}_depth{levels}_{hour_tag}.{suffix}")
+            writer.write(raw_path, lob_row(t_ms, bids, asks, levels), raw_header)
+    finally:
+        if own_writer:
+            writer.close()
+
+def measure_tick_cost(levels, n=500):
+    """Średni czas CPU (s) dekodowania i obsługi jednej ramki depth – do planowania shardów."""
+    book = {"bids": [[f"{100 - 0.01 * i:.2f}", "1.00000"] for i in range(levels)],
+            "asks": [[f"{100 + 0.01 * i:.2f}", "1.00000"] for i in range(levels)]}
+    frames = [(json.dumps({"stream": f"x@depth{levels}@100ms", "data": dict(book, E=i)}), 0.0) for i in range(n)]
+    sink = csv.writer(io.StringIO())
+    overrides = CachedOverrides()
+    started = time.process_time()
+    ts, values, counts, _, _, _ = decode_depth_frames(frames, levels)
+    for t_ms, bids, asks in iter_snapshots(ts, values, counts, levels):
         mid, spread, imb, micro_imb = features_from_book(bids, asks)
+        thr, risk, _ = overrides.get()
+        sink.writerow([t_ms, mid, spread, imb, micro_imb])
+        sink.writerow([t_ms, mid, 0, 0, 0.0, thr, risk])
+        sink.writerow(lob_row(t_ms, bids, asks, levels))
+    return (time.process_time() - started) / n
+
+def plan_shards(symbols, levels, msgs_per_sec=10.0, budget=0.7, tick_cost=None, shards=None):
+    """Dzieli pary na procesy; przy `shards=None` tylko gdy jeden rdzeń by się nasycił.
+
+    Szacowane obciążenie to `pary × msgs_per_sec × tick_cost` (sekundy CPU na
+    sekundę); jeden proces dostaje najwyżej `budget` rdzenia.
+    """
+    symbols = [s.upper() for s in symbols]
+    if shards is None:
+        cost = tick_cost if tick_cost is not None else measure_tick_cost(levels)
+        per_shard = max(1, int(budget / max(msgs_per_sec * cost, 1e-12)))
+        shards = math.ceil(len(symbols) / per_shard)
+    shards = max(1, min(shards, len(symbols)))
+    return [symbols[i::shards] for i in range(shards)]
+
+async def run_symbols(symbols, levels, per_conn=10, base=BINANCE_WS, online_factory=None, flush_rows=500, flush_sec=1.0,
+                      raw_format="csv", raw_codec="zlib", decode_procs=0, stats_sec=10.0, combined=None):
+    """Wiele par w jednej pętli: `ceil(pary/per_conn)` połączeń łączonych, jeden etap dekodowania,
+    osobny `live_loop` (cechy, pozycja, pliki z sufiksem pary) na parę.
 
-        # zapisz featury (ciągły CSV)
-        with feat_path.open("a", newline="") as f:
-            csv.writer(f).writerow([t_ms, mid, spread, imb, micro_imb])
-
-        # prosty sygnał i paper
-        thr, risk, maxpos = read_overrides()
-        sig = 1 if micro_imb > thr else (-1 if micro_imb < -thr else 0)
-
-        # aktualizacja pozycji (skokowo, do +/- maxpos)
-        if sig > 0 and pos < maxpos:
-            pos += 1
-        elif sig < 0 and pos > -maxpos:
-            pos -= 1
-
-        if prev_mid is not None:
-            equity += pos * (mid - prev_mid)
-        prev_mid = mid
-
-        with eq_path.open("a", newline="") as f:
-            csv.writer(f).writerow([t_ms, mid, sig, pos, equity, thr, risk])
-
-        # (opcjonalnie) surowy LOB per godzina
-        dt = datetime.utcfromtimestamp(t_ms / 1000)
-        hour_tag = dt.strftime("%Y%m%d_%H")
-        if hour_tag != current_hour:
-            current_hour = hour_tag
-            if lob_file:
-                lob_file.close()
-            raw_path = Path(f"data/live/{symbol.upper()}_depth{levels}_{hour_tag}.csv")
-            lob_file = raw_path.open("a", newline="")
-            lob_writer = csv.writer(lob_file)
-            if raw_path.stat().st_size == 0:
-                header = ["ts"] + \
-                         [f"bid{i+1}" for i in range(levels)] + \
-                         [f"bid{i+1}_qty" for i in range(levels)] + \
-                         [f"ask{i+1}" for i in range(levels)] + \
-                         [f"ask{i+1}_qty" for i in range(levels)]
-                lob_writer.writerow(header)
-        if lob_writer:
-            row = [t_ms] + \
-                  [p for p, _ in bids] + [q for _, q in bids] + \
-                  [p for p, _ in asks] + [q for _, q in asks]
-            lob_writer.writerow(row)
+    `combined=None` oznacza tryb łączony dla więcej niż jednej pary; pojedyncza
+    para bez niego zachowuje dawny strumień `/ws/` i nazwy plików.
+    """
+    symbols = [s.upper() for s in symbols]
+    raw_q = asyncio.Queue(maxsize=2000)
+    queues = {s: asyncio.Queue(maxsize=2000) for s in symbols}
+    writer = BatchedWriter(flush_rows, flush_sec)
+    stats = DecodeStats()
+    executor = ProcessPoolExecutor(decode_procs) if decode_procs > 0 else ThreadPoolExecutor(1, thread_name_prefix="decode")
+    many = len(symbols) > 1 if combined is None else combined
+    if many:
+        sources = [ws_stream(combined_url(symbols[i:i + per_conn], levels, base), raw_q) for i in range(0, len(symbols), per_conn)]
+    else:
+        sources = [ws_depth(symbols[0], levels, raw_q, base)]
+    try:
+        await asyncio.gather(
+            *sources,
+            decode_loop(raw_q, queues if many else queues[symbols[0]], levels, stats, executor),
+            report_loop(stats, raw_q, queues, stats_sec, writer),
+            *(live_loop(queues[s], s, levels, online_factory() if online_factory else None, writer, raw_format, raw_codec, many)
+              for s in symbols)
+        )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+
+def run_shard(symbols, levels, online, kwargs):
+    """Punkt wejścia procesu-sharda; `online` to parametry `OnlineSignal` albo None."""
+    online_factory = (lambda: OnlineSignal(*online)) if online else None
+    # proces powstaje przez fork z działającej pętli: bez tego Ctrl+C trafia do odziedziczonego handlera rodzica
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        asyncio.run(run_symbols(symbols, levels, online_factory=online_factory, **kwargs))
+    except KeyboardInterrupt:
+        pass
+
+def replay_paths(source, symbol=None):
+    """Pliki do replayu: pojedynczy plik, wzorzec glob albo katalog (`{SYMBOL}_depth*` danej pary).
+
+    Kolejność według nazwy, czyli godzin/dni rotacji; katalog z oboma
+    formatami naraz jest odrzucany, bo te same godziny byłyby podane dwa razy.
+    """
+    src = Path(source)
+    if src.is_file():
+        return [src]
+    if src.is_dir():
+        prefix = f"{symbol.upper()}_depth" if symbol else ""
+        csvs = sorted(src.glob(f"{prefix}*.csv"))
+        recs = sorted(src.glob(f"{prefix}*.elbrec"))
+        if csvs and recs:
+            raise ValueError(f"{src}: są i pliki .csv, i .elbrec – podaj wzorzec jednego formatu")
+        paths = csvs or recs
+    else:
+        paths = sorted(Path(p) for p in glob.glob(str(source)))
+    if not paths:
+        raise FileNotFoundError(f"brak nagrań dla {source}")
+    return paths
+
+def _book_from_row(row, depth, levels):
+    """Wiersz w układzie surowego LOB-a (`ts`, ceny/ilości bid, ceny/ilości ask) -> `(t_ms, bids, asks)`."""
+    b, a = 1 + 2 * depth, 1 + 3 * depth
+    bids = [(p, q) for p, q in zip(row[1:1 + levels], row[1 + depth:1 + depth + levels]) if p]
+    asks = [(p, q) for p, q in zip(row[b:b + levels], row[a:a + levels]) if p]
+    return int(row[0]), bids, asks
+
+def iter_recorded(path, levels=None):
+    """`(t_ms, bids, asks)` z godzinnego CSV surowego LOB-a albo nagrania `.elbrec`.
+
+    Snapshoty mają tę samą postać co z `iter_snapshots` (krotki float), więc
+    `live_loop` liczy z nich dokładnie to samo co na żywo. `levels` przycina
+    księgę; puste poziomy (cena 0) są pomijane, snapshoty bez jednej ze stron też.
+    """
+    path = Path(path)
+    if path.suffix == ".elbrec":
+        from elbotto.data.recorder import DepthRecording
+        # wiersze to krotki float skopiowane z kolumn, więc po wyjściu z `with` nic nie trzyma widoków na mapę pliku
+        with DepthRecording(path) as rec:
+            depth = rec.header.levels
+            n = min(levels or depth, depth)
+            for cols, _ in rec.iter_batches():
+                rows = list(zip(*(cols[name] for name in rec.columns)))
+                del cols
+                for row in rows:
+                    t_ms, bids, asks = _book_from_row(row, depth, n)
+                    if bids and asks:
+                        yield t_ms, bids, asks
+        return
+    with path.open(newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+        depth = (len(header) - 1) // 4
+        n = min(levels or depth, depth)
+        for row in reader:
+            if not row:
+                continue
+            t_ms, bids, asks = _book_from_row([row[0]] + [float(x) if x else 0.0 for x in row[1:]], depth, n)
+            if bids and asks:
+                yield t_ms, bids, asks
+
+async def replay_source(paths, q: asyncio.Queue, levels=None, speed: float = 0.0):
+    """Wrzuca nagrane snapshoty do kolejki `live_loop` zamiast `ws_depth` + `decode_loop`.
+
+    `speed` to mnożnik czasu nagrania: 1 = czas rzeczywisty, 10 = dziesięć razy
+    szybciej, 0 = bez czekania (kolejka i tak ogranicza producenta). Na końcu
+    wrzuca `None`, co kończy `live_loop`. Zwraca liczbę snapshotów.
+    """
+    t0 = wall0 = None
+    n = 0
+    for path in paths:
+        for snapshot in iter_recorded(path, levels):
+            if speed > 0:
+                if t0 is None:
+                    t0, wall0 = snapshot[0], time.monotonic()
+                delay = wall0 + (snapshot[0] - t0) / 1000.0 / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await q.put(snapshot)
+            n += 1
+    await q.put(None)
+    return n
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+async def run_replay(paths, symbol, levels, speed=0.0, online_factory=None, results_dir="results/replay",
+                     flush_rows=500, flush_sec=1.0):
+    """Odtwarza nagrania przez `live_loop` (bez sieci i bez zapisu surowego LOB-a).
+
+    Pliki cech i equity w `results_dir` są zakładane od nowa, więc ten sam
+    zestaw nagrań i te same `results/runtime_overrides.json` dają identyczny
+    wynik (porównaj `equity_sha256`). Zwraca podsumowanie `live_loop` z
+    przepustowością `ticks_per_sec` liczoną razem z domknięciem plików.
+    """
+    out = Path(results_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    for name in ("lob_features_live.csv", "equity_paper.csv"):
+        (out / name).unlink(missing_ok=True)
+    q = asyncio.Queue(maxsize=2000)
+    writer = BatchedWriter(flush_rows, flush_sec)
+    started = time.perf_counter()
+    try:
+        _, result = await asyncio.gather(
+            replay_source(paths, q, levels, speed),
+            live_loop(q, symbol, levels, online_factory() if online_factory else None, writer, "none",
+                      results_dir=results_dir)
+        )
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    result.update(seconds=elapsed, ticks_per_sec=result["ticks"] / max(elapsed, 1e-9),
+                  equity_sha256=file_digest(out / "equity_paper.csv") if result["ticks"] else None)
+    return result
 
 async def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--symbol", default="BTCUSDT")
+    parser.add_argument("--symbols", default=None, help="lista par po przecinku – tryb wielu par na strumieniach łączonych")
+    parser.add_argument("--symbols-per-conn", type=int, default=10, help="strumieni na jedno połączenie")
+    parser.add_argument("--shards", default="auto", help="procesy dla trybu wielu par: liczba albo auto (gdy jeden rdzeń nie wystarczy)")
+    parser.add_argument("--msgs-per-sec", type=float, default=10.0, help="oczekiwane ramki/s na parę (do --shards auto)")
+    parser.add_argument("--ws-base", default=BINANCE_WS, help="adres serwera WebSocket (np. lokalna atrapa)")
     parser.add_argument("--levels", type=int, default=10)
+    parser.add_argument("--online-model", action="store_true", help="sygnał z douczanego modelu elbotto zamiast progu microprice")
+    parser.add_argument("--online-horizon", type=int, default=10, help="ticki do oznaczenia celu")
+    parser.add_argument("--online-every", type=int, default=50, help="partial_fit co tyle oznaczonych ticków")
+    parser.add_argument("--online-decay", type=float, default=0.999)
+    parser.add_argument("--flush-rows", type=int, default=500, help="flush plików co tyle wierszy")
+    parser.add_argument("--flush-sec", type=float, default=1.0, help="albo co tyle sekund")
+    parser.add_argument("--raw-format", choices=("csv", "bin"), default="csv", help="surowy LOB: godzinne CSV albo binarne .elbrec")
+    parser.add_argument("--raw-codec", choices=("none", "zlib", "lzma"), default="zlib", help="kompresja bloków .elbrec")
+    parser.add_argument("--decode-procs", type=int, default=0, help="procesy dekodujące JSON (0 = jeden wątek)")
+    parser.add_argument("--stats-sec", type=float, default=10.0, help="co ile sekund raport kolejek i opóźnień")
+    parser.add_argument("--replay", default=None, help="odtwórz nagrania zamiast WebSocketu: plik, glob albo katalog (np. data/live)")
+    parser.add_argument("--speed", type=float, default=0.0, help="tempo replayu: 1 = czas rzeczywisty, N = N× szybciej, 0 = maksymalnie")
+    parser.add_argument("--replay-out", default="results/replay", help="katalog cech i equity z replayu")
     args = parser.parse_args()
 
     ensure_dirs()
-    q = asyncio.Queue(maxsize=2000)
-    await asyncio.gather(
-        ws_depth(args.symbol, args.levels, q),
-        live_loop(q, args.symbol, args.levels)
-    )
+    if args.replay:
+        paths = replay_paths(args.replay, args.symbol)
+        print(f"[REPLAY] {len(paths)} plik(ów), tempo:", f"{args.speed:g}x" if args.speed > 0 else "maksymalne")
+        s = await run_replay(paths, args.symbol, args.levels, args.speed,
+                             (lambda: OnlineSignal(args.online_horizon, args.online_every, args.online_decay)) if args.online_model else None,
+                             args.replay_out, args.flush_rows, args.flush_sec)
+        print("[REPLAY] ticks={ticks} czas={seconds:.2f}s {ticks_per_sec:.0f} ticków/s equity={equity:.6f} pos={pos} "
+              "sha256={equity_sha256}".format(**s))
+        return
+    symbols = [x.strip() for x in args.symbols.split(",") if x.strip()] if args.symbols else [args.symbol]
+    online = (args.online_horizon, args.online_every, args.online_decay) if args.online_model else None
+    kwargs = dict(per_conn=args.symbols_per_conn, base=args.ws_base, flush_rows=args.flush_rows, flush_sec=args.flush_sec,
+                  raw_format=args.raw_format, raw_codec=args.raw_codec, decode_procs=args.decode_procs, stats_sec=args.stats_sec)
+    shards = plan_shards(symbols, args.levels, args.msgs_per_sec, shards=None if args.shards == "auto" else int(args.shards))
+    if len(shards) == 1:
+        await run_symbols(symbols, args.levels, online_factory=(lambda: OnlineSignal(*online)) if online else None, **kwargs)
+        return
+    print(f"[SHARDS] {len(shards)} procesy:", shards)
+    procs = [multiprocessing.Process(target=run_shard, args=(part, args.levels, online, dict(kwargs, combined=True))) for part in shards]
+    for p in procs:
+        p.start()
+    try:
+        while any(p.is_alive() for p in procs):
+            await asyncio.sleep(0.5)
+    finally:
+        # Ctrl+C trafia też do shardów – dajmy im domknąć pliki przed terminate
+        for p in procs:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
 
 if __name__ == "__main__":
     try:
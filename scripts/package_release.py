@@ -20,6 +20,8 @@ def _add_path(zip_file: zipfile.ZipFile, path: Path) -> None:
     if path.is_dir():
         for child in sorted(path.iterdir()):
             _add_path(zip_file, child)
+    elif path.suffix == ".elbcache":
+        return
     else:
         arcname = path.relative_to(ROOT)
         zip_file.write(path, arcname)
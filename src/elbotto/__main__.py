@@ -16,8 +16,14 @@ def main() -> None:
         default="data/binance_order_book_small.csv",
         help="Ścieżka do pliku CSV z danymi order book",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Liczba procesów do równoległego testowania par",
+    )
     args = parser.parse_args()
-    reports, impacts = run_quickstart(Path(args.dataset))
+    reports, impacts = run_quickstart(Path(args.dataset), workers=args.workers)
     for symbol, report in reports.items():
         metrics = report.state.metrics
         print(f"=== {symbol} ===")
@@ -2,15 +2,19 @@
 
 from __future__ import annotations
 
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Iterable
-
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
 
 from elbotto.core.config import StrategyConfig
-from elbotto.data.orderbook import OrderBookSeries
+from elbotto.core.numeric import np
+from elbotto.data.orderbook import OrderBookSeries, map_series_file, write_series_file
 from elbotto.exec.strategies.microstructure import MicrostructureStrategy, StrategyState
 from elbotto.microstructure.features import FeatureMatrix, build_feature_matrix, compute_event_windows
-from elbotto.ml.models import LogisticModel
+from elbotto.ml.models import LogisticModel, score_predictions
 
 
 @dataclass(slots=True)
@@ -21,55 +25,126 @@ class BacktestReport:
     interval_volatility: Dict[int, float]
 
 
+def _run_symbol_from_file(backtester: "Backtester", path: str, symbol: str) -> BacktestReport:
+    """Zadanie procesu roboczego: mapuje kolumny jednej pary i ją testuje."""
+
+    _, series_map = map_series_file(path, symbols=(symbol,))
+    return backtester.run_symbol(series_map[symbol])
+
+
 class Backtester:
-    """Trener strategii dla wielu par na danych historycznych."""
+    """Trener strategii dla wielu par na danych historycznych.
+
+    Przy ``workers > 1`` pary są rozdzielane na pulę procesów. Kolumny trafiają
+    do procesów przez tymczasowy plik mapowany w pamięci, a raporty wracają
+    w kolejności par z ``series_map``.
 
-    def __init__(self, config: StrategyConfig | None = None, horizon: int = 5) -> None:
+    Przy ``refit_every`` model po treningu jest douczany (``partial_fit``)
+    w trakcie okresu testowego co ``refit_every`` wierszy, wyłącznie na
+    wierszach, których cel jest już znany; ``decay`` wygasza starsze dane.
+    ``learning_rate`` i ``epochs`` trafiają do ``LogisticModel.train``.
+    """
+
+    def __init__(
+        self,
+        config: StrategyConfig | None = None,
+        horizon: int = 5,
+        workers: int = 1,
+        refit_every: int | None = None,
+        decay: float = 1.0,
+        learning_rate: float = 0.05,
+        epochs: int = 300,
+    ) -> None:
+        if workers <= 0:
+            raise ValueError("workers musi być dodatnie")
+        if refit_every is not None and refit_every <= 0:
+            raise ValueError("refit_every musi być dodatnie")
+        if not 0 < decay <= 1:
+            raise ValueError("decay musi leżeć w (0,1]")
         self.config = config or StrategyConfig()
         self.horizon = horizon
+        self.workers = workers
+        self.refit_every = refit_every
+        self.decay = decay
+        self.learning_rate = learning_rate
+        self.epochs = epochs
 
     def _split(self, matrix: FeatureMatrix) -> tuple[FeatureMatrix, FeatureMatrix]:
-        split_idx = int(len(matrix.features) * self.config.training_ratio)
-        train = FeatureMatrix(
-            features=matrix.features[:split_idx],
-            target=matrix.target[:split_idx],
-            spread=matrix.spread[:split_idx],
-            timestamps=matrix.timestamps[:split_idx],
-            feature_names=matrix.feature_names,
-        )
-        test = FeatureMatrix(
-            features=matrix.features[split_idx:],
-            target=matrix.target[split_idx:],
-            spread=matrix.spread[split_idx:],
-            timestamps=matrix.timestamps[split_idx:],
-            feature_names=matrix.feature_names,
-        )
-        return train, test
+        split_idx = int(len(matrix) * self.config.training_ratio)
+        return matrix.view(0, split_idx), matrix.view(split_idx)
 
-    def run(self, series_map: Dict[str, OrderBookSeries]) -> Dict[str, BacktestReport]:
-        reports: Dict[str, BacktestReport] = {}
-        for symbol, series in series_map.items():
-            features = build_feature_matrix(series, horizon=self.horizon)
-            train_matrix, test_matrix = self._split(features)
-            model = LogisticModel.train(
-                train_matrix.features,
-                train_matrix.target,
-                train_matrix.spread,
+    def _online_probabilities(self, model: LogisticModel, matrix: FeatureMatrix, split_idx: int) -> Any:
+        """Prawdopodobieństwa dla części testowej z douczaniem co ``refit_every`` wierszy."""
+
+        blocks: List[Any] = []
+        known = split_idx
+        for start in range(split_idx, len(matrix), self.refit_every):
+            stop = min(start + self.refit_every, len(matrix))
+            blocks.append(model.predict_proba(matrix.features[start:stop]))
+            labelled = stop - self.horizon
+            if labelled > known:
+                fresh = matrix.view(known, labelled)
+                model.partial_fit(fresh.features, fresh.target, fresh.spread, self.config.fee_rate, decay=self.decay)
+                known = labelled
+        if np is not None:
+            return np.concatenate(blocks) if blocks else np.zeros(0)
+        return [prob for block in blocks for prob in block]
+
+    def run_symbol(self, series: OrderBookSeries) -> BacktestReport:
+        features = build_feature_matrix(series, horizon=self.horizon)
+        train_matrix, test_matrix = self._split(features)
+        model = LogisticModel.train(
+            train_matrix.features,
+            train_matrix.target,
+            train_matrix.spread,
+            fee_rate=self.config.fee_rate,
+            learning_rate=self.learning_rate,
+            epochs=self.epochs,
+            standardize=self.config.standardize,
+            tol=self.config.tol,
+        )
+        probabilities = None
+        if self.refit_every:
+            probabilities = self._online_probabilities(model, features, len(train_matrix))
+            validation_loss = score_predictions(
+                probabilities,
+                test_matrix.target,
+                test_matrix.spread,
                 fee_rate=self.config.fee_rate,
             )
+        else:
             validation_loss = model.score(
                 test_matrix.features,
                 test_matrix.target,
                 test_matrix.spread,
                 fee_rate=self.config.fee_rate,
             )
-            strategy = MicrostructureStrategy(self.config, model, test_matrix)
-            state = strategy.run()
-            volatility = compute_event_windows(series, self.config.evaluation_windows)
-            reports[symbol] = BacktestReport(
-                symbol=symbol,
-                state=state,
-                validation_loss=validation_loss,
-                interval_volatility=volatility,
-            )
-        return reports
+        strategy = MicrostructureStrategy(self.config, model, test_matrix, probabilities)
+        state = strategy.run()
+        volatility = compute_event_windows(series, self.config.evaluation_windows)
+        return BacktestReport(
+            symbol=series.symbol,
+            state=state,
+            validation_loss=validation_loss,
+            interval_volatility=volatility,
+        )
+
+    def run(self, series_map: Dict[str, OrderBookSeries]) -> Dict[str, BacktestReport]:
+        if self.workers > 1 and len(series_map) > 1:
+            return self._run_parallel(series_map)
+        return {symbol: self.run_symbol(series) for symbol, series in series_map.items()}
+
+    def _run_parallel(self, series_map: Dict[str, OrderBookSeries]) -> Dict[str, BacktestReport]:
+        handle, name = tempfile.mkstemp(suffix=".elbcols")
+        os.close(handle)
+        path = Path(name)
+        try:
+            write_series_file(path, series_map)
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(series_map))) as pool:
+                futures = {
+                    symbol: pool.submit(_run_symbol_from_file, self, name, symbol)
+                    for symbol in series_map
+                }
+                return {symbol: future.result() for symbol, future in futures.items()}
+        finally:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,286 @@
+"""Przeszukiwanie hiperparametrów strategii metodą successive halving."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+
+from elbotto.backtest.engine import Backtester
+from elbotto.core.config import StrategyConfig
+from elbotto.data.orderbook import OrderBookSeries, load_order_book_csv, map_series_file, write_series_file
+
+TRAINING_FIELDS: Tuple[str, ...] = ("horizon", "learning_rate", "epochs")
+DEFAULT_SPACE: Dict[str, Tuple[Any, ...]] = {
+    "decision_threshold": (0.5, 0.52, 0.55, 0.58, 0.6, 0.65),
+    "training_ratio": (0.5, 0.6, 0.65, 0.7),
+    "horizon": (3, 5, 10),
+    "learning_rate": (0.01, 0.05, 0.1),
+    "epochs": (100, 300),
+}
+BEST_CONFIG_PATH = Path("results") / "best_config.json"
+
+
+@dataclass(slots=True)
+class SearchCandidate:
+    """Punkt przestrzeni: konfiguracja strategii i parametry uczenia."""
+
+    config: StrategyConfig
+    horizon: int = 5
+    learning_rate: float = 0.05
+    epochs: int = 300
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "decision_threshold": self.config.decision_threshold,
+            "training_ratio": self.config.training_ratio,
+            "fee_rate": self.config.fee_rate,
+            "max_position": self.config.max_position,
+            "horizon": self.horizon,
+            "learning_rate": self.learning_rate,
+            "epochs": self.epochs,
+        }
+
+
+@dataclass(slots=True)
+class CandidateScore:
+    """Wynik kandydata na prefiksie ``rows`` wierszy (``None`` = pełne dane)."""
+
+    candidate: SearchCandidate
+    rows: int | None
+    score: float
+    trade_count: int
+    validation_loss: float
+
+
+@dataclass(slots=True)
+class SearchResult:
+    best: CandidateScore
+    history: List[CandidateScore] = field(default_factory=list)
+
+
+def sample_candidates(
+    count: int,
+    space: Mapping[str, Sequence[Any]] | None = None,
+    base: StrategyConfig | None = None,
+    seed: int = 0,
+) -> List[SearchCandidate]:
+    """Losuje do ``count`` różnych kandydatów z dyskretnej przestrzeni."""
+
+    space = DEFAULT_SPACE if space is None else space
+    base = base or StrategyConfig()
+    for name in space:
+        if name not in TRAINING_FIELDS and not hasattr(base, name):
+            raise ValueError(f"nieznany parametr przestrzeni: {name!r}")
+    names = list(space)
+    total = math.prod(len(space[name]) for name in names)
+    rng = random.Random(seed)
+    seen: set = set()
+    candidates: List[SearchCandidate] = []
+    while len(candidates) < min(count, total):
+        point = tuple(rng.choice(list(space[name])) for name in names)
+        if point in seen:
+            continue
+        seen.add(point)
+        values = dict(zip(names, point))
+        training = {name: values.pop(name) for name in TRAINING_FIELDS if name in values}
+        candidates.append(SearchCandidate(replace(base, **values), **training))
+    return candidates
+
+
+def evaluate_candidate(
+    series_map: Dict[str, OrderBookSeries],
+    candidate: SearchCandidate,
+    rows: int | None = None,
+) -> CandidateScore:
+    """Backtest kandydata na pierwszych ``rows`` wierszach każdej pary; wynik to suma PnL."""
+
+    if rows is not None:
+        series_map = {symbol: series.view(0, rows) for symbol, series in series_map.items()}
+    backtester = Backtester(
+        candidate.config,
+        horizon=candidate.horizon,
+        learning_rate=candidate.learning_rate,
+        epochs=candidate.epochs,
+    )
+    reports = backtester.run(series_map)
+    capital = candidate.config.capital
+    return CandidateScore(
+        candidate=candidate,
+        rows=rows,
+        score=float(sum(report.state.metrics["final_equity"] - capital for report in reports.values())),
+        trade_count=sum(report.state.metrics["trade_count"] for report in reports.values()),
+        validation_loss=float(sum(report.validation_loss for report in reports.values()) / max(1, len(reports))),
+    )
+
+
+_WORKER_SERIES: Dict[str, Dict[str, OrderBookSeries]] = {}
+
+
+def _evaluate_from_file(path: str, candidate: SearchCandidate, rows: int | None) -> CandidateScore:
+    """Zadanie procesu roboczego; kolumny mapowane są raz na proces."""
+
+    series_map = _WORKER_SERIES.get(path)
+    if series_map is None:
+        _, series_map = map_series_file(path)
+        _WORKER_SERIES[path] = series_map
+    return evaluate_candidate(series_map, candidate, rows)
+
+
+def rung_schedule(total_rows: int, min_rows: int, eta: int) -> List[int | None]:
+    """Długości prefiksów kolejnych szczebli; ostatni to pełne dane (``None``)."""
+
+    rungs: List[int | None] = []
+    rows = min_rows
+    while rows < total_rows:
+        rungs.append(rows)
+        rows *= eta
+    rungs.append(None)
+    return rungs
+
+
+def successive_halving(
+    series_map: Dict[str, OrderBookSeries],
+    candidates: Sequence[SearchCandidate],
+    min_rows: int = 2_000,
+    eta: int = 3,
+    workers: int = 1,
+) -> SearchResult:
+    """Ocena wszystkich kandydatów na krótkich prefiksach i promocja najlepszych.
+
+    Na każdym szczeblu zostaje ``1/eta`` kandydatów (co najmniej jeden),
+    a prefiks rośnie ``eta`` razy, aż ostatni szczebel liczony jest na pełnych
+    danych. Ranking: suma PnL malejąco, przy remisie niższa strata walidacyjna.
+    Przy ``workers > 1`` kandydaci szczebla oceniani są w puli procesów,
+    które mapują kolumny z jednego pliku tymczasowego.
+    """
+
+    if eta < 2:
+        raise ValueError("eta musi być co najmniej 2")
+    if min_rows <= 0:
+        raise ValueError("min_rows musi być dodatnie")
+    if not candidates:
+        raise ValueError("brak kandydatów do oceny")
+    rungs = rung_schedule(max(len(series) for series in series_map.values()), min_rows, eta)
+    if workers <= 1:
+        return _run_rungs(
+            rungs,
+            candidates,
+            eta,
+            lambda survivors, rows: [evaluate_candidate(series_map, candidate, rows) for candidate in survivors],
+        )
+
+    handle, name = tempfile.mkstemp(suffix=".elbcols")
+    os.close(handle)
+    path = Path(name)
+    try:
+        write_series_file(path, series_map)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return _run_rungs(
+                rungs,
+                candidates,
+                eta,
+                lambda survivors, rows: list(
+                    pool.map(_evaluate_from_file, [name] * len(survivors), survivors, [rows] * len(survivors))
+                ),
+            )
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _run_rungs(
+    rungs: Sequence[int | None],
+    candidates: Sequence[SearchCandidate],
+    eta: int,
+    evaluate: Callable[[List[SearchCandidate], int | None], List[CandidateScore]],
+) -> SearchResult:
+    history: List[CandidateScore] = []
+    survivors = list(candidates)
+    for level, rows in enumerate(rungs):
+        scores = sorted(evaluate(survivors, rows), key=lambda item: (-item.score, item.validation_loss))
+        history.extend(scores)
+        if level < len(rungs) - 1:
+            survivors = [item.candidate for item in scores[: max(1, len(scores) // eta)]]
+    return SearchResult(best=scores[0], history=history)
+
+
+def write_best_config(
+    result: SearchResult,
+    path: Path | str = BEST_CONFIG_PATH,
+    risk_per_trade: float = 0.01,
+    max_position_units: int = 1,
+) -> Path:
+    """Zapisuje zwycięzcę w formacie czytanym przez ``elbotto_runtime_adapter.py``.
+
+    Klucze najwyższego poziomu nadpisują bazę adaptera i trafiają do
+    ``runtime_overrides.json`` w jednostkach bota na żywo: ``online_threshold``
+    to próg przewagi ``2p - 1`` odpowiadający progowi prawdopodobieństwa
+    ``decision_threshold``, czytany tylko przez sygnał
+    ``live_allinone.py --online-model`` (``threshold`` domyślnego trybu
+    porównywany jest z surowym ``micro_imb`` i zostaje nietknięty), a
+    ``max_position`` to całkowita liczba jednostek pozycji. Parametry
+    strategii w jej własnych jednostkach (np. ułamkowe ``max_position``) leżą
+    pod ``strategy``, metryki pod ``search``.
+    """
+
+    if max_position_units < 1:
+        raise ValueError("max_position_units musi być co najmniej 1")
+    best = result.best
+    payload: Dict[str, Any] = {
+        "online_threshold": 2.0 * best.candidate.config.decision_threshold - 1.0,
+        "risk_per_trade": risk_per_trade,
+        "max_position": int(max_position_units),
+        "strategy": best.candidate.params(),
+    }
+    payload["search"] = {
+        "score": best.score,
+        "trade_count": best.trade_count,
+        "validation_loss": best.validation_loss,
+        "evaluations": len(result.history),
+    }
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return target
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Successive halving po parametrach StrategyConfig")
+    parser.add_argument("--csv", required=True, help="Plik CSV z danymi order book")
+    parser.add_argument("--symbols", nargs="*", default=None)
+    parser.add_argument("--candidates", type=int, default=54)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--min-rows", type=int, default=2_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--capital", type=float, default=5_000.0)
+    parser.add_argument("--max-position", type=float, default=0.75)
+    parser.add_argument("--risk-per-trade", type=float, default=0.01)
+    parser.add_argument("--standardize", action="store_true", help="Ucz na standaryzowanych cechach")
+    parser.add_argument("--tol", type=float, default=None, help="Wczesne zatrzymanie treningu (domyślnie stałe epoki)")
+    parser.add_argument("--live-max-position", type=int, default=1, help="maks. pozycja bota na żywo (jednostki)")
+    parser.add_argument("--out", default=str(BEST_CONFIG_PATH))
+    parser.add_argument("--cache", action="store_true", help="Binarny cache *.elbcache obok CSV (szybsze kolejne wczytania)")
+    args = parser.parse_args()
+
+    series_map = load_order_book_csv(args.csv, cache=args.cache)
+    if args.symbols:
+        series_map = {symbol: series_map[symbol] for symbol in args.symbols}
+    base = StrategyConfig(capital=args.capital, max_position=args.max_position, standardize=args.standardize, tol=args.tol)
+    candidates = sample_candidates(args.candidates, base=base, seed=args.seed)
+    result = successive_halving(series_map, candidates, min_rows=args.min_rows, eta=args.eta, workers=args.workers)
+    for item in result.history:
+        print(f"[SEARCH] rows={item.rows or 'all'} score={item.score:.4f} trades={item.trade_count} {item.candidate.params()}")
+    out = write_best_config(result, args.out, risk_per_trade=args.risk_per_trade, max_position_units=args.live_max_position)
+    print(f"[SEARCH] best score={result.best.score:.4f} {result.best.candidate.params()} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
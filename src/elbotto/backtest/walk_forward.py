@@ -0,0 +1,313 @@
+"""Walidacja krocząca (walk-forward) na jednej macierzy cech."""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from statistics import mean
+from typing import Dict, List, Sequence, Tuple
+
+from elbotto.core.config import StrategyConfig
+from elbotto.data.orderbook import OrderBookSeries, load_order_book_csv
+from elbotto.exec.strategies.microstructure import MicrostructureStrategy, StrategyState
+from elbotto.microstructure.features import FeatureMatrix, build_feature_matrix
+from elbotto.ml.models import LogisticModel
+
+
+@dataclass(slots=True)
+class WalkForwardFold:
+    """Wynik pojedynczego foldu: zakresy wierszy i stan strategii na teście."""
+
+    index: int
+    train_start: int
+    train_stop: int
+    test_start: int
+    test_stop: int
+    state: StrategyState
+    validation_loss: float
+
+
+@dataclass(slots=True)
+class WalkForwardReport:
+    """Foldy jednej pary wraz z zagregowanymi metrykami."""
+
+    symbol: str
+    folds: List[WalkForwardFold]
+    metrics: dict
+
+
+def walk_forward_windows(
+    total: int,
+    train_rows: int,
+    test_rows: int,
+    step_rows: int | None = None,
+    expanding: bool = False,
+) -> List[Tuple[int, int, int, int]]:
+    """Zwraca zakresy ``(train_start, train_stop, test_start, test_stop)``.
+
+    Okno treningowe przesuwa się o ``step_rows`` (domyślnie ``test_rows``);
+    przy ``expanding=True`` zawsze zaczyna się od wiersza 0.
+    """
+
+    step = step_rows or test_rows
+    if train_rows <= 0 or test_rows <= 0 or step <= 0:
+        raise ValueError("train_rows, test_rows i step_rows muszą być dodatnie")
+    windows: List[Tuple[int, int, int, int]] = []
+    train_stop = train_rows
+    while train_stop < total:
+        train_start = 0 if expanding else train_stop - train_rows
+        windows.append((train_start, train_stop, train_stop, min(train_stop + test_rows, total)))
+        train_stop += step
+    return windows
+
+
+def aggregate_folds(folds: Sequence[WalkForwardFold], capital: float) -> dict:
+    """Agreguje metryki ``StrategyState`` wszystkich foldów."""
+
+    pnls = [float(fold.state.metrics["final_equity"]) - capital for fold in folds]
+    total_pnl = sum(pnls)
+    return {
+        "folds": len(folds),
+        "trade_count": sum(fold.state.metrics["trade_count"] for fold in folds),
+        "total_pnl": total_pnl,
+        "final_equity": capital + total_pnl,
+        "mean_fold_pnl": mean(pnls) if pnls else 0.0,
+        "positive_folds": sum(1 for pnl in pnls if pnl > 0) / len(pnls) if pnls else 0.0,
+        "spot_saved": float(sum(fold.state.metrics["spot_saved"] for fold in folds)),
+        "mean_validation_loss": mean(float(fold.validation_loss) for fold in folds) if folds else 0.0,
+    }
+
+
+def _train(config: StrategyConfig, train: FeatureMatrix, learning_rate: float, epochs: int) -> LogisticModel:
+    return LogisticModel.train(
+        train.features,
+        train.target,
+        train.spread,
+        fee_rate=config.fee_rate,
+        learning_rate=learning_rate,
+        epochs=epochs,
+        standardize=config.standardize,
+        tol=config.tol,
+    )
+
+
+def _run_fold(
+    config: StrategyConfig,
+    model: LogisticModel | None,
+    train: FeatureMatrix | None,
+    test: FeatureMatrix,
+    learning_rate: float = 0.05,
+    epochs: int = 300,
+) -> Tuple[StrategyState, float]:
+    """Zadanie (także w procesie roboczym): opcjonalny trening i replay testu."""
+
+    if model is None:
+        model = _train(config, train, learning_rate, epochs)
+    loss = model.score(test.features, test.target, test.spread, fee_rate=config.fee_rate)
+    return MicrostructureStrategy(config, model, test).run(), loss
+
+
+class WalkForwardBacktester:
+    """Walk-forward: cechy liczone raz, model przenoszony między foldami.
+
+    Przy ``warm_start=True`` pierwszy fold trenuje model od zera, a każdy
+    następny douczany jest (``partial_fit``) tylko na wierszach, które weszły
+    do okna; ``decay`` wygasza dane starsze niż okno. Domyślnie (``None``)
+    przy oknie kroczącym ``decay = 1 - krok/train_rows``, więc efektywna
+    liczba wierszy w statystykach modelu zbiega do ``train_rows`` jak przy
+    treningu od zera; ``decay=1`` w oknie kroczącym jest odrzucane, bo
+    stare wiersze nigdy by z niego nie wypadły. ``learning_rate`` i
+    ``epochs`` trafiają do treningu (``learning_rate`` także do
+    ``partial_fit``), jak w ``Backtester``. Łańcuch douczanych modeli
+    liczony jest sekwencyjnie (każdy fold zależy od poprzedniego), a ocena
+    foldów przy ``workers > 1`` trafia do puli procesów, która dostaje
+    wyłącznie wycinki testowe. Przy ``warm_start=False`` – oraz gdy każdy
+    fold i tak trenuje od zera (``decay=0`` albo okna bez wspólnych wierszy)
+    – trening też odbywa się w puli, po jednym foldzie na zadanie.
+    """
+
+    def __init__(
+        self,
+        config: StrategyConfig | None = None,
+        train_rows: int = 200_000,
+        test_rows: int = 50_000,
+        step_rows: int | None = None,
+        expanding: bool = False,
+        horizon: int = 5,
+        warm_start: bool = True,
+        decay: float | None = None,
+        workers: int = 1,
+        learning_rate: float = 0.05,
+        epochs: int = 300,
+    ) -> None:
+        if workers <= 0:
+            raise ValueError("workers musi być dodatnie")
+        if decay is not None and not 0 < decay <= 1:
+            raise ValueError("decay musi leżeć w (0,1]")
+        if warm_start and not expanding and decay == 1:
+            raise ValueError("decay=1 przy oknie kroczącym daje okno rosnące; podaj decay < 1 albo None")
+        self.config = config or StrategyConfig()
+        self.train_rows = train_rows
+        self.test_rows = test_rows
+        self.step_rows = step_rows
+        self.expanding = expanding
+        self.horizon = horizon
+        self.warm_start = warm_start
+        self.decay = decay
+        self.workers = workers
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+
+    @property
+    def effective_decay(self) -> float:
+        """``decay`` dla ``partial_fit``: podany albo wynikający z długości okna."""
+
+        if self.decay is not None:
+            return self.decay
+        if self.expanding:
+            return 1.0
+        step = self.step_rows or self.test_rows
+        return 1.0 - min(step, self.train_rows) / self.train_rows
+
+    def windows(self, total: int) -> List[Tuple[int, int, int, int]]:
+        return walk_forward_windows(total, self.train_rows, self.test_rows, self.step_rows, self.expanding)
+
+    def cold_starts(self, total: int) -> List[bool]:
+        """Dla każdego foldu: czy łańcuch douczania trenuje go od zera."""
+
+        decay = self.effective_decay
+        flags, seen = [], None
+        for train_start, train_stop, _, _ in self.windows(total):
+            # pierwszy fold albo okno bez wspólnych wierszy z poprzednim
+            flags.append(seen is None or decay == 0 or train_start >= seen)
+            seen = train_stop
+        return flags
+
+    def fit(self, matrix: FeatureMatrix) -> List[LogisticModel]:
+        """Zwraca model dla każdego foldu, douczając go między foldami."""
+
+        models: List[LogisticModel] = []
+        model: LogisticModel | None = None
+        decay = self.effective_decay
+        seen = 0
+        for (train_start, train_stop, _, _), cold in zip(self.windows(len(matrix)), self.cold_starts(len(matrix))):
+            if cold:
+                model = _train(self.config, matrix.view(train_start, train_stop), self.learning_rate, self.epochs)
+            else:
+                fresh = matrix.view(seen, train_stop)
+                model.partial_fit(
+                    fresh.features,
+                    fresh.target,
+                    fresh.spread,
+                    self.config.fee_rate,
+                    learning_rate=self.learning_rate,
+                    decay=decay,
+                )
+            seen = train_stop
+            models.append(copy.deepcopy(model))
+        return models
+
+    def evaluate(
+        self,
+        matrix: FeatureMatrix,
+        symbol: str,
+        models: Sequence[LogisticModel] | None = None,
+        config: StrategyConfig | None = None,
+    ) -> WalkForwardReport:
+        """Odtwarza strategię na każdym foldzie; ``config`` pozwala zmienić np. próg."""
+
+        config = config or self.config
+        windows = self.windows(len(matrix))
+        tasks = []
+        for idx, (train_start, train_stop, test_start, test_stop) in enumerate(windows):
+            model = models[idx] if models is not None else None
+            train = None if model is not None else matrix.view(train_start, train_stop)
+            tasks.append((config, model, train, matrix.view(test_start, test_stop), self.learning_rate, self.epochs))
+        if self.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                results = list(pool.map(_run_fold, *zip(*tasks)))
+        else:
+            results = [_run_fold(*task) for task in tasks]
+        folds = [
+            WalkForwardFold(idx, *window, state=state, validation_loss=loss)
+            for idx, (window, (state, loss)) in enumerate(zip(windows, results))
+        ]
+        return WalkForwardReport(symbol=symbol, folds=folds, metrics=aggregate_folds(folds, config.capital))
+
+    def run_matrix(self, matrix: FeatureMatrix, symbol: str) -> WalkForwardReport:
+        # bez douczania foldy są niezależne: trening razem z oceną w puli
+        chained = self.warm_start and not all(self.cold_starts(len(matrix)))
+        models = self.fit(matrix) if chained else None
+        return self.evaluate(matrix, symbol, models)
+
+    def run(self, series_map: Dict[str, OrderBookSeries]) -> Dict[str, WalkForwardReport]:
+        return {
+            symbol: self.run_matrix(build_feature_matrix(series, horizon=self.horizon), symbol)
+            for symbol, series in series_map.items()
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Walk-forward ElBotto na danych order book")
+    parser.add_argument("--csv", required=True, help="Plik CSV z danymi order book")
+    parser.add_argument("--symbol", default=None, help="Ogranicz do jednej pary")
+    parser.add_argument("--thresholds", default="0.58", help="Progi decyzji rozdzielone przecinkami")
+    parser.add_argument("--train-rows", type=int, default=200_000)
+    parser.add_argument("--test-rows", type=int, default=50_000)
+    parser.add_argument("--step-rows", type=int, default=None)
+    parser.add_argument("--expanding", action="store_true", help="Okno rosnące zamiast kroczącego")
+    parser.add_argument("--fee-bps", type=float, default=4.0, help="Prowizja w punktach bazowych")
+    parser.add_argument("--no-standardize", dest="standardize", action="store_false", help="Ucz na surowych cechach")
+    parser.add_argument("--tol", type=float, default=1e-7, help="Wczesne zatrzymanie treningu (0 = stałe epoki)")
+    parser.add_argument("--decay", type=float, default=None, help="Wygaszanie przy douczaniu (domyślnie z długości okna)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out-prefix", default="results/wfv")
+    parser.add_argument("--cache", action="store_true", help="Binarny cache *.elbcache obok CSV (szybsze kolejne wczytania)")
+    args = parser.parse_args()
+
+    series_map = load_order_book_csv(args.csv, cache=args.cache)
+    if args.symbol:
+        series_map = {args.symbol: series_map[args.symbol]}
+    base = StrategyConfig(fee_rate=args.fee_bps / 10_000, standardize=args.standardize, tol=args.tol or None)
+    engine = WalkForwardBacktester(
+        base,
+        train_rows=args.train_rows,
+        test_rows=args.test_rows,
+        step_rows=args.step_rows,
+        expanding=args.expanding,
+        decay=args.decay,
+        workers=args.workers,
+    )
+    thresholds = [float(value) for value in args.thresholds.split(",") if value.strip()]
+    out_prefix = Path(args.out_prefix)
+    out_prefix.parent.mkdir(parents=True, exist_ok=True)
+    summary = []
+    with Path(f"{out_prefix}_folds.csv").open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            ["symbol", "threshold", "fold", "train_start", "train_stop", "test_start", "test_stop",
+             "trade_count", "final_equity", "validation_loss"]
+        )
+        for symbol, series in series_map.items():
+            matrix = build_feature_matrix(series, horizon=engine.horizon)
+            models = engine.fit(matrix)
+            for threshold in thresholds:
+                report = engine.evaluate(matrix, symbol, models, replace(base, decision_threshold=threshold))
+                for fold in report.folds:
+                    writer.writerow(
+                        [symbol, threshold, fold.index, fold.train_start, fold.train_stop, fold.test_start,
+                         fold.test_stop, fold.state.metrics["trade_count"], fold.state.metrics["final_equity"],
+                         fold.validation_loss]
+                    )
+                summary.append({"symbol": symbol, "threshold": threshold, **report.metrics})
+                print(f"[WFV] {symbol} thr={threshold}: {report.metrics}")
+    Path(f"{out_prefix}_summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
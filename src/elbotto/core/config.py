@@ -31,7 +31,12 @@ class RiskLimits:
 
 @dataclass(slots=True)
 class StrategyConfig:
-    """Parametry sterujące backtestem oraz uczeniem."""
+    """Parametry sterujące backtestem oraz uczeniem.
+
+    ``standardize`` i ``tol`` trafiają do ``LogisticModel.train`` we
+    wszystkich silnikach (backtest, przegląd, walk-forward); domyślnie
+    stały optymalizator bez standaryzacji i wczesnego zatrzymania.
+    """
 
     training_ratio: float = 0.65
     decision_threshold: float = 0.58
@@ -40,6 +45,8 @@ class StrategyConfig:
     fee_rate: float = 0.0004
     evaluation_windows: Iterable[int] = (3, 6, 9)
     risk_limits: RiskLimits = field(default_factory=RiskLimits)
+    standardize: bool = False
+    tol: float | None = None
 
     def __post_init__(self) -> None:
         if not 0 < self.training_ratio < 1:
@@ -52,6 +59,8 @@ class StrategyConfig:
             raise ValueError("max_position musi być dodatnie")
         if self.fee_rate < 0:
             raise ValueError("fee_rate nie może być ujemny")
+        if self.tol is not None and self.tol <= 0:
+            raise ValueError("tol musi być dodatni albo None")
         windows: List[int] = list(self.evaluation_windows)
         if not windows:
             raise ValueError("evaluation_windows nie może być puste")
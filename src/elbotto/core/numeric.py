@@ -0,0 +1,24 @@
+"""Opcjonalny backend NumPy dla obliczeń wektorowych.
+
+Pakiet działa bez zależności zewnętrznych; jeśli NumPy jest dostępny, moduły
+obliczeniowe korzystają z niego przez ``np``. Zmienna środowiskowa
+``ELBOTTO_DISABLE_NUMPY=1`` wymusza ścieżkę w czystym Pythonie.
+"""
+
+from __future__ import annotations
+
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if os.environ.get("ELBOTTO_DISABLE_NUMPY", "").strip() not in ("", "0"):
+    np = None
+
+
+def numpy_enabled() -> bool:
+    """Informuje, czy obliczenia korzystają z NumPy."""
+
+    return np is not None
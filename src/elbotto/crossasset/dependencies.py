@@ -18,7 +18,7 @@ class DependencyResult:
 
 
 def _mid_prices(series: OrderBookSeries) -> List[float]:
-    return [(sample.bid_price_1 + sample.ask_price_1) / 2 for sample in series.samples]
+    return series.mid_prices().tolist()
 
 
 def _correlation(a: List[float], b: List[float]) -> float:
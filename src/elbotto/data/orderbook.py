@@ -3,10 +3,22 @@
 from __future__ import annotations
 
 import csv
-from dataclasses import dataclass
-from datetime import datetime, timezone
+import heapq
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 
 REQUIRED_COLUMNS = (
@@ -23,6 +35,19 @@ REQUIRED_COLUMNS = (
     "trade_volume",
 )
 
+VALUE_COLUMNS = REQUIRED_COLUMNS[2:]
+
+DEFAULT_CHUNK_ROWS = 65_536
+_RUN_RECORD = struct.Struct("<q" + "d" * len(VALUE_COLUMNS))
+
+CACHE_SUFFIX = ".elbcache"
+_CACHE_MAGIC = b"ELBOB\x00\x00\x01"
+_CACHE_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NS_PER_SECOND = 1_000_000_000
+_SECOND_CACHE_SIZE = 1 << 17
+
 
 @dataclass(slots=True)
 class OrderBookSample:
@@ -40,12 +65,162 @@ class OrderBookSample:
     trade_volume: float
 
 
+def datetime_to_ns(value: datetime) -> int:
+    """Zamienia znacznik czasu na liczbę nanosekund od epoki UTC."""
+
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * _NS_PER_SECOND + delta.microseconds * 1_000
+
+
+def ns_to_datetime(value: int) -> datetime:
+    """Odtwarza znacznik czasu UTC z liczby nanosekund od epoki."""
+
+    return _EPOCH + timedelta(microseconds=value // 1_000)
+
+
+def ns_to_isoformat(value: int) -> str:
+    """Zwraca tekstowy znacznik czasu zgodny z ``datetime.isoformat``."""
+
+    return ns_to_datetime(value).isoformat()
+
+
+def _float_column() -> array:
+    return array("d")
+
+
+class _SampleView(Sequence):
+    """Leniwy widok wierszy serii kolumnowej jako ``OrderBookSample``."""
+
+    __slots__ = ("_series",)
+
+    def __init__(self, series: "OrderBookSeries") -> None:
+        self._series = series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self._series.sample(idx) for idx in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indeks poza zakresem serii")
+        return self._series.sample(index)
+
+    def __iter__(self) -> Iterator[OrderBookSample]:
+        for idx in range(len(self)):
+            yield self._series.sample(idx)
+
+
 @dataclass(slots=True)
 class OrderBookSeries:
-    """Sekwencja obserwacji dla danej pary."""
+    """Kolumnowa sekwencja obserwacji dla danej pary.
+
+    Każde pole przechowywane jest w jednej ciągłej tablicy ``array('d')``,
+    a znaczniki czasu jako nanosekundy od epoki w ``array('q')``. Serie
+    wczytane z cache mają zamiast tego widoki ``memoryview`` tylko do odczytu,
+    a mapowanie pliku zwalnia ``close``.
+    """
 
     symbol: str
-    samples: List[OrderBookSample]
+    timestamps: array = field(default_factory=lambda: array("q"))
+    bid_price_1: array = field(default_factory=_float_column)
+    bid_size_1: array = field(default_factory=_float_column)
+    ask_price_1: array = field(default_factory=_float_column)
+    ask_size_1: array = field(default_factory=_float_column)
+    bid_price_2: array = field(default_factory=_float_column)
+    bid_size_2: array = field(default_factory=_float_column)
+    ask_price_2: array = field(default_factory=_float_column)
+    ask_size_2: array = field(default_factory=_float_column)
+    trade_volume: array = field(default_factory=_float_column)
+    _mapping: "_SeriesMapping | None" = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        size = len(self.timestamps)
+        for column in VALUE_COLUMNS:
+            if len(getattr(self, column)) != size:
+                raise ValueError(f"Kolumna {column} ma inną długość niż timestamps")
+
+    @classmethod
+    def from_samples(cls, symbol: str, samples: Iterable[OrderBookSample]) -> "OrderBookSeries":
+        """Buduje serię kolumnową z listy obserwacji."""
+
+        series = cls(symbol=symbol)
+        for sample in samples:
+            series.timestamps.append(datetime_to_ns(sample.timestamp))
+            for column in VALUE_COLUMNS:
+                getattr(series, column).append(getattr(sample, column))
+        return series
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def close(self) -> None:
+        """Zwalnia mapowanie pliku, z którego pochodzą kolumny.
+
+        Mapowanie jest wspólne dla wszystkich par z jednego pliku, więc po
+        ``close`` kolumny każdej z nich są nieczytelne. Dla serii w pamięci
+        nic nie robi.
+        """
+
+        if self._mapping is not None:
+            self._mapping.close()
+
+    def extend(self, other: "OrderBookSeries") -> None:
+        """Dokleja kolumny innej serii na końcu bieżącej."""
+
+        self.timestamps.extend(other.timestamps)
+        for column in VALUE_COLUMNS:
+            getattr(self, column).extend(getattr(other, column))
+
+    def view(self, start: int, stop: int | None = None) -> "OrderBookSeries":
+        """Zwraca wiersze ``[start, stop)`` jako widok ``memoryview`` bez kopiowania."""
+
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        return OrderBookSeries(
+            symbol=self.symbol,
+            timestamps=memoryview(self.timestamps)[start:stop],
+            **{column: memoryview(getattr(self, column))[start:stop] for column in VALUE_COLUMNS},
+        )
+
+    def take(self, indices: Sequence[int]) -> "OrderBookSeries":
+        """Zwraca nową serię złożoną z wierszy o podanych indeksach."""
+
+        return OrderBookSeries(
+            symbol=self.symbol,
+            timestamps=array("q", [self.timestamps[idx] for idx in indices]),
+            **{column: array("d", [getattr(self, column)[idx] for idx in indices]) for column in VALUE_COLUMNS},
+        )
+
+    def column(self, name: str) -> array:
+        """Zwraca kolumnę o podanej nazwie."""
+
+        if name != "timestamps" and name not in VALUE_COLUMNS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def sample(self, index: int) -> OrderBookSample:
+        """Materializuje pojedynczy wiersz jako ``OrderBookSample``."""
+
+        return OrderBookSample(
+            ns_to_datetime(self.timestamps[index]),
+            *(getattr(self, column)[index] for column in VALUE_COLUMNS),
+        )
+
+    @property
+    def samples(self) -> Sequence:
+        """Widok zgodny z dawnym ``List[OrderBookSample]``."""
+
+        return _SampleView(self)
+
+    def mid_prices(self) -> array:
+        """Zwraca kolumnę cen środkowych poziomu 1."""
+
+        return array("d", [(bid + ask) / 2 for bid, ask in zip(self.bid_price_1, self.ask_price_1)])
 
 
 def _parse_timestamp(value: str) -> datetime:
@@ -55,43 +230,390 @@ def _parse_timestamp(value: str) -> datetime:
     return ts.astimezone(timezone.utc)
 
 
-def load_order_book_csv(path: str | Path) -> Dict[str, OrderBookSeries]:
-    """Zwraca serię order book opartą na rzeczywistych danych z Binance."""
-
-    table: Dict[str, List[str]] = {column: [] for column in REQUIRED_COLUMNS}
-    with Path(path).open("r", encoding="utf-8", newline="") as handle:
-        reader = csv.DictReader(handle)
-        if reader.fieldnames is None:
-            raise ValueError("Brak nagłówków w pliku CSV")
-        missing = [col for col in REQUIRED_COLUMNS if col not in reader.fieldnames]
-        if missing:
-            raise ValueError(f"Brak wymaganych kolumn: {missing}")
-        for row in reader:
-            for column in REQUIRED_COLUMNS:
-                table[column].append(row[column])
-
-    timestamps = [_parse_timestamp(value) for value in table["timestamp"]]
-    order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
-
-    grouped: Dict[str, List[OrderBookSample]] = {}
-    for idx in order:
-        symbol = table["symbol"][idx]
-        grouped.setdefault(symbol, []).append(
-            OrderBookSample(
-                timestamp=timestamps[idx],
-                bid_price_1=float(table["bid_price_1"][idx]),
-                bid_size_1=float(table["bid_size_1"][idx]),
-                ask_price_1=float(table["ask_price_1"][idx]),
-                ask_size_1=float(table["ask_size_1"][idx]),
-                bid_price_2=float(table["bid_price_2"][idx]),
-                bid_size_2=float(table["bid_size_2"][idx]),
-                ask_price_2=float(table["ask_price_2"][idx]),
-                ask_size_2=float(table["ask_size_2"][idx]),
-                trade_volume=float(table["trade_volume"][idx]),
+_SECOND_PREFIXES: Dict[str, int] = {}
+_FRACTION_SUFFIXES: Dict[str, int] = {"": 0, "Z": 0}
+
+
+def _parse_timestamp_ns_slow(value: str) -> int:
+    """Parsuje wartość spoza pamięci podręcznej i w miarę możliwości ją uzupełnia."""
+
+    if value.isascii() and value.isdigit():
+        return int(value) * 1_000_000
+    prefix, suffix = value[:19], value[19:]
+    if len(prefix) == 19 and prefix[10] == "T" and prefix[13] == ":" and prefix[16] == ":":
+        fraction = _FRACTION_SUFFIXES.get(suffix)
+        if fraction is None:
+            digits = suffix[1:-1] if suffix.endswith("Z") else suffix[1:]
+            if suffix[:1] == "." and 0 < len(digits) <= 9 and digits.isascii() and digits.isdigit():
+                fraction = int(digits.ljust(9, "0"))
+                if len(_FRACTION_SUFFIXES) < _SECOND_CACHE_SIZE:
+                    _FRACTION_SUFFIXES[suffix] = fraction
+        if fraction is not None:
+            try:
+                base = datetime.fromisoformat(prefix)
+            except ValueError:
+                base = None
+            if base is not None and base.tzinfo is None:
+                if len(_SECOND_PREFIXES) >= _SECOND_CACHE_SIZE:
+                    _SECOND_PREFIXES.clear()
+                seconds = _SECOND_PREFIXES[prefix] = datetime_to_ns(base)
+                return seconds + fraction
+    return datetime_to_ns(_parse_timestamp(value))
+
+
+def parse_timestamps_ns(values: Iterable[str]) -> array:
+    """Parsuje kolumnę znaczników czasu wprost do nanosekund od epoki.
+
+    Szybka ścieżka obsługuje układ ``YYYY-MM-DDTHH:MM:SS(.fff)Z``: prefiks
+    sekundy i końcówka ułamkowa są zapamiętywane, więc typowy wiersz kosztuje
+    dwa odczyty ze słownika. Całkowite milisekundy z kolumny ``ts``
+    (``live_allinone.py``) zamieniane są bezpośrednio, a pozostałe wartości
+    trafiają do pełnego parsera ``datetime.fromisoformat``.
+    """
+
+    result = array("q")
+    append = result.append
+    seconds_get = _SECOND_PREFIXES.get
+    fraction_get = _FRACTION_SUFFIXES.get
+    slow = _parse_timestamp_ns_slow
+    for value in values:
+        seconds = seconds_get(value[:19])
+        if seconds is not None:
+            fraction = fraction_get(value[19:])
+            if fraction is not None:
+                append(seconds + fraction)
+                continue
+        append(slow(value))
+    return result
+
+
+class _SortedRuns:
+    """Posortowane fragmenty jednej serii zrzucone na dysk do scalenia."""
+
+    def __init__(self) -> None:
+        self._handle = tempfile.TemporaryFile()
+        self._runs: List[Tuple[int, int]] = []
+
+    def add(self, series: OrderBookSeries, presorted: bool = False) -> None:
+        """Zapisuje fragment serii jako posortowany przebieg."""
+
+        if not len(series):
+            return
+        columns = [series.timestamps, *(getattr(series, column) for column in VALUE_COLUMNS)]
+        if presorted:
+            order: Sequence = range(len(series))
+        else:
+            order = sorted(range(len(series)), key=series.timestamps.__getitem__)
+        handle = self._handle
+        handle.seek(0, io.SEEK_END)
+        offset = handle.tell()
+        pack = _RUN_RECORD.pack
+        for start in range(0, len(order), DEFAULT_CHUNK_ROWS):
+            block = order[start : start + DEFAULT_CHUNK_ROWS]
+            handle.write(b"".join(pack(*(column[idx] for column in columns)) for idx in block))
+        self._runs.append((offset, len(order)))
+
+    def _iter_run(self, offset: int, count: int) -> Iterator[Tuple]:
+        position = offset
+        remaining = count
+        while remaining:
+            rows = min(DEFAULT_CHUNK_ROWS, remaining)
+            self._handle.seek(position)
+            data = self._handle.read(rows * _RUN_RECORD.size)
+            position += len(data)
+            remaining -= rows
+            yield from _RUN_RECORD.iter_unpack(data)
+
+    def merge_into(self, series: OrderBookSeries) -> OrderBookSeries:
+        """Scala przebiegi (stabilnie względem kolejności w pliku) do serii."""
+
+        columns = [series.timestamps, *(getattr(series, column) for column in VALUE_COLUMNS)]
+        runs = [self._iter_run(offset, count) for offset, count in self._runs]
+        for record in heapq.merge(*runs, key=itemgetter(0)):
+            for column, value in zip(columns, record):
+                column.append(value)
+        self._handle.close()
+        return series
+
+
+@dataclass(slots=True)
+class _SymbolState:
+    series: OrderBookSeries
+    first_key: Tuple[int, int]
+    runs: _SortedRuns | None = None
+
+
+def _column_indices(fieldnames: Sequence[str] | None) -> Dict[str, int]:
+    if not fieldnames:
+        raise ValueError("Brak nagłówków w pliku CSV")
+    if "timestamp" not in fieldnames and "ts" in fieldnames:
+        fieldnames = ["timestamp" if name == "ts" else name for name in fieldnames]
+    missing = [col for col in REQUIRED_COLUMNS if col not in fieldnames]
+    if missing:
+        raise ValueError(f"Brak wymaganych kolumn: {missing}")
+    return {column: fieldnames.index(column) for column in REQUIRED_COLUMNS}
+
+
+def _parse_chunk(rows: List[List[str]], indices: Dict[str, int]) -> Tuple[List[str], OrderBookSeries]:
+    """Zamienia blok wierszy tekstowych na kolumny typowane."""
+
+    ts_idx = indices["timestamp"]
+    sym_idx = indices["symbol"]
+    symbols = [row[sym_idx] for row in rows]
+    chunk = OrderBookSeries(
+        symbol="",
+        timestamps=parse_timestamps_ns([row[ts_idx] for row in rows]),
+        **{column: array("d", [float(row[indices[column]]) for row in rows]) for column in VALUE_COLUMNS},
+    )
+    return symbols, chunk
+
+
+def _is_sorted(values: array) -> bool:
+    return all(a <= b for a, b in zip(values, values[1:]))
+
+
+def cache_path_for(path: str | Path) -> Path:
+    """Zwraca ścieżkę pliku cache leżącego obok źródłowego CSV."""
+
+    source = Path(path)
+    return source.with_name(source.name + CACHE_SUFFIX)
+
+
+def _cache_key(source: Path) -> Dict[str, object]:
+    stat = source.stat()
+    return {
+        "version": _CACHE_VERSION,
+        "byteorder": sys.byteorder,
+        "source": str(source.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def write_series_file(target: str | Path, series_map: Dict[str, OrderBookSeries], metadata: Dict[str, object] | None = None) -> None:
+    """Zapisuje kolumny wszystkich par do pliku binarnego do mapowania.
+
+    Plik zaczyna się od ``_CACHE_MAGIC``, długości i nagłówka JSON
+    (``metadata`` oraz lista par); dalej leżą surowe, wyrównane do 8 bajtów
+    kolumny każdej pary.
+    """
+
+    symbols = []
+    offset = 0
+    for symbol, series in series_map.items():
+        symbols.append({"symbol": symbol, "rows": len(series), "offset": offset})
+        offset += len(series) * 8 * (1 + len(VALUE_COLUMNS))
+    header = json.dumps({**(metadata or {}), "symbols": symbols}).encode("utf-8")
+    header += b" " * (-len(header) % 8)
+    with Path(target).open("wb") as handle:
+        handle.write(_CACHE_MAGIC)
+        handle.write(struct.pack("<Q", len(header)))
+        handle.write(header)
+        for series in series_map.values():
+            handle.write(series.timestamps)
+            for column in VALUE_COLUMNS:
+                handle.write(getattr(series, column))
+
+
+class _SeriesMapping:
+    """``mmap`` pliku kolumn wraz z wydanymi z niego widokami.
+
+    ``close`` zwalnia widoki i zamyka mapowanie, żeby plik dało się podmienić
+    lub usunąć (Windows blokuje zmapowane pliki). Po zniknięciu serii
+    ``__del__`` zamyka je, o ile nikt nie trzyma już kolumn; widoki trzymane
+    dalej przez wywołującego blokują zamknięcie – wtedy mapowanie znika
+    dopiero razem z nimi.
+    """
+
+    def __init__(self, mapped: mmap.mmap) -> None:
+        self._mapped = mapped
+        self.view = memoryview(mapped)
+        self._columns: List[memoryview] = []
+
+    def column(self, start: int, stop: int, typecode: str) -> memoryview:
+        column = self.view[start:stop].cast(typecode)
+        self._columns.append(column)
+        return column
+
+    def close(self) -> None:
+        if self._mapped.closed:
+            return
+        try:
+            for column in self._columns:
+                column.release()
+            self.view.release()
+            self._mapped.close()
+        except BufferError:
+            pass
+
+    def __del__(self) -> None:
+        # bez zwalniania widoków: kolumny mogą przeżyć serie (np. w raportach)
+        self._columns.clear()
+        try:
+            self.view.release()
+            self._mapped.close()
+        except BufferError:
+            pass
+
+
+def map_series_file(
+    target: str | Path,
+    symbols: Iterable[str] | None = None,
+) -> Tuple[Dict[str, object], Dict[str, OrderBookSeries]]:
+    """Mapuje plik z ``write_series_file`` i zwraca nagłówek oraz serie.
+
+    Kolumny są widokami ``memoryview`` na ``mmap`` tylko do odczytu, więc nic
+    nie jest kopiowane. ``symbols`` ogranicza wynik do wybranych par.
+    Mapowanie żyje, dopóki żyją serie, albo do ``close`` dowolnej z nich.
+    """
+
+    with Path(target).open("rb") as handle:
+        mapping = _SeriesMapping(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+    try:
+        view = mapping.view
+        if view[: len(_CACHE_MAGIC)] != _CACHE_MAGIC:
+            raise ValueError("Nieznany format pliku z kolumnami")
+        start = len(_CACHE_MAGIC) + 8
+        (header_len,) = struct.unpack_from("<Q", view, len(_CACHE_MAGIC))
+        header = json.loads(bytes(view[start : start + header_len]))
+        wanted = None if symbols is None else set(symbols)
+        data = start + header_len
+        result: Dict[str, OrderBookSeries] = {}
+        for entry in header["symbols"]:
+            if wanted is not None and entry["symbol"] not in wanted:
+                continue
+            rows = entry["rows"]
+            position = data + entry["offset"]
+            columns = []
+            for typecode in "q" + "d" * len(VALUE_COLUMNS):
+                columns.append(mapping.column(position, position + rows * 8, typecode))
+                position += rows * 8
+            result[entry["symbol"]] = OrderBookSeries(
+                entry["symbol"], columns[0], **dict(zip(VALUE_COLUMNS, columns[1:])), _mapping=mapping
             )
-        )
+    except BaseException:
+        mapping.close()
+        raise
+    return header, result
+
+
+def write_order_book_cache(path: str | Path, series_map: Dict[str, OrderBookSeries]) -> Path | None:
+    """Zapisuje posortowane kolumny wszystkich par do binarnego cache.
+
+    Nagłówek zawiera klucz źródła (ścieżka, rozmiar, mtime). Zwraca ``None``,
+    gdy katalog nie pozwala na zapis.
+    """
+
+    source = Path(path)
+    target = cache_path_for(source)
+    temporary = target.with_name(target.name + ".tmp")
+    try:
+        write_series_file(temporary, series_map, _cache_key(source))
+        os.replace(temporary, target)
+    except OSError:
+        temporary.unlink(missing_ok=True)
+        return None
+    return target
+
+
+def read_order_book_cache(path: str | Path) -> Dict[str, OrderBookSeries] | None:
+    """Wczytuje pary z cache przez ``mmap`` bez kopiowania danych.
+
+    Zwraca ``None``, jeśli cache nie istnieje lub nie pasuje do źródła.
+    """
+
+    source = Path(path)
+    try:
+        header, result = map_series_file(cache_path_for(source))
+        if any(header.get(key) != value for key, value in _cache_key(source).items()):
+            for series in result.values():
+                series.close()
+            return None
+        return result
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        return None
+
+
+def load_order_book_csv(
+    path: str | Path,
+    chunk_size: int = DEFAULT_CHUNK_ROWS,
+    cache: bool = False,
+) -> Dict[str, OrderBookSeries]:
+    """Zwraca serię order book opartą na rzeczywistych danych z Binance.
+
+    Plik czytany jest strumieniowo, po ``chunk_size`` wierszy, prosto do
+    kolumn typowanych. Jeżeli dane każdej pary są już uporządkowane w czasie,
+    globalne sortowanie jest pomijane; w przeciwnym razie nieuporządkowane
+    pary trafiają do zewnętrznego sortowania przez scalanie na dysku.
+    Zamiast ``timestamp`` plik może zawierać kolumnę ``ts`` w milisekundach.
+
+    Przy ``cache=True`` (domyślnie wyłączone – zapisuje obok danych
+    użytkownika) wynik trafia do pliku ``*.elbcache`` obok CSV i przy
+    kolejnych wywołaniach jest mapowany z dysku, dopóki ścieżka, rozmiar
+    i czas modyfikacji źródła się nie zmienią; ``close`` serii zwalnia
+    mapowanie. Binarne nagranie głębokości
+    (``*.elbrec``) jest czytane bezpośrednio, bez CSV i cache.
+    """
+
+    if chunk_size <= 0:
+        raise ValueError("chunk_size musi być dodatni")
+    if str(path).endswith(".elbrec"):
+        from elbotto.data.recorder import load_depth_recording
+
+        return load_depth_recording(path)
+    if cache:
+        cached = read_order_book_cache(path)
+        if cached is not None:
+            return cached
+    series_map = _parse_order_book_csv(Path(path), chunk_size)
+    if cache:
+        write_order_book_cache(path, series_map)
+    return series_map
+
+
+def _parse_order_book_csv(path: Path, chunk_size: int) -> Dict[str, OrderBookSeries]:
+    states: Dict[str, _SymbolState] = {}
+    row_offset = 0
+    with path.open("r", encoding="utf-8", newline="") as handle:
+        reader = csv.reader(handle)
+        indices = _column_indices(next(reader, None))
+        while True:
+            rows = [row for row in islice(reader, chunk_size) if row]
+            if not rows:
+                break
+            symbols, chunk = _parse_chunk(rows, indices)
+            groups: Dict[str, List[int]] = {}
+            for idx, symbol in enumerate(symbols):
+                groups.setdefault(symbol, []).append(idx)
+            for symbol, positions in groups.items():
+                part = chunk if len(groups) == 1 else chunk.take(positions)
+                first_ts = min(part.timestamps)
+                first_key = (first_ts, row_offset + positions[part.timestamps.index(first_ts)])
+                state = states.get(symbol)
+                if state is None:
+                    state = states[symbol] = _SymbolState(OrderBookSeries(symbol=symbol), first_key)
+                else:
+                    state.first_key = min(state.first_key, first_key)
+                if state.runs is None:
+                    buffered = state.series.timestamps
+                    in_order = not buffered or buffered[-1] <= part.timestamps[0]
+                    if in_order and _is_sorted(part.timestamps):
+                        state.series.extend(part)
+                        continue
+                    state.runs = _SortedRuns()
+                    state.runs.add(state.series, presorted=True)
+                    state.series = OrderBookSeries(symbol=symbol)
+                state.runs.add(part)
+            row_offset += len(rows)
 
-    return {symbol: OrderBookSeries(symbol=symbol, samples=samples) for symbol, samples in grouped.items()}
+    ordered = sorted(states.values(), key=lambda state: state.first_key)
+    result: Dict[str, OrderBookSeries] = {}
+    for state in ordered:
+        series = state.series
+        if state.runs is not None:
+            series = state.runs.merge_into(series)
+        result[series.symbol] = series
+    return result
 
 
 def slice_series(series: OrderBookSeries, step: int) -> Iterable[List[OrderBookSample]]:
@@ -99,11 +621,6 @@ def slice_series(series: OrderBookSeries, step: int) -> Iterable[List[OrderBookS
 
     if step <= 0:
         raise ValueError("step musi być dodatni")
-    chunk: List[OrderBookSample] = []
-    for sample in series.samples:
-        chunk.append(sample)
-        if len(chunk) == step:
-            yield chunk
-            chunk = []
-    if chunk:
-        yield chunk
+    view = series.samples
+    for start in range(0, len(series), step):
+        yield view[start : start + step]
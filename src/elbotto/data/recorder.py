@@ -0,0 +1,411 @@
+"""Binarny zapis surowych snapshotów głębokości z ``live_allinone.py``.
+
+Plik ``.elbrec`` zaczyna się od stałego nagłówka (``_MAGIC``, symbol, liczba
+poziomów, rozmiar wartości, kodek), po którym dopisywane są bloki. Blok to
+nagłówek ``_BLOCK`` (liczba wierszy, długość danych, pierwszy i ostatni
+znacznik czasu, crc32) i kolumny bloku jedna po drugiej: ``ts`` (int64, ms)
+oraz ceny i ilości w kolejności kolumn godzinnego CSV (float64 albo float32).
+Bez kodeka kolumny leżą na dysku wprost i czytnik mapuje je przez ``mmap``
+bez kopiowania; z ``zlib``/``lzma`` kompresowany jest cały blok. crc32
+liczone jest z danych bloku w postaci zapisanej na dysku i sprawdzane dla
+każdego kodeka. Blok nie
+przekracza granicy godziny, a plik ``.idx`` obok zapisuje offset pierwszego
+bloku każdej godziny.
+"""
+
+from __future__ import annotations
+
+import lzma
+import mmap
+import os
+import struct
+import weakref
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from elbotto.data.orderbook import OrderBookSeries
+
+RECORDING_SUFFIX = ".elbrec"
+INDEX_SUFFIX = ".idx"
+CODECS = ("none", "zlib", "lzma")
+DEFAULT_BLOCK_ROWS = 600
+
+_MAGIC = b"ELBREC\x00\x01"
+_HEADER = struct.Struct("<8s16sIII12x")
+_BLOCK_MAGIC = b"BLK1"
+_BLOCK = struct.Struct("<4sIIqqI")
+_MS_PER_HOUR = 3_600_000
+
+
+def depth_columns(levels: int) -> List[str]:
+    """Nazwy kolumn wartości w kolejności ``live_allinone.py`` (bez ``ts``)."""
+
+    return (
+        [f"bid{i + 1}" for i in range(levels)]
+        + [f"bid{i + 1}_qty" for i in range(levels)]
+        + [f"ask{i + 1}" for i in range(levels)]
+        + [f"ask{i + 1}_qty" for i in range(levels)]
+    )
+
+
+def hour_tag(t_ms: int) -> str:
+    return datetime.fromtimestamp(t_ms / 1000, tz=timezone.utc).strftime("%Y%m%d_%H")
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "lzma":
+        return lzma.compress(data)
+    return data
+
+
+def _decompress(codec: str, data) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "lzma":
+        return lzma.decompress(data)
+    return data
+
+
+@dataclass(slots=True)
+class RecordingHeader:
+    symbol: str
+    levels: int
+    value_type: str
+    codec: str
+
+    def pack(self) -> bytes:
+        return _HEADER.pack(
+            _MAGIC,
+            self.symbol.encode("ascii"),
+            self.levels,
+            array(self.value_type).itemsize,
+            CODECS.index(self.codec),
+        )
+
+    @classmethod
+    def unpack(cls, data) -> "RecordingHeader":
+        magic, symbol, levels, itemsize, codec = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Nieznany format nagrania głębokości")
+        return cls(symbol.rstrip(b"\x00").decode("ascii"), levels, "d" if itemsize == 8 else "f", CODECS[codec])
+
+
+@dataclass(slots=True)
+class RecordingBlock:
+    offset: int
+    rows: int
+    size: int
+    first_ts: int
+    last_ts: int
+    crc: int
+
+
+def _block_intact(view, block: RecordingBlock) -> bool:
+    start = block.offset + _BLOCK.size
+    return zlib.crc32(view[start : start + block.size]) == block.crc
+
+
+def _scan_blocks(view, start: int) -> Tuple[List[RecordingBlock], int]:
+    """Kompletne bloki od ``start`` i offset końca ostatniego z nich.
+
+    Ostatni blok z niezgodnym crc32 (zapis przerwany po nagłówku, dane
+    jeszcze nie na dysku) jest traktowany jak niepełny i pomijany.
+    """
+
+    blocks: List[RecordingBlock] = []
+    offset = start
+    total = len(view)
+    while offset + _BLOCK.size <= total:
+        magic, rows, size, first_ts, last_ts, crc = _BLOCK.unpack_from(view, offset)
+        if magic != _BLOCK_MAGIC or offset + _BLOCK.size + size > total:
+            break
+        blocks.append(RecordingBlock(offset, rows, size, first_ts, last_ts, crc))
+        offset += _BLOCK.size + size
+    if blocks and not _block_intact(view, blocks[-1]):
+        offset = blocks.pop().offset
+    return blocks, offset
+
+
+class DepthRecorder:
+    """Dopisuje snapshoty do pliku ``.elbrec`` blokami po ``block_rows`` wierszy.
+
+    Wiersz ma układ wiersza godzinnego CSV: ``[ts, bid1..N, bid1_qty..N,
+    ask1..N, ask1_qty..N]``. Istniejący plik jest kontynuowany (nagłówek musi
+    się zgadzać), a niepełny blok po przerwanym zapisie (także pełnej
+    długości, ale z niezgodnym crc32) jest obcinany.
+    ``flush`` zrzuca tylko pełne bloki; bieżący trafia na dysk przy zmianie
+    godziny albo w ``close``.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        symbol: str,
+        levels: int,
+        value_type: str = "d",
+        codec: str = "zlib",
+        block_rows: int = DEFAULT_BLOCK_ROWS,
+    ) -> None:
+        if value_type not in ("d", "f"):
+            raise ValueError("value_type musi być 'd' albo 'f'")
+        if codec not in CODECS:
+            raise ValueError(f"nieznany kodek: {codec!r}")
+        if block_rows <= 0:
+            raise ValueError("block_rows musi być dodatnie")
+        self.path = Path(path)
+        self.header = RecordingHeader(symbol.upper(), levels, value_type, codec)
+        self.block_rows = block_rows
+        self.index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        self._indexed = set()
+        if self.path.exists() and self.path.stat().st_size:
+            self._handle = self.path.open("r+b")
+            existing = RecordingHeader.unpack(self._handle.read(_HEADER.size))
+            if existing != self.header:
+                self._handle.close()
+                raise ValueError(f"{self.path} ma inny nagłówek: {existing}")
+            with mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                _, end = _scan_blocks(mapped, _HEADER.size)
+            self._handle.truncate(end)
+            self._handle.seek(end)
+            if self.index_path.exists():
+                self._indexed = {line.split(",")[0] for line in self.index_path.read_text(encoding="utf-8").split()}
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self.path.open("wb")
+            self._handle.write(self.header.pack())
+        self._hour = None
+        self._ts = array("q")
+        self._values = [array(value_type) for _ in range(4 * levels)]
+
+    def append(self, row: Sequence[float]) -> None:
+        if len(row) != 1 + len(self._values):
+            raise ValueError(f"wiersz ma {len(row)} pól, oczekiwano {1 + len(self._values)} (ts + 4 × {self.header.levels} poziomów)")
+        t_ms = int(row[0])
+        hour = t_ms // _MS_PER_HOUR
+        if self._ts and hour != self._hour:
+            self._write_block()
+        self._hour = hour
+        self._ts.append(t_ms)
+        for column, value in zip(self._values, row[1:]):
+            column.append(value)
+        if len(self._ts) >= self.block_rows:
+            self._write_block()
+
+    def append_book(self, t_ms: int, bids: Sequence[Sequence[float]], asks: Sequence[Sequence[float]]) -> None:
+        self.append(
+            [t_ms]
+            + [p for p, _ in bids] + [q for _, q in bids]
+            + [p for p, _ in asks] + [q for _, q in asks]
+        )
+
+    def _write_block(self) -> None:
+        if not self._ts:
+            return
+        payload = b"".join([self._ts.tobytes(), *(column.tobytes() for column in self._values)])
+        data = _compress(self.header.codec, payload)
+        offset = self._handle.tell()
+        self._handle.write(_BLOCK.pack(_BLOCK_MAGIC, len(self._ts), len(data), self._ts[0], self._ts[-1], zlib.crc32(data)))
+        self._handle.write(data)
+        tag = hour_tag(self._ts[0])
+        if tag not in self._indexed:
+            self._indexed.add(tag)
+            with self.index_path.open("a", encoding="utf-8") as index:
+                index.write(f"{tag},{offset}\n")
+        self._ts = array("q")
+        self._values = [array(self.header.value_type) for _ in self._values]
+
+    def fileno(self) -> int:
+        return self._handle.fileno()
+
+    def flush(self) -> None:
+        self._handle.flush()
+
+    def close(self) -> None:
+        if self._handle.closed:
+            return
+        self._write_block()
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+
+    def __enter__(self) -> "DepthRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class DepthRecording:
+    """Odczyt pliku ``.elbrec`` przez ``mmap``.
+
+    Kolumny bloków bez kompresji są widokami ``memoryview`` na mapę pliku,
+    ważnymi do ``close`` (wtedy są zwalniane); bloki skompresowane są
+    rozpakowywane przy odczycie do osobnych buforów.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as handle:
+            self._mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mapped)
+        self.header = RecordingHeader.unpack(self._view)
+        self.blocks, _ = _scan_blocks(self._view, _HEADER.size)
+        self.columns = ["ts"] + depth_columns(self.header.levels)
+        self._exports: List[weakref.ref] = []
+
+    def __enter__(self) -> "DepthRecording":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _track(self, views: List[memoryview]) -> List[memoryview]:
+        """Zapamiętuje widoki na mapę pliku, żeby ``close`` mógł je zwolnić."""
+
+        if self.header.codec == "none":
+            if len(self._exports) > 4096:
+                self._exports = [ref for ref in self._exports if ref() is not None]
+            self._exports.extend(weakref.ref(view) for view in views)
+        return views
+
+    def __len__(self) -> int:
+        return sum(block.rows for block in self.blocks)
+
+    def hours(self) -> Dict[str, int]:
+        """Godzina ``YYYYMMDD_HH`` -> offset pierwszego bloku (z ``.idx`` albo skanu bloków)."""
+
+        index_path = self.path.with_name(self.path.name + INDEX_SUFFIX)
+        if index_path.exists():
+            pairs = (line.split(",") for line in index_path.read_text(encoding="utf-8").split())
+            return {tag: int(offset) for tag, offset in pairs}
+        hours: Dict[str, int] = {}
+        for block in self.blocks:
+            hours.setdefault(hour_tag(block.first_ts), block.offset)
+        return hours
+
+    def block_columns(self, block: RecordingBlock) -> List[memoryview]:
+        if not _block_intact(self._view, block):
+            raise ValueError(f"uszkodzony blok w {self.path} @ {block.offset}")
+        start = block.offset + _BLOCK.size
+        data = self._view[start : start + block.size]
+        if self.header.codec != "none":
+            data = memoryview(_decompress(self.header.codec, data))
+        rows = block.rows
+        itemsize = array(self.header.value_type).itemsize
+        columns = [data[: rows * 8].cast("q")]
+        position = rows * 8
+        for _ in range(4 * self.header.levels):
+            columns.append(data[position : position + rows * itemsize].cast(self.header.value_type))
+            position += rows * itemsize
+        return self._track([data] + columns)[1:]
+
+    def iter_batches(self, batch_rows: int = 65_536, start_row: int = 0) -> Iterator[Tuple[Dict[str, object], List[int]]]:
+        """Partie kolumn po co najmniej ``batch_rows`` wierszy (pełnymi blokami).
+
+        Zwraca ``(kolumny, granice)`` jak ``iter_column_batches`` featurizera,
+        z tą różnicą, że granice to numery wierszy, a nie offsety bajtowe.
+        """
+
+        parts: List[List[memoryview]] = []
+        first = position = 0
+        for block in self.blocks:
+            if position + block.rows <= start_row:
+                position += block.rows
+                continue
+            columns = self.block_columns(block)
+            skip = max(0, start_row - position)
+            if not parts:
+                first = position + skip
+            parts.append(self._track([column[skip:] for column in columns]))
+            position += block.rows
+            if position - first >= batch_rows:
+                yield self._join(parts), list(range(first, position + 1))
+                parts = []
+        if parts:
+            yield self._join(parts), list(range(first, position + 1))
+
+    def _join(self, parts: List[List[memoryview]]) -> Dict[str, object]:
+        if len(parts) == 1:
+            return dict(zip(self.columns, parts[0]))
+        joined = {}
+        for idx, name in enumerate(self.columns):
+            column = array("q" if idx == 0 else self.header.value_type)
+            for part in parts:
+                column.frombytes(part[idx].cast("B"))
+            joined[name] = column
+        return joined
+
+    def read(self, start_ms: int | None = None, end_ms: int | None = None) -> Dict[str, object]:
+        """Wszystkie kolumny z ``[start_ms, end_ms)``; bloki spoza zakresu są pomijane bez dekodowania."""
+
+        parts = []
+        for block in self.blocks:
+            if (start_ms is not None and block.last_ts < start_ms) or (end_ms is not None and block.first_ts >= end_ms):
+                continue
+            columns = self.block_columns(block)
+            ts = columns[0]
+            lo = 0 if start_ms is None else next((i for i, t in enumerate(ts) if t >= start_ms), len(ts))
+            hi = len(ts) if end_ms is None else next((i for i, t in enumerate(ts) if t >= end_ms), len(ts))
+            parts.append(self._track([column[lo:hi] for column in columns]))
+        if not parts:
+            return {name: array("q" if idx == 0 else self.header.value_type) for idx, name in enumerate(self.columns)}
+        return self._join(parts)
+
+    def to_series(self) -> OrderBookSeries:
+        """Seria poziomów 1-2 dla backtestu (``trade_volume`` = 0, brak poziomu 2 = poziom 1 bez ilości)."""
+
+        data = self.read()
+        size = len(data["ts"])
+
+        def column(name: str, fallback: str | None = None) -> array:
+            if name in data:
+                return array("d", data[name])
+            return array("d", data[fallback]) if fallback else array("d", bytes(8 * size))
+
+        return OrderBookSeries(
+            symbol=self.header.symbol,
+            timestamps=array("q", [t * 1_000_000 for t in data["ts"]]),
+            bid_price_1=column("bid1"),
+            bid_size_1=column("bid1_qty"),
+            ask_price_1=column("ask1"),
+            ask_size_1=column("ask1_qty"),
+            bid_price_2=column("bid2", "bid1"),
+            bid_size_2=column("bid2_qty"),
+            ask_price_2=column("ask2", "ask1"),
+            ask_size_2=column("ask2_qty"),
+            trade_volume=array("d", bytes(8 * size)),
+        )
+
+    def close(self) -> None:
+        """Zwalnia widoki kolumn zwrócone przez ten obiekt i zamyka mapę pliku."""
+
+        if self._mapped.closed:
+            return
+        for ref in self._exports:
+            view = ref()
+            if view is not None:
+                try:
+                    view.release()
+                except BufferError:
+                    pass
+        self._exports.clear()
+        self._view.release()
+        try:
+            self._mapped.close()
+        except BufferError:
+            # wywołujący trzyma własne widoki pochodne – mapa zniknie razem z nimi
+            pass
+
+
+def load_depth_recording(path: str | Path) -> Dict[str, OrderBookSeries]:
+    """Wczytuje nagranie ``.elbrec`` jako ``{symbol: OrderBookSeries}``."""
+
+    with DepthRecording(path) as recording:
+        series = recording.to_series()
+    return {series.symbol: series}
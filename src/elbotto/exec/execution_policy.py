@@ -3,6 +3,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Any, Tuple
+
+from elbotto.core.numeric import np
 
 
 @dataclass(slots=True)
@@ -25,3 +28,23 @@ def decide_execution(edge_bps: float, fee_rate: float, expected_slippage_bps: fl
     side = "buy" if edge_bps > 0 else "sell"
     size = min(1.0, confidence)
     return ExecutionDecision(side=side, aggressive=aggressive, size=size, reason=f"edge={edge_bps:.2f}bps")
+
+
+def decide_execution_arrays(
+    edge_bps: Any,
+    fee_rate: float,
+    expected_slippage_bps: float,
+    confidence: Any,
+    threshold: float,
+) -> Tuple[Any, Any, Any]:
+    """Wektorowy odpowiednik ``decide_execution`` dla tablic NumPy.
+
+    Zwraca ``(maska wejścia, kierunek ±1, rozmiar)``; porównania odwzorowują
+    gałęzie wersji skalarnej, więc decyzje są identyczne wiersz po wierszu.
+    """
+
+    net_edge = edge_bps - (fee_rate * 10_000) - expected_slippage_bps
+    take = ~(confidence < threshold) & ~(net_edge <= 0)
+    direction = np.where(edge_bps > 0, 1.0, -1.0)
+    size = np.where(confidence < 1.0, confidence, 1.0)
+    return take, direction, size
@@ -3,13 +3,17 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List
+from itertools import accumulate
+from typing import Any, Iterator, List, Sequence
 
 from elbotto.core.config import StrategyConfig
-from elbotto.exec.execution_policy import decide_execution
+from elbotto.core.numeric import np
+from elbotto.exec.execution_policy import decide_execution, decide_execution_arrays
 from elbotto.ml.models import LogisticModel
 from elbotto.microstructure.features import FeatureMatrix
 
+EXPECTED_SLIPPAGE_BPS = 3.0
+
 
 @dataclass(slots=True)
 class Trade:
@@ -21,28 +25,180 @@ class Trade:
     pnl: float
 
 
+class TradeLog(Sequence):
+    """Leniwa lista transakcji z replayu wektorowego.
+
+    Trzyma kolumny (wiersz, kierunek, cena, rozmiar, odkładany spot, PnL),
+    a obiekty ``Trade`` tworzy dopiero przy odczycie.
+    """
+
+    __slots__ = ("_timestamps", "_rows", "_direction", "_price", "_size", "_spot", "_pnl")
+
+    def __init__(
+        self,
+        timestamps: Sequence[str],
+        rows: Sequence[int],
+        direction: Sequence[float],
+        price: Sequence[float],
+        size: Sequence[float],
+        spot: Sequence[float],
+        pnl: Sequence[float],
+    ) -> None:
+        self._timestamps = timestamps
+        self._rows = rows
+        self._direction = direction
+        self._price = price
+        self._size = size
+        self._spot = spot
+        self._pnl = pnl
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indeks poza zakresem listy transakcji")
+        return Trade(
+            timestamp=self._timestamps[int(self._rows[index])],
+            side="buy" if self._direction[index] > 0 else "sell",
+            price=float(self._price[index]),
+            size=float(self._size[index]),
+            spot_allocation=float(self._spot[index]),
+            pnl=float(self._pnl[index]),
+        )
+
+    def __iter__(self) -> Iterator[Trade]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    @property
+    def pnl(self) -> Sequence[float]:
+        """Kolumna PnL bez materializacji transakcji."""
+
+        return self._pnl
+
+
 @dataclass(slots=True)
 class StrategyState:
     equity_curve: List[float]
     spot_balance: List[float]
     metrics: dict
-    trades: List[Trade]
+    trades: Sequence[Trade]
 
 
 class MicrostructureStrategy:
-    def __init__(self, config: StrategyConfig, model: LogisticModel, features: FeatureMatrix) -> None:
+    def __init__(
+        self,
+        config: StrategyConfig,
+        model: LogisticModel,
+        features: FeatureMatrix,
+        probabilities: Sequence[float] | None = None,
+    ) -> None:
         self.config = config
         self.model = model
         self.features = features
+        self.probabilities = probabilities
+
+    def run(self, vectorized: bool = True) -> StrategyState:
+        """Odtwarza decyzje na macierzy cech.
+
+        Tryb wektorowy liczy przewagę, decyzje, opłaty i PnL kolumnami,
+        a krzywe kapitału skumulowaną sumą z kapitałem początkowym jako
+        pierwszym składnikiem, więc wynik jest bit w bit taki jak w pętli
+        (``vectorized=False``). Transakcje zwraca jako ``TradeLog``.
+        """
+
+        probs = self.probabilities
+        if probs is None:
+            probs = self.model.predict_proba(self.features.features)
+        if not vectorized:
+            return self._run_loop(probs)
+        if np is not None:
+            return self._replay_numpy(probs)
+        return self._replay_python(probs)
+
+    def _replay_numpy(self, probs: Any) -> StrategyState:
+        config = self.config
+        probs = np.asarray(probs, dtype=np.float64)
+        target = np.asarray(self.features.target, dtype=np.float64)[: len(probs)]
+        edge_bps = (probs - 0.5) * 10_000
+        confidence = np.abs(probs - 0.5) * 2
+        take, direction, size = decide_execution_arrays(
+            edge_bps, config.fee_rate, EXPECTED_SLIPPAGE_BPS, confidence, config.decision_threshold
+        )
+        rows = np.flatnonzero(take & (target != 0.5))
+        direction = direction[rows]
+        size = size[rows]
+        size = np.where(size < config.max_position, size, config.max_position)
+        price = np.asarray(self.features.column(0), dtype=np.float64)[rows]
+        fee = price * size * config.fee_rate
+        pnl = direction * (target[rows] - 0.5) * np.asarray(self.features.spread, dtype=np.float64)[rows]
+        spot = np.where(pnl > 0.0, pnl, 0.0) * 0.5
+        equity_curve = np.cumsum(np.concatenate(([config.capital], pnl - fee))).tolist()
+        spot_curve = np.cumsum(np.concatenate(([0.0], spot))).tolist()
+        trades = TradeLog(self.features.timestamps, rows, direction, price, size, spot, pnl)
+        return self._state(equity_curve, spot_curve, trades)
+
+    def _replay_python(self, probs: Sequence[float]) -> StrategyState:
+        config = self.config
+        threshold = config.decision_threshold
+        fee_bps = config.fee_rate * 10_000
+        target = self.features.target
+        spread = self.features.spread
+        prices = self.features.column(0)
+        rows: List[int] = []
+        direction: List[float] = []
+        price: List[float] = []
+        size: List[float] = []
+        spot: List[float] = []
+        pnl: List[float] = []
+        deltas: List[float] = []
+        for idx, prob in enumerate(probs):
+            outcome = target[idx]
+            if outcome == 0.5:
+                continue
+            edge_bps = (prob - 0.5) * 10_000
+            confidence = abs(prob - 0.5) * 2
+            if confidence < threshold or edge_bps - fee_bps - EXPECTED_SLIPPAGE_BPS <= 0:
+                continue
+            sign = 1 if edge_bps > 0 else -1
+            row_price = prices[idx]
+            row_size = min(config.max_position, min(1.0, confidence))
+            row_pnl = sign * (outcome - 0.5) * spread[idx]
+            rows.append(idx)
+            direction.append(sign)
+            price.append(row_price)
+            size.append(row_size)
+            spot.append(max(0.0, row_pnl) * 0.5)
+            pnl.append(row_pnl)
+            deltas.append(row_pnl - row_price * row_size * config.fee_rate)
+        equity_curve = list(accumulate(deltas, initial=config.capital))
+        spot_curve = list(accumulate(spot, initial=0.0))
+        trades = TradeLog(self.features.timestamps, rows, direction, price, size, spot, pnl)
+        return self._state(equity_curve, spot_curve, trades)
+
+    @staticmethod
+    def _state(equity_curve: List[float], spot_curve: List[float], trades: TradeLog) -> StrategyState:
+        metrics = {
+            "trade_count": len(trades),
+            "final_equity": equity_curve[-1],
+            "spot_saved": spot_curve[-1],
+        }
+        return StrategyState(equity_curve=equity_curve, spot_balance=spot_curve, metrics=metrics, trades=trades)
+
+    def _run_loop(self, probs: Sequence[float]) -> StrategyState:
+        """Referencyjna pętla wiersz po wierszu z ``decide_execution``."""
 
-    def run(self) -> StrategyState:
         capital = self.config.capital
         spot = 0.0
         equity_curve: List[float] = [capital]
         spot_curve: List[float] = [spot]
         trades: List[Trade] = []
 
-        probs = self.model.predict_proba(self.features.features)
         for idx, prob in enumerate(probs):
             if self.features.target[idx] == 0.5:
                 continue
@@ -50,7 +206,7 @@ class MicrostructureStrategy:
             decision = decide_execution(
                 edge_bps=edge_bps,
                 fee_rate=self.config.fee_rate,
-                expected_slippage_bps=3.0,
+                expected_slippage_bps=EXPECTED_SLIPPAGE_BPS,
                 confidence=abs(prob - 0.5) * 2,
                 threshold=self.config.decision_threshold,
             )
@@ -83,3 +239,49 @@ class MicrostructureStrategy:
             "spot_saved": spot,
         }
         return StrategyState(equity_curve=equity_curve, spot_balance=spot_curve, metrics=metrics, trades=trades)
+
+
+def replay_metrics(
+    configs: Sequence[StrategyConfig],
+    features: FeatureMatrix,
+    probabilities: Sequence[float],
+    chunk_cells: int = 1 << 22,
+) -> List[dict]:
+    """Metryki replayu dla wielu konfiguracji przy wspólnych prawdopodobieństwach.
+
+    Z NumPy wszystkie konfiguracje liczone są naraz jako macierz
+    (konfiguracja × wiersz), w porcjach po ``chunk_cells`` komórek; wiersze
+    bez transakcji wnoszą dokładne zero, więc metryki są identyczne z
+    ``MicrostructureStrategy.run``. Zwraca słowniki jak ``StrategyState.metrics``.
+    """
+
+    if np is None:
+        return [MicrostructureStrategy(config, None, features, probabilities).run().metrics for config in configs]
+    probs = np.asarray(probabilities, dtype=np.float64)
+    target = np.asarray(features.target, dtype=np.float64)[: len(probs)]
+    price = np.asarray(features.column(0), dtype=np.float64)[: len(probs)]
+    spread = np.asarray(features.spread, dtype=np.float64)[: len(probs)]
+    edge_bps = (probs - 0.5) * 10_000
+    confidence = np.abs(probs - 0.5) * 2
+    direction = np.where(edge_bps > 0, 1.0, -1.0)
+    pnl = direction * (target - 0.5) * spread
+    spot = np.where(pnl > 0.0, pnl, 0.0) * 0.5
+    base_size = np.where(confidence < 1.0, confidence, 1.0)
+    labelled = target != 0.5
+    step = max(1, chunk_cells // max(1, len(probs)))
+    results: List[dict] = []
+    for start in range(0, len(configs), step):
+        block = configs[start : start + step]
+        threshold = np.array([[config.decision_threshold] for config in block])
+        fee_rate = np.array([[config.fee_rate] for config in block])
+        max_position = np.array([[config.max_position] for config in block])
+        capital = np.array([[config.capital] for config in block])
+        net_edge = edge_bps - (fee_rate * 10_000) - EXPECTED_SLIPPAGE_BPS
+        take = ~(confidence < threshold) & ~(net_edge <= 0) & labelled
+        size = np.where(base_size < max_position, base_size, max_position)
+        deltas = np.where(take, pnl - price * size * fee_rate, 0.0)
+        equity = np.cumsum(np.concatenate((capital, deltas), axis=1), axis=1)[:, -1]
+        saved = np.cumsum(np.concatenate((np.zeros_like(capital), np.where(take, spot, 0.0)), axis=1), axis=1)[:, -1]
+        for count, final, spot_saved in zip(take.sum(axis=1).tolist(), equity.tolist(), saved.tolist()):
+            results.append({"trade_count": count, "final_equity": final, "spot_saved": spot_saved})
+    return results
@@ -1,115 +1,301 @@
-"""Wyliczanie cech mikrostruktury księgi zleceń bez bibliotek zewnętrznych."""
+"""Wyliczanie cech mikrostruktury księgi zleceń bez bibliotek zewnętrznych.
+
+Jeśli dostępny jest NumPy, cechy liczone są jako operacje na kolumnach.
+"""
 
 from __future__ import annotations
 
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass
 from statistics import pstdev
-from typing import Dict, List, Sequence, Tuple
+from typing import Any, Dict, Iterator, List, Tuple
+
+from elbotto.core.numeric import np
+from elbotto.data.orderbook import OrderBookSeries, ns_to_isoformat
+from elbotto.microstructure.rolling import rolling_std
+
+
+FEATURE_NAMES = (
+    "mid",
+    "spread",
+    "microprice_edge",
+    "imbalance",
+    "queue_pressure",
+    "delta_mid",
+    "delta_volume",
+    "rolling_vol",
+)
+
+
+class FeatureTable(Sequence):
+    """Tabela cech w jednym ciągłym buforze ``array('d')``, wiersz po wierszu.
+
+    Zamiennik dwuwymiarowej tablicy NumPy dla środowisk bez NumPy: wiersze
+    są widokami ``memoryview``, a wycinki wierszy dzielą bufor z oryginałem.
+    """
+
+    __slots__ = ("_data", "_view", "_width", "_start", "_stop")
+
+    def __init__(self, data: array, width: int, start: int = 0, stop: int | None = None) -> None:
+        self._data = data
+        self._view = memoryview(data)
+        self._width = width
+        self._start = start
+        self._stop = len(data) // width if stop is None else stop
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), self._width
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[idx] for idx in range(start, stop, step)]
+            return FeatureTable(self._data, self._width, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indeks poza zakresem tabeli cech")
+        offset = (self._start + index) * self._width
+        return self._view[offset : offset + self._width]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        width = self._width
+        view = self._view
+        for offset in range(self._start * width, self._stop * width, width):
+            yield view[offset : offset + width]
+
+    def __reduce__(self):
+        flat = self._data[self._start * self._width : self._stop * self._width]
+        return FeatureTable, (flat, self._width)
+
+    def column(self, index: int) -> array:
+        """Zwraca kopię jednej kolumny jako ``array('d')``."""
+
+        width = self._width
+        return self._data[self._start * width + index : self._stop * width : width]
+
+    def tolist(self) -> List[List[float]]:
+        return [row.tolist() for row in self]
+
+
+class TimestampColumn(Sequence):
+    """Leniwa kolumna znaczników czasu w formacie ISO nad nanosekundami.
+
+    Tekst powstaje dopiero przy odczycie wiersza, a wycinki dzielą bufor
+    z kolumną ``timestamps`` serii.
+    """
+
+    __slots__ = ("_values", "_start", "_stop")
+
+    def __init__(self, values: Sequence[int], start: int = 0, stop: int | None = None) -> None:
+        self._values = values
+        self._start = start
+        self._stop = len(values) if stop is None else stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[idx] for idx in range(start, stop, step)]
+            return TimestampColumn(self._values, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indeks poza zakresem kolumny czasu")
+        return ns_to_isoformat(int(self._values[self._start + index]))
+
+    def __iter__(self) -> Iterator[str]:
+        values = self._values
+        for idx in range(self._start, self._stop):
+            yield ns_to_isoformat(int(values[idx]))
+
+    def __reduce__(self):
+        return TimestampColumn, (array("q", self._values[self._start : self._stop]),)
+
+
+def _range_view(column: Any, start: int, stop: int) -> Any:
+    """Wycinek kolumny bez kopiowania danych."""
+
+    if isinstance(column, array):
+        return memoryview(column)[start:stop]
+    return column[start:stop]
+
+
+def _owned(column: Any) -> Any:
+    """Kopia widoku ``memoryview`` jako ``array`` (np. do serializacji)."""
 
-from elbotto.data.orderbook import OrderBookSample, OrderBookSeries
+    if isinstance(column, memoryview):
+        owned = array(column.format)
+        owned.frombytes(column.cast("B"))
+        return owned
+    return column
 
 
 @dataclass(slots=True)
 class FeatureMatrix:
-    features: List[List[float]]
-    target: List[float]
-    spread: List[float]
-    timestamps: List[str]
+    """Cechy, cel i spread jednej pary.
+
+    Z NumPy ``features`` jest tablicą ``float64`` o kształcie (wiersze, cechy),
+    a ``target``/``spread`` tablicami 1-D; bez NumPy są to ``FeatureTable``
+    oraz ``array('d')``. ``view`` zwraca zakres wierszy dzielący bufory
+    z oryginałem, więc podziały i foldy nie kopiują tabeli cech.
+    """
+
+    features: Any
+    target: Any
+    spread: Any
+    timestamps: Sequence[str]
     feature_names: Tuple[str, ...]
 
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def __reduce__(self):
+        return FeatureMatrix, (
+            self.features,
+            _owned(self.target),
+            _owned(self.spread),
+            self.timestamps,
+            self.feature_names,
+        )
+
+    def view(self, start: int, stop: int | None = None) -> "FeatureMatrix":
+        """Zwraca wiersze ``[start, stop)`` jako widok bez kopiowania."""
+
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        return FeatureMatrix(
+            features=self.features[start:stop],
+            target=_range_view(self.target, start, stop),
+            spread=_range_view(self.spread, start, stop),
+            timestamps=_range_view(self.timestamps, start, stop),
+            feature_names=self.feature_names,
+        )
+
+    def column(self, index: int) -> Any:
+        """Zwraca kolumnę cechy o podanym indeksie."""
 
-def _microprice(sample: OrderBookSample) -> float:
-    total = sample.bid_size_1 + sample.ask_size_1
+        if np is not None and isinstance(self.features, np.ndarray):
+            return self.features[:, index]
+        return self.features.column(index)
+
+
+def _microprice(bid: float, bid_size: float, ask: float, ask_size: float) -> float:
+    total = bid_size + ask_size
     if total == 0:
-        return (sample.bid_price_1 + sample.ask_price_1) / 2
-    return (sample.ask_price_1 * sample.bid_size_1 + sample.bid_price_1 * sample.ask_size_1) / total
+        return (bid + ask) / 2
+    return (ask * bid_size + bid * ask_size) / total
 
 
-def _imbalance(sample: OrderBookSample) -> float:
-    total = sample.bid_size_1 + sample.ask_size_1
+def _imbalance(bid_size: float, ask_size: float) -> float:
+    total = bid_size + ask_size
     if total == 0:
         return 0.0
-    return (sample.bid_size_1 - sample.ask_size_1) / total
-
-
-def _rolling_std(values: List[float], window: int) -> List[float]:
-    result: List[float] = []
-    for idx in range(len(values)):
-        start = max(0, idx - window + 1)
-        segment = values[start : idx + 1]
-        if len(segment) < 2:
-            result.append(0.0)
-        else:
-            result.append(pstdev(segment))
-    return result
+    return (bid_size - ask_size) / total
 
 
-def build_feature_matrix(series: OrderBookSeries, horizon: int = 5) -> FeatureMatrix:
-    if horizon <= 0:
-        raise ValueError("horizon musi być dodatni")
+def _build_columns_numpy(series: OrderBookSeries, horizon: int) -> Tuple[Any, Any, Any]:
+    def column(name: str) -> Any:
+        return np.asarray(series.column(name), dtype=np.float64)
 
-    bids_1 = [sample.bid_price_1 for sample in series.samples]
-    asks_1 = [sample.ask_price_1 for sample in series.samples]
-    bids_2 = [sample.bid_price_2 for sample in series.samples]
-    asks_2 = [sample.ask_price_2 for sample in series.samples]
-    bid_sizes = [sample.bid_size_1 + sample.bid_size_2 for sample in series.samples]
-    ask_sizes = [sample.ask_size_1 + sample.ask_size_2 for sample in series.samples]
-    volumes = [sample.trade_volume for sample in series.samples]
+    bids_1 = column("bid_price_1")
+    asks_1 = column("ask_price_1")
+    bid_sizes_1 = column("bid_size_1")
+    ask_sizes_1 = column("ask_size_1")
+    volumes = column("trade_volume")
 
-    mids = [(bid + ask) / 2 for bid, ask in zip(bids_1, asks_1)]
-    spread = [ask - bid for bid, ask in zip(bids_1, asks_1)]
-    microprices = [_microprice(sample) for sample in series.samples]
-    imbalance = [_imbalance(sample) for sample in series.samples]
+    mids = (bids_1 + asks_1) / 2
+    spread = asks_1 - bids_1
+    total = bid_sizes_1 + ask_sizes_1
+    nonzero = total != 0
+    microprices = mids.copy()
+    np.divide(asks_1 * bid_sizes_1 + bids_1 * ask_sizes_1, total, out=microprices, where=nonzero)
+    imbalance = np.zeros_like(mids)
+    np.divide(bid_sizes_1 - ask_sizes_1, total, out=imbalance, where=nonzero)
 
+    features = np.empty((len(mids), len(FEATURE_NAMES)), dtype=np.float64)
+    features[:, 0] = mids
+    features[:, 1] = spread
+    features[:, 2] = microprices - mids
+    features[:, 3] = imbalance
+    features[:, 4] = (bid_sizes_1 + column("bid_size_2")) - (ask_sizes_1 + column("ask_size_2"))
+    features[:, 5] = np.diff(mids, prepend=mids[:1])
+    features[:, 6] = np.diff(volumes, prepend=volumes[:1])
+    features[:, 7] = rolling_std(features[:, 5], 5)
+
+    future_mid = np.concatenate((mids[horizon:], np.repeat(mids[-1], min(horizon, len(mids)))))
+    target = (future_mid > mids).astype(np.float64)
+    target[max(0, len(target) - horizon) :] = 0.5
+    return features, target, spread
+
+
+def _build_columns_python(series: OrderBookSeries, horizon: int) -> Tuple[FeatureTable, array, array]:
+    bids_1 = series.bid_price_1
+    asks_1 = series.ask_price_1
+    bid_sizes_1 = series.bid_size_1
+    ask_sizes_1 = series.ask_size_1
+    volumes = series.trade_volume
+
+    mids = [(bid + ask) / 2 for bid, ask in zip(bids_1, asks_1)]
+    spread = array("d", [ask - bid for bid, ask in zip(bids_1, asks_1)])
     delta_mid = [0.0]
     delta_mid.extend(m2 - m1 for m1, m2 in zip(mids, mids[1:]))
     delta_volume = [0.0]
     delta_volume.extend(v2 - v1 for v1, v2 in zip(volumes, volumes[1:]))
-    rolling_std = _rolling_std(delta_mid, 5)
-
-    feature_rows: List[List[float]] = []
-    for idx in range(len(series.samples)):
-        feature_rows.append(
-            [
-                mids[idx],
-                spread[idx],
-                microprices[idx] - mids[idx],
-                imbalance[idx],
-                bid_sizes[idx] - ask_sizes[idx],
-                delta_mid[idx],
-                delta_volume[idx],
-                rolling_std[idx],
-            ]
-        )
+    columns = (
+        mids,
+        spread,
+        [_microprice(*level) - mid for level, mid in zip(zip(bids_1, bid_sizes_1, asks_1, ask_sizes_1), mids)],
+        [_imbalance(bid, ask) for bid, ask in zip(bid_sizes_1, ask_sizes_1)],
+        [b1 + b2 - (a1 + a2) for b1, b2, a1, a2 in zip(bid_sizes_1, series.bid_size_2, ask_sizes_1, series.ask_size_2)],
+        delta_mid,
+        delta_volume,
+        rolling_std(delta_mid, 5),
+    )
+
+    width = len(columns)
+    data = array("d", bytes(8 * width * len(mids)))
+    for idx, values in enumerate(columns):
+        data[idx::width] = values if isinstance(values, array) else array("d", values)
 
     future_mid = mids[horizon:] + [mids[-1]] * horizon
-    target = [1.0 if f > c else 0.0 for c, f in zip(mids, future_mid)]
-    for idx in range(len(target) - horizon, len(target)):
+    target = array("d", [1.0 if f > c else 0.0 for c, f in zip(mids, future_mid)])
+    for idx in range(max(0, len(target) - horizon), len(target)):
         target[idx] = 0.5
+    return FeatureTable(data, width), target, spread
 
-    timestamps = [sample.timestamp.isoformat() for sample in series.samples]
-    feature_names = (
-        "mid",
-        "spread",
-        "microprice_edge",
-        "imbalance",
-        "queue_pressure",
-        "delta_mid",
-        "delta_volume",
-        "rolling_vol",
-    )
+
+def build_feature_matrix(series: OrderBookSeries, horizon: int = 5) -> FeatureMatrix:
+    """Wylicza wszystkie cechy kolumnowo do jednej ciągłej tablicy 2-D."""
+
+    if horizon <= 0:
+        raise ValueError("horizon musi być dodatni")
+
+    if np is not None:
+        features, target, spread = _build_columns_numpy(series, horizon)
+    else:
+        features, target, spread = _build_columns_python(series, horizon)
 
     return FeatureMatrix(
-        features=feature_rows,
+        features=features,
         target=target,
         spread=spread,
-        timestamps=timestamps,
-        feature_names=feature_names,
+        timestamps=TimestampColumn(series.timestamps),
+        feature_names=FEATURE_NAMES,
     )
 
 
 def compute_event_windows(series: OrderBookSeries, window_sizes: Sequence[int]) -> Dict[int, float]:
-    mids = [(sample.bid_price_1 + sample.ask_price_1) / 2 for sample in series.samples]
+    mids = series.mid_prices()
     result: Dict[int, float] = {}
     for size in window_sizes:
         if size <= 1 or size > len(mids):
@@ -0,0 +1,313 @@
+"""Statystyki kroczące O(1) na obserwację.
+
+Każda statystyka ma interfejs strumieniowy (``push`` jednej wartości zwraca
+bieżący wynik) oraz wsadowy (funkcja ``rolling_*`` dla całej kolumny). Wersje
+wsadowe zwracają ``array('d')``; dla tablic NumPy średnia i odchylenie liczone
+są wektorowo i zwracają tablicę NumPy.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+from array import array
+from collections import deque
+from typing import Any, Deque, Iterable, List, Set, Tuple
+
+from elbotto.core.numeric import np
+
+
+class RollingMoments:
+    """Średnia i wariancja populacji w oknie (Welford z usuwaniem).
+
+    ``window=None`` daje statystyki narastające od początku strumienia. Po
+    każdej pełnej wymianie okna średnia i ``m2`` są przeliczane od nowa
+    (koszt zamortyzowany O(1)), żeby błąd zaokrągleń nie narastał.
+    """
+
+    __slots__ = ("window", "count", "mean", "m2", "_values", "_since_sync")
+
+    def __init__(self, window: int | None = None) -> None:
+        if window is not None and window <= 0:
+            raise ValueError("window musi być dodatnie")
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._values: Deque[float] = deque()
+        self._since_sync = 0
+
+    def push(self, value: float) -> float:
+        """Dodaje obserwację i zwraca bieżącą wariancję."""
+
+        if self.window is not None and self.count == self.window:
+            old = self._values.popleft()
+            self._values.append(value)
+            self._since_sync += 1
+            if self._since_sync == self.window:
+                self._since_sync = 0
+                self.mean = math.fsum(self._values) / self.count
+                self.m2 = math.fsum((item - self.mean) ** 2 for item in self._values)
+            else:
+                mean = self.mean + (value - old) / self.count
+                self.m2 += (value - old) * (value - mean + old - self.mean)
+                self.mean = mean
+        else:
+            if self.window is not None:
+                self._values.append(value)
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        return self.variance
+
+    @property
+    def variance(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return max(self.m2, 0.0) / self.count
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class EWMA:
+    """Wykładnicza średnia i wariancja ruchoma; ``alpha`` albo ``span``."""
+
+    __slots__ = ("alpha", "mean", "variance", "count")
+
+    def __init__(self, alpha: float | None = None, span: float | None = None) -> None:
+        if alpha is None:
+            if span is None or span < 1:
+                raise ValueError("podaj alpha z (0,1] albo span >= 1")
+            alpha = 2.0 / (span + 1.0)
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha musi leżeć w (0,1]")
+        self.alpha = alpha
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+
+    def push(self, value: float) -> float:
+        """Dodaje obserwację i zwraca bieżącą średnią."""
+
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return value
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+        return self.mean
+
+
+class RollingMinMax:
+    """Minimum i maksimum w oknie na kolejkach monotonicznych."""
+
+    __slots__ = ("window", "_seen", "_min", "_max")
+
+    def __init__(self, window: int) -> None:
+        if window <= 0:
+            raise ValueError("window musi być dodatnie")
+        self.window = window
+        self._seen = 0
+        self._min: Deque[Tuple[int, float]] = deque()
+        self._max: Deque[Tuple[int, float]] = deque()
+
+    def push(self, value: float) -> Tuple[float, float]:
+        """Dodaje obserwację i zwraca ``(min, max)`` okna."""
+
+        idx = self._seen
+        self._seen += 1
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((idx, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((idx, value))
+        expired = idx - self.window
+        if self._min[0][0] <= expired:
+            self._min.popleft()
+        if self._max[0][0] <= expired:
+            self._max.popleft()
+        return self._min[0][1], self._max[0][1]
+
+    @property
+    def min(self) -> float:
+        return self._min[0][1] if self._min else 0.0
+
+    @property
+    def max(self) -> float:
+        return self._max[0][1] if self._max else 0.0
+
+
+class RollingQuantile:
+    """Kwantyl okna na dwóch kopcach z leniwym usuwaniem.
+
+    Zwraca ``sorted(okno)[int(q * (n - 1))]``, czyli tę samą definicję co
+    sortowanie całego okna, ale w czasie O(log w) na obserwację.
+    """
+
+    __slots__ = ("window", "q", "_seen", "_values", "_lower", "_upper", "_lower_size", "_upper_size", "_dead")
+
+    def __init__(self, window: int, q: float) -> None:
+        if window <= 0:
+            raise ValueError("window musi być dodatnie")
+        if not 0 <= q <= 1:
+            raise ValueError("q musi leżeć w [0,1]")
+        self.window = window
+        self.q = q
+        self._seen = 0
+        self._values: Deque[float] = deque()
+        self._lower: List[Tuple[float, int]] = []  # kopiec max jako (-wartość, -indeks)
+        self._upper: List[Tuple[float, int]] = []
+        self._lower_size = 0
+        self._upper_size = 0
+        self._dead: Set[int] = set()
+
+    def _prune(self, heap: List[Tuple[float, int]], negated: bool) -> None:
+        while heap:
+            idx = -heap[0][1] if negated else heap[0][1]
+            if idx not in self._dead:
+                return
+            self._dead.discard(idx)
+            heapq.heappop(heap)
+
+    def _in_lower(self, value: float, idx: int) -> bool:
+        self._prune(self._lower, True)
+        return bool(self._lower) and (value, idx) <= (-self._lower[0][0], -self._lower[0][1])
+
+    def push(self, value: float) -> float:
+        """Dodaje obserwację i zwraca kwantyl okna."""
+
+        idx = self._seen
+        self._seen += 1
+        if len(self._values) == self.window:
+            old_idx = idx - self.window
+            old = self._values.popleft()
+            if self._in_lower(old, old_idx):
+                self._lower_size -= 1
+            else:
+                self._upper_size -= 1
+            self._dead.add(old_idx)
+        self._values.append(value)
+        if self._in_lower(value, idx):
+            heapq.heappush(self._lower, (-value, -idx))
+            self._lower_size += 1
+        else:
+            heapq.heappush(self._upper, (value, idx))
+            self._upper_size += 1
+
+        target = int(self.q * (len(self._values) - 1)) + 1
+        while self._lower_size > target:
+            self._prune(self._lower, True)
+            neg_value, neg_idx = heapq.heappop(self._lower)
+            heapq.heappush(self._upper, (-neg_value, -neg_idx))
+            self._lower_size -= 1
+            self._upper_size += 1
+        while self._lower_size < target:
+            self._prune(self._upper, False)
+            item_value, item_idx = heapq.heappop(self._upper)
+            heapq.heappush(self._lower, (-item_value, -item_idx))
+            self._upper_size -= 1
+            self._lower_size += 1
+        self._prune(self._lower, True)
+        self._prune(self._upper, False)
+        if len(self._lower) + len(self._upper) > 2 * self.window + 16:
+            self._compact()
+        return self.value
+
+    def _compact(self) -> None:
+        """Usuwa martwe wpisy zalegające w głębi kopców."""
+
+        self._lower = [item for item in self._lower if -item[1] not in self._dead]
+        self._upper = [item for item in self._upper if item[1] not in self._dead]
+        heapq.heapify(self._lower)
+        heapq.heapify(self._upper)
+        self._dead.clear()
+
+    @property
+    def value(self) -> float:
+        return -self._lower[0][0] if self._lower_size else 0.0
+
+
+def _as_output(values: Any, result: Iterable[float]) -> Any:
+    if np is not None and isinstance(values, np.ndarray):
+        return np.fromiter(result, dtype=np.float64, count=len(values))
+    return array("d", result)
+
+
+def rolling_std(values: Any, window: int) -> Any:
+    """Odchylenie standardowe populacji w oknie (wierszy z jedną obserwacją: 0)."""
+
+    if np is not None and isinstance(values, np.ndarray):
+        return _rolling_std_numpy(values, window)
+    moments = RollingMoments(window)
+    return array("d", [math.sqrt(moments.push(value)) for value in values])
+
+
+def _rolling_moments_numpy(values: Any, window: int, block: int = 8192) -> Tuple[Any, Any]:
+    """Średnia i wariancja okna z sum skumulowanych liczonych blokami.
+
+    Każdy blok (wraz z ``window - 1`` poprzednimi wierszami) jest najpierw
+    przesuwany o własną średnią, więc sumy kwadratów nie rosną z poziomem
+    serii i wynik zgadza się z :class:`RollingMoments` także dla cen rzędu
+    dziesiątek tysięcy.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    size = len(values)
+    means = np.empty(size)
+    variances = np.empty(size)
+    for first in range(0, size, block):
+        last = min(size, first + block)
+        origin = max(0, first - window + 1)
+        segment = values[origin:last]
+        reference = segment.mean()
+        segment = segment - reference
+        sums = np.concatenate(([0.0], np.cumsum(segment)))
+        sums_sq = np.concatenate(([0.0], np.cumsum(segment * segment)))
+        ends = np.arange(first + 1, last + 1)
+        starts = np.maximum(0, ends - window)
+        counts = ends - starts
+        mean = (sums[ends - origin] - sums[starts - origin]) / counts
+        variances[first:last] = np.maximum((sums_sq[ends - origin] - sums_sq[starts - origin]) / counts - mean * mean, 0.0)
+        variances[first:last][counts < 2] = 0.0
+        means[first:last] = mean + reference
+    return means, variances
+
+
+def _rolling_std_numpy(values: Any, window: int) -> Any:
+    return np.sqrt(_rolling_moments_numpy(values, window)[1])
+
+
+def rolling_mean(values: Any, window: int) -> Any:
+    if np is not None and isinstance(values, np.ndarray):
+        return _rolling_moments_numpy(values, window)[0]
+    moments = RollingMoments(window)
+    result = array("d")
+    for value in values:
+        moments.push(value)
+        result.append(moments.mean)
+    return result
+
+
+def ewma(values: Any, alpha: float | None = None, span: float | None = None) -> Any:
+    state = EWMA(alpha, span)
+    return _as_output(values, (state.push(value) for value in values))
+
+
+def rolling_min(values: Any, window: int) -> Any:
+    state = RollingMinMax(window)
+    return _as_output(values, (state.push(value)[0] for value in values))
+
+
+def rolling_max(values: Any, window: int) -> Any:
+    state = RollingMinMax(window)
+    return _as_output(values, (state.push(value)[1] for value in values))
+
+
+def rolling_quantile(values: Any, window: int, q: float) -> Any:
+    state = RollingQuantile(window, q)
+    return _as_output(values, (state.push(value) for value in values))
@@ -1,11 +1,19 @@
-"""Regresja logistyczna oparta na czystym Pythonie."""
+"""Regresja logistyczna oparta na czystym Pythonie.
+
+Z NumPy trening i predykcja liczone są iloczynami macierz-wektor; bez niego
+gradient liczony jest kolumnami cech zamiast pętli po wierszach.
+"""
 
 from __future__ import annotations
 
 import math
+import random
 from dataclasses import dataclass
-from typing import Iterable, List
+from itertools import repeat
+from operator import add, mul, sub
+from typing import Any, Iterable, List, Sequence, Tuple
 
+from elbotto.core.numeric import np
 from elbotto.ml.objectives import cost_weights, logistic_cost
 
 
@@ -21,50 +29,301 @@ def _sigmoid(value: float) -> float:
     return z / (1 + z)
 
 
+def _sigmoid_array(values: Any) -> Any:
+    z = np.exp(-np.abs(values))
+    return np.where(values >= 0, 1 / (1 + z), z / (1 + z))
+
+
+def _batches(size: int, batch_size: int | None, rng: random.Random) -> List[Sequence[int]]:
+    if not batch_size or batch_size >= size:
+        return [range(size)]
+    order = list(range(size))
+    rng.shuffle(order)
+    return [order[start : start + batch_size] for start in range(0, size, batch_size)]
+
+
+def _column_stats(columns: Any) -> Tuple[List[float], List[float]]:
+    """Średnie i sumy kwadratów odchyleń kolumn (wiersze × cechy lub listy kolumn)."""
+
+    if np is not None and isinstance(columns, np.ndarray):
+        mean = columns.mean(axis=0)
+        return mean.tolist(), ((columns - mean) ** 2).sum(axis=0).tolist()
+    means = [math.fsum(col) / len(col) for col in columns]
+    return means, [math.fsum((value - mean) ** 2 for value in col) for col, mean in zip(columns, means)]
+
+
+def _gradient(columns: Any, y: Any, weights_cost: Any, w: List[float], b: float) -> Tuple[List[float], float]:
+    """Średni gradient ważonej straty logistycznej względem wag i wyrazu wolnego."""
+
+    if np is not None and isinstance(columns, np.ndarray):
+        error = (_sigmoid_array(columns @ np.asarray(w) + b) - y) * weights_cost
+        return (columns.T @ error / len(y)).tolist(), float(error.sum()) / len(y)
+    z = [b] * len(y)
+    for col, wi in zip(columns, w):
+        z = list(map(add, z, map(mul, col, repeat(wi))))
+    error = list(map(mul, map(sub, map(_sigmoid, z), y), weights_cost))
+    return [sum(map(mul, error, col)) / len(y) for col in columns], sum(error) / len(y)
+
+
+def _converged(previous: float, loss: float, tol: float | None) -> bool:
+    return tol is not None and abs(previous - loss) <= tol
+
+
+def _train_numpy(
+    x: Any,
+    y: Any,
+    weights_cost: Any,
+    learning_rate: float,
+    epochs: int,
+    batch_size: int | None,
+    tol: float | None,
+    rng: random.Random,
+) -> Tuple[Any, float]:
+    w = np.zeros(x.shape[1])
+    b = 0.0
+    previous = math.inf
+    for _ in range(epochs):
+        full_batch = None
+        for batch in _batches(len(y), batch_size, rng):
+            if isinstance(batch, range):
+                xb, yb, cb = x, y, weights_cost
+            else:
+                xb, yb, cb = x[batch], y[batch], weights_cost[batch]
+            prediction = _sigmoid_array(xb @ w + b)
+            if isinstance(batch, range):
+                full_batch = prediction
+            error = (prediction - yb) * cb
+            scale = learning_rate / len(yb)
+            w -= scale * (xb.T @ error)
+            b -= scale * float(error.sum())
+        if tol is not None:
+            prediction = full_batch if full_batch is not None else _sigmoid_array(x @ w + b)
+            loss = logistic_cost(prediction, y, weights_cost)
+            if _converged(previous, loss, tol):
+                break
+            previous = loss
+    return w, b
+
+
+def _train_python(
+    columns: List[List[float]],
+    y: List[float],
+    weights_cost: List[float],
+    learning_rate: float,
+    epochs: int,
+    batch_size: int | None,
+    tol: float | None,
+    rng: random.Random,
+) -> Tuple[List[float], float]:
+    w = [0.0] * len(columns)
+    b = 0.0
+    previous = math.inf
+    for _ in range(epochs):
+        full_batch = None
+        for batch in _batches(len(y), batch_size, rng):
+            if isinstance(batch, range):
+                cols, yb, cb = columns, y, weights_cost
+            else:
+                cols = [[col[idx] for idx in batch] for col in columns]
+                yb = [y[idx] for idx in batch]
+                cb = [weights_cost[idx] for idx in batch]
+            z = [b] * len(yb)
+            for col, wi in zip(cols, w):
+                z = list(map(add, z, map(mul, col, repeat(wi))))
+            prediction = list(map(_sigmoid, z))
+            if isinstance(batch, range):
+                full_batch = prediction
+            error = list(map(mul, map(sub, prediction, yb), cb))
+            scale = learning_rate / len(yb)
+            w = [wi - scale * sum(map(mul, error, col)) for wi, col in zip(w, cols)]
+            b -= scale * sum(error)
+        if tol is not None:
+            prediction = full_batch
+            if prediction is None:
+                z = [b] * len(y)
+                for col, wi in zip(columns, w):
+                    z = list(map(add, z, map(mul, col, repeat(wi))))
+                prediction = list(map(_sigmoid, z))
+            loss = logistic_cost(prediction, y, weights_cost)
+            if _converged(previous, loss, tol):
+                break
+            previous = loss
+    return w, b
+
+
+@dataclass(slots=True)
+class OnlineState:
+    """Statystyki bieżące do douczania modelu bez powtarzania całego treningu.
+
+    ``count``/``mean``/``m2`` opisują (wygaszany) rozkład cech używany do
+    standaryzacji, a ``grad_sq`` sumy kwadratów gradientów (wagi, potem
+    wyraz wolny) skalujące krok w stylu AdaGrad.
+    """
+
+    count: float
+    mean: List[float]
+    m2: List[float]
+    grad_sq: List[float]
+
+    def merge(self, count: int, mean: List[float], m2: List[float], decay: float) -> None:
+        """Dołącza statystyki nowych wierszy, wygaszając stare o ``decay``."""
+
+        old_count = self.count * decay
+        total = old_count + count
+        for idx, (old_mean, old_m2, new_mean, new_m2) in enumerate(zip(self.mean, self.m2, mean, m2)):
+            delta = new_mean - old_mean
+            self.mean[idx] = old_mean + delta * count / total
+            self.m2[idx] = old_m2 * decay + new_m2 + delta * delta * old_count * count / total
+        self.count = total
+
+    def scales(self) -> List[float]:
+        if not self.count:
+            return [1.0] * len(self.m2)
+        return [math.sqrt(m2 / self.count) or 1.0 for m2 in self.m2]
+
+
 @dataclass(slots=True)
 class LogisticModel:
     weights: List[float]
     bias: float
+    state: OnlineState | None = None
 
     @classmethod
     def train(
         cls,
-        features: List[List[float]],
-        target: List[float],
-        spread: List[float],
+        features: Sequence[Sequence[float]],
+        target: Sequence[float],
+        spread: Sequence[float],
         fee_rate: float,
         learning_rate: float = 0.05,
         epochs: int = 300,
+        batch_size: int | None = None,
+        standardize: bool = False,
+        tol: float | None = None,
+        seed: int = 0,
     ) -> "LogisticModel":
+        """Trenuje model ważony kosztami metodą spadku gradientu.
+
+        ``standardize`` uczy na cechach o zerowej średniej i jednostkowej
+        wariancji, a wynik przelicza z powrotem na wagi surowych cech.
+        ``batch_size`` włącza mini-batche (tasowane ziarnem ``seed``), a
+        ``tol`` zatrzymuje trening, gdy ważona strata z
+        ``elbotto.ml.objectives`` zmienia się o mniej niż ``tol`` na epokę.
+        Domyślnie (bez standaryzacji, ``tol=None``) to stały optymalizator
+        z ``epochs`` epokami, jak dotąd.
+        """
+
+        rng = random.Random(seed)
+        if np is not None:
+            keep = np.asarray(target, dtype=np.float64) != 0.5
+            if not keep.any():
+                return cls(weights=[0.0] * len(features[0]), bias=0.0)
+            x = np.asarray(features, dtype=np.float64)[keep]
+            y = np.asarray(target, dtype=np.float64)[keep]
+            weights_cost = cost_weights(np.asarray(spread, dtype=np.float64)[keep], fee_rate)
+            state = OnlineState(len(y), *_column_stats(x), grad_sq=[0.0] * (x.shape[1] + 1))
+            mean = np.asarray(state.mean) if standardize else np.zeros(x.shape[1])
+            scale = np.asarray(state.scales()) if standardize else np.ones(x.shape[1])
+            w, b = _train_numpy((x - mean) / scale, y, weights_cost, learning_rate, epochs, batch_size, tol, rng)
+            w = w / scale
+            return cls(weights=w.tolist(), bias=b - float(np.dot(w, mean)), state=state)
+
         mask = [t != 0.5 for t in target]
-        x = [row for row, keep in zip(features, mask) if keep]
-        y = [t for t in target if t != 0.5]
-        if not x:
+        if not any(mask):
             return cls(weights=[0.0] * len(features[0]), bias=0.0)
-        w = [0.0] * len(x[0])
-        b = 0.0
+        rows = [row for row, keep in zip(features, mask) if keep]
+        columns = [list(col) for col in zip(*rows)]
+        y = [t for t, keep in zip(target, mask) if keep]
         weights_cost = cost_weights([s for s, keep in zip(spread, mask) if keep], fee_rate)
+        state = OnlineState(len(y), *_column_stats(columns), grad_sq=[0.0] * (len(columns) + 1))
+        means = [0.0] * len(columns)
+        scales = [1.0] * len(columns)
+        if standardize:
+            means, scales = list(state.mean), state.scales()
+            columns = [[(value - mean) / scale for value in col] for col, mean, scale in zip(columns, means, scales)]
+        w, b = _train_python(columns, y, weights_cost, learning_rate, epochs, batch_size, tol, rng)
+        w = [wi / scale for wi, scale in zip(w, scales)]
+        return cls(weights=w, bias=b - sum(wi * mean for wi, mean in zip(w, means)), state=state)
+
+    def partial_fit(
+        self,
+        features: Sequence[Sequence[float]],
+        target: Sequence[float],
+        spread: Sequence[float],
+        fee_rate: float,
+        learning_rate: float = 0.05,
+        epochs: int = 1,
+        decay: float = 1.0,
+    ) -> "LogisticModel":
+        """Douczanie na nowych wierszach, startujące z bieżących wag.
+
+        Koszt zależy tylko od liczby nowych wierszy. ``decay`` < 1 wygasza
+        wcześniejsze statystyki cech i gradientów, dzięki czemu model podąża
+        za zmianą reżimu. Zwraca ten sam, zaktualizowany model.
+        """
+
+        if not 0 < decay <= 1:
+            raise ValueError("decay musi leżeć w (0,1]")
+        if np is not None:
+            keep = np.asarray(target, dtype=np.float64) != 0.5
+            if not keep.any():
+                return self
+            columns = np.asarray(features, dtype=np.float64)[keep]
+            y = np.asarray(target, dtype=np.float64)[keep]
+            weights_cost = cost_weights(np.asarray(spread, dtype=np.float64)[keep], fee_rate)
+        else:
+            mask = [t != 0.5 for t in target]
+            if not any(mask):
+                return self
+            columns = [list(col) for col in zip(*(row for row, keep in zip(features, mask) if keep))]
+            y = [t for t, keep in zip(target, mask) if keep]
+            weights_cost = cost_weights([s for s, keep in zip(spread, mask) if keep], fee_rate)
+
+        if self.state is None:
+            self.state = OnlineState(0.0, [0.0] * len(self.weights), [0.0] * len(self.weights), [0.0] * (len(self.weights) + 1))
+        state = self.state
+        state.merge(len(y), *_column_stats(columns), decay=decay)
+        means, scales = state.mean, state.scales()
+        if np is not None:
+            columns = (columns - np.asarray(means)) / np.asarray(scales)
+        else:
+            columns = [[(value - mean) / scale for value in col] for col, mean, scale in zip(columns, means, scales)]
+
+        w = [wi * scale for wi, scale in zip(self.weights, scales)]
+        b = self.bias + sum(wi * mean for wi, mean in zip(self.weights, means))
         for _ in range(epochs):
-            grad_w = [0.0] * len(w)
-            grad_b = 0.0
-            for row, label, weight in zip(x, y, weights_cost):
-                prediction = _sigmoid(_dot(row, w) + b)
-                error = (prediction - label) * weight
-                for idx, value in enumerate(row):
-                    grad_w[idx] += error * value
-                grad_b += error
-            scale = 1 / len(x)
-            w = [wi - learning_rate * scale * g for wi, g in zip(w, grad_w)]
-            b -= learning_rate * scale * grad_b
-        return cls(weights=w, bias=b)
-
-    def predict_proba(self, features: List[List[float]]) -> List[float]:
+            grad_w, grad_b = _gradient(columns, y, weights_cost, w, b)
+            grads = grad_w + [grad_b]
+            state.grad_sq = [acc * decay + g * g for acc, g in zip(state.grad_sq, grads)]
+            steps = [learning_rate * g / (math.sqrt(acc) + 1e-12) for g, acc in zip(grads, state.grad_sq)]
+            w = [wi - step for wi, step in zip(w, steps)]
+            b -= steps[-1]
+        self.weights = [wi / scale for wi, scale in zip(w, scales)]
+        self.bias = b - sum(wi * mean for wi, mean in zip(self.weights, means))
+        return self
+
+    def predict_proba(self, features: Sequence[Sequence[float]]) -> Any:
+        if np is not None:
+            x = np.asarray(features, dtype=np.float64)
+            if not len(x):
+                return np.zeros(0)
+            return _sigmoid_array(x @ np.asarray(self.weights) + self.bias)
         return [_sigmoid(_dot(row, self.weights) + self.bias) for row in features]
 
-    def score(self, features: List[List[float]], target: List[float], spread: List[float], fee_rate: float) -> float:
-        pred = self.predict_proba(features)
-        mask = [t != 0.5 for t in target]
-        filtered_pred = [p for p, keep in zip(pred, mask) if keep]
-        filtered_target = [t for t in target if t != 0.5]
-        filtered_spread = [s for s, keep in zip(spread, mask) if keep]
-        return logistic_cost(filtered_pred, filtered_target, cost_weights(filtered_spread, fee_rate))
+    def score(self, features: Sequence[Sequence[float]], target: Sequence[float], spread: Sequence[float], fee_rate: float) -> float:
+        return score_predictions(self.predict_proba(features), target, spread, fee_rate)
+
+
+def score_predictions(pred: Any, target: Sequence[float], spread: Sequence[float], fee_rate: float) -> float:
+    """Ważona kosztami strata dla gotowych prawdopodobieństw."""
+
+    if np is not None:
+        target_array = np.asarray(target, dtype=np.float64)
+        keep = target_array != 0.5
+        filtered_spread = np.asarray(spread, dtype=np.float64)[keep]
+        return logistic_cost(np.asarray(pred, dtype=np.float64)[keep], target_array[keep], cost_weights(filtered_spread, fee_rate))
+    mask = [t != 0.5 for t in target]
+    filtered_pred = [p for p, keep in zip(pred, mask) if keep]
+    filtered_target = [t for t in target if t != 0.5]
+    filtered_spread = [s for s, keep in zip(spread, mask) if keep]
+    return logistic_cost(filtered_pred, filtered_target, cost_weights(filtered_spread, fee_rate))
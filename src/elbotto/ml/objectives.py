@@ -1,19 +1,31 @@
-"""Funkcje celu bez zależności zewnętrznych."""
+"""Funkcje celu bez zależności zewnętrznych.
+
+Tablice NumPy (jeśli dostępne) są liczone wektorowo.
+"""
 
 from __future__ import annotations
 
 import math
-from typing import Iterable, List
+from typing import Any, Iterable, List
+
+from elbotto.core.numeric import np
 
 
 def logistic_cost(pred: Iterable[float], target: Iterable[float], weights: Iterable[float] | None = None) -> float:
+    eps = 1e-9
+    if np is not None and isinstance(pred, np.ndarray):
+        p = np.clip(pred, eps, 1 - eps)
+        t = np.asarray(target, dtype=np.float64)
+        w = np.ones_like(p) if weights is None else np.asarray(weights, dtype=np.float64)
+        total = float(w.sum())
+        loss = float(np.dot(w, -(t * np.log(p) + (1 - t) * np.log(1 - p))))
+        return loss / total if total else 0.0
     preds = list(pred)
     targets = list(target)
     if weights is None:
         weights_list = [1.0] * len(preds)
     else:
         weights_list = list(weights)
-    eps = 1e-9
     total_weight = sum(weights_list)
     loss = 0.0
     for p, t, w in zip(preds, targets, weights_list):
@@ -22,7 +34,12 @@ def logistic_cost(pred: Iterable[float], target: Iterable[float], weights: Itera
     return loss / total_weight if total_weight else 0.0
 
 
-def cost_weights(spread: Iterable[float], fee_rate: float) -> List[float]:
+def cost_weights(spread: Iterable[float], fee_rate: float) -> Any:
+    """Wagi kosztowe wierszy; dla tablicy NumPy zwraca tablicę, inaczej listę."""
+
+    if np is not None and isinstance(spread, np.ndarray):
+        edge = np.maximum(spread / 2 - fee_rate, 0)
+        return 1 + edge / (fee_rate + 1e-6)
     weights: List[float] = []
     for sp in spread:
         edge = max(sp / 2 - fee_rate, 0)
@@ -17,6 +17,7 @@ DEFAULT_DATASET = Path("data/binance_order_book_small.csv")
 def run_quickstart(
     dataset_path: Path | str = DEFAULT_DATASET,
     config: StrategyConfig | None = None,
+    workers: int = 1,
 ) -> Tuple[Dict[str, BacktestReport], ImpactReport]:
     """Uruchamia backtest i analizę wpływu cech na zadanym zbiorze danych."""
 
@@ -25,7 +26,7 @@ def run_quickstart(
         raise FileNotFoundError(f"Nie znaleziono pliku z danymi: {path}")
     series_map: Dict[str, OrderBookSeries] = load_order_book_csv(path)
     effective_config = config or StrategyConfig(decision_threshold=0.55)
-    backtester = Backtester(effective_config)
+    backtester = Backtester(effective_config, workers=workers)
     reports = backtester.run(series_map)
     impacts = evaluate_feature_impacts(series_map, reports)
     return reports, impacts
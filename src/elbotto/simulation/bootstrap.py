@@ -22,15 +22,12 @@ def bootstrap_scenarios(series: OrderBookSeries, steps: int, seed: int | None =
     rng = random.Random(seed)
     scenario: List[ScenarioPoint] = []
     for _ in range(steps):
-        sample = rng.choice(series.samples)
-        mid = (sample.bid_price_1 + sample.ask_price_1) / 2
-        spread = sample.ask_price_1 - sample.bid_price_1
-        total = sample.bid_size_1 + sample.ask_size_1
-        microprice = (
-            (sample.ask_price_1 * sample.bid_size_1 + sample.bid_price_1 * sample.ask_size_1)
-            / total
-            if total
-            else mid
-        )
+        idx = rng.randrange(len(series))
+        bid, ask = series.bid_price_1[idx], series.ask_price_1[idx]
+        bid_size, ask_size = series.bid_size_1[idx], series.ask_size_1[idx]
+        mid = (bid + ask) / 2
+        spread = ask - bid
+        total = bid_size + ask_size
+        microprice = (ask * bid_size + bid * ask_size) / total if total else mid
         scenario.append(ScenarioPoint(mid=mid, spread=spread, microprice=microprice))
     return scenario
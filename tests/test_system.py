@@ -5,7 +5,7 @@ import zipfile
 import pytest
 
 ROOT = Path(__file__).resolve().parents[1]
-sys.path.extend([str(ROOT / "src"), str(ROOT)])
+sys.path.extend([str(ROOT / "src"), str(ROOT), str(ROOT / "elbotto_orderbook_pro")])
 
 from elbotto import (
     Backtester,
@@ -17,6 +17,14 @@ from elbotto import (
     load_order_book_csv,
     run_quickstart,
 )
+from elbotto.data.orderbook import (
+    OrderBookSeries,
+    _parse_timestamp,
+    cache_path_for,
+    datetime_to_ns,
+    parse_timestamps_ns,
+    write_order_book_cache,
+)
 from scripts.package_release import create_install_bundle
 
 DATA_PATH = Path("data/binance_order_book_small.csv")
@@ -32,6 +40,405 @@ def test_backtester_and_reports():
         assert report.validation_loss >= 0
 
 
+def test_parallel_backtester_matches_serial():
+    datasets = load_order_book_csv(DATA_PATH)
+    config = StrategyConfig(training_ratio=0.6)
+    serial = Backtester(config).run(datasets)
+    parallel = Backtester(config, workers=2).run(datasets)
+    assert list(parallel) == list(serial)
+    for symbol, report in serial.items():
+        assert parallel[symbol].state.metrics == report.state.metrics
+        assert parallel[symbol].validation_loss == report.validation_loss
+        assert parallel[symbol].interval_volatility == report.interval_volatility
+
+
+def test_columnar_series_samples_view():
+    datasets = load_order_book_csv(DATA_PATH)
+    series = datasets["BTCUSDT"]
+    assert memoryview(series.bid_price_1).format == "d"
+    assert memoryview(series.timestamps).format == "q"
+    assert len(series.samples) == len(series)
+    first = series.samples[0]
+    assert first.timestamp.isoformat() == "2024-03-04T08:00:00+00:00"
+    assert first.bid_price_1 == series.bid_price_1[0]
+    rebuilt = OrderBookSeries.from_samples(series.symbol, series.samples)
+    assert rebuilt.timestamps == series.timestamps
+    assert rebuilt.trade_volume == series.trade_volume
+
+
+def test_streaming_loader_sorts_unordered_chunks(tmp_path):
+    header, *rows = DATA_PATH.read_text(encoding="utf-8").splitlines()
+    shuffled = tmp_path / "shuffled.csv"
+    shuffled.write_text("\n".join([header, *reversed(rows)]) + "\n", encoding="utf-8")
+    expected = load_order_book_csv(DATA_PATH)
+    loaded = load_order_book_csv(shuffled, chunk_size=5)
+    assert sorted(loaded) == sorted(expected)
+    for symbol, series in expected.items():
+        assert loaded[symbol].timestamps == series.timestamps
+        assert loaded[symbol].ask_price_1 == series.ask_price_1
+
+
+def test_binary_cache_is_reused_until_source_changes(tmp_path):
+    source = tmp_path / "book.csv"
+    source.write_bytes(DATA_PATH.read_bytes())
+    parsed = load_order_book_csv(source)
+    assert not cache_path_for(source).exists()
+    parsed = load_order_book_csv(source, cache=True)
+    assert cache_path_for(source).exists()
+    cached = load_order_book_csv(source, cache=True)
+    assert isinstance(cached["BTCUSDT"].bid_price_1, memoryview)
+    for symbol, series in parsed.items():
+        assert cached[symbol].timestamps == series.timestamps
+        assert cached[symbol].trade_volume == series.trade_volume
+    with source.open("a", encoding="utf-8") as handle:
+        handle.write("2024-03-04T09:00:00Z,BTCUSDT,1,1,2,1,1,1,2,1,1\n")
+    refreshed = load_order_book_csv(source, cache=True)
+    assert not isinstance(refreshed["BTCUSDT"].bid_price_1, memoryview)
+    assert len(refreshed["BTCUSDT"]) == len(parsed["BTCUSDT"]) + 1
+
+    remapped = load_order_book_csv(source, cache=True)
+    closed = remapped["ETHUSDT"].bid_price_1
+    remapped["BTCUSDT"].close()
+    with pytest.raises(ValueError):
+        closed[0]
+    remapped["ETHUSDT"].close()
+    # zamknięte mapowanie nie blokuje podmiany ani usunięcia cache
+    assert write_order_book_cache(source, parsed) == cache_path_for(source)
+    cache_path_for(source).unlink()
+
+
+def test_feature_matrix_columns_match_reference():
+    from statistics import pstdev
+
+    from elbotto.microstructure.features import build_feature_matrix
+
+    series = load_order_book_csv(DATA_PATH)["BTCUSDT"]
+    matrix = build_feature_matrix(series, horizon=3)
+    assert len(matrix.features) == len(series)
+    assert len(matrix.features[0]) == len(matrix.feature_names)
+    mids = series.mid_prices()
+    deltas = [0.0] + [b - a for a, b in zip(mids, mids[1:])]
+    for idx, row in enumerate(matrix.features):
+        assert row[0] == pytest.approx(mids[idx])
+        window = deltas[max(0, idx - 4) : idx + 1]
+        expected = pstdev(window) if len(window) > 1 else 0.0
+        assert row[7] == pytest.approx(expected, abs=1e-9)
+    assert list(matrix.column(1)) == pytest.approx([row[1] for row in matrix.features])
+    assert list(matrix.target[-3:]) == [0.5, 0.5, 0.5]
+
+
+def test_feature_matrix_views_share_buffers():
+    from elbotto.microstructure.features import build_feature_matrix
+
+    series = load_order_book_csv(DATA_PATH)["ETHUSDT"]
+    matrix = build_feature_matrix(series)
+    train, test = Backtester(StrategyConfig(training_ratio=0.5))._split(matrix)
+    assert len(train) + len(test) == len(matrix)
+    assert list(test.features[0]) == list(matrix.features[len(train)])
+    assert test.timestamps[0] == series.samples[len(train)].timestamp.isoformat()
+    assert list(test.target) == list(matrix.target)[len(train) :]
+    inner = test.view(1, 3)
+    assert len(inner) == 2
+    assert inner.spread[0] == matrix.spread[len(train) + 1]
+    assert list(inner.timestamps) == list(matrix.timestamps)[len(train) + 1 : len(train) + 3]
+
+
+def test_logistic_training_keeps_raw_feature_contract():
+    import math
+
+    from elbotto.microstructure.features import build_feature_matrix
+    from elbotto.ml.models import LogisticModel
+
+    matrix = build_feature_matrix(load_order_book_csv(DATA_PATH)["BTCUSDT"], horizon=2)
+    model = LogisticModel.train(matrix.features, matrix.target, matrix.spread, fee_rate=0.0004, standardize=True, tol=1e-7)
+    assert len(model.weights) == len(matrix.feature_names)
+    assert all(isinstance(weight, float) for weight in model.weights)
+    row = list(matrix.features[0])
+    expected = 1 / (1 + math.exp(-(sum(w * x for w, x in zip(model.weights, row)) + model.bias)))
+    assert model.predict_proba(matrix.features)[0] == pytest.approx(expected)
+    batched = LogisticModel.train(matrix.features, matrix.target, matrix.spread, fee_rate=0.0004, batch_size=4, epochs=20, standardize=True)
+    loss = batched.score(matrix.features, matrix.target, matrix.spread, fee_rate=0.0004)
+    assert 0 <= loss < 1
+
+
+def test_partial_fit_warm_starts_and_online_backtest():
+    from elbotto.microstructure.features import build_feature_matrix
+    from elbotto.ml.models import LogisticModel
+
+    matrix = build_feature_matrix(load_order_book_csv(DATA_PATH)["ETHUSDT"], horizon=2)
+    head, tail = matrix.view(0, 6), matrix.view(6)
+    model = LogisticModel.train(head.features, head.target, head.spread, fee_rate=0.0004, standardize=True, tol=1e-7)
+    before = list(model.predict_proba(tail.features))
+    model.partial_fit(tail.features, tail.target, tail.spread, fee_rate=0.0004, epochs=0)
+    assert list(model.predict_proba(tail.features)) == pytest.approx(before)
+    assert model.state.count == 6 + sum(1 for t in tail.target if t != 0.5)
+    loss_before = model.score(tail.features, tail.target, tail.spread, fee_rate=0.0004)
+    model.partial_fit(tail.features, tail.target, tail.spread, fee_rate=0.0004, epochs=25, decay=0.9)
+    assert model.score(tail.features, tail.target, tail.spread, fee_rate=0.0004) < loss_before
+
+    reports = Backtester(StrategyConfig(training_ratio=0.5), refit_every=2, decay=0.95).run(load_order_book_csv(DATA_PATH))
+    for report in reports.values():
+        assert report.validation_loss >= 0
+        assert report.state.metrics["final_equity"] > 0
+
+
+def test_walk_forward_folds_and_parallel_match():
+    from elbotto.backtest.walk_forward import WalkForwardBacktester, walk_forward_windows
+    from elbotto.microstructure.features import build_feature_matrix
+
+    assert walk_forward_windows(10, 4, 3) == [(0, 4, 4, 7), (3, 7, 7, 10)]
+    assert walk_forward_windows(10, 4, 3, step_rows=2, expanding=True)[-1] == (0, 8, 8, 10)
+    datasets = load_order_book_csv(DATA_PATH)
+    config = StrategyConfig(training_ratio=0.6)
+    serial = WalkForwardBacktester(config, train_rows=5, test_rows=2, horizon=2).run(datasets)
+    parallel = WalkForwardBacktester(config, train_rows=5, test_rows=2, horizon=2, workers=2).run(datasets)
+    for symbol, report in serial.items():
+        assert [fold.test_start for fold in report.folds] == [5, 7, 9, 11]
+        assert report.metrics["trade_count"] == sum(fold.state.metrics["trade_count"] for fold in report.folds)
+        assert parallel[symbol].metrics == report.metrics
+    cold = WalkForwardBacktester(config, train_rows=5, test_rows=2, horizon=2, warm_start=False).run(datasets)
+    assert all(report.metrics["mean_validation_loss"] >= 0 for report in cold.values())
+
+    # okna bez wspólnych wierszy: każdy fold od zera, trening w puli zamiast łańcucha
+    disjoint = WalkForwardBacktester(config, train_rows=4, test_rows=2, step_rows=4, horizon=2, workers=2)
+    assert disjoint.cold_starts(len(build_feature_matrix(datasets["BTCUSDT"], horizon=2))) == [True, True]
+    disjoint.fit = None
+    independent = WalkForwardBacktester(config, train_rows=4, test_rows=2, step_rows=4, horizon=2, warm_start=False)
+    expected = independent.run(datasets)
+    assert {symbol: report.metrics for symbol, report in disjoint.run(datasets).items()} == {
+        symbol: report.metrics for symbol, report in expected.items()
+    }
+
+
+def test_walk_forward_warm_start_tracks_cold_fit_window():
+    from elbotto.backtest.walk_forward import WalkForwardBacktester, _train
+    from elbotto.microstructure.features import build_feature_matrix
+
+    matrix = build_feature_matrix(load_order_book_csv(DATA_PATH)["BTCUSDT"], horizon=2)
+    config = StrategyConfig(standardize=True, tol=1e-7)
+    with pytest.raises(ValueError):
+        WalkForwardBacktester(config, train_rows=5, test_rows=1, decay=1.0)
+    with pytest.raises(ValueError):
+        StrategyConfig(tol=0.0)
+    for expanding in (False, True):
+        engine = WalkForwardBacktester(config, train_rows=5, test_rows=1, horizon=2, expanding=expanding)
+        assert engine.effective_decay == (1.0 if expanding else 0.8)
+        for model, (start, stop, _, _) in zip(engine.fit(matrix), engine.windows(len(matrix))):
+            cold = _train(config, matrix.view(start, stop), engine.learning_rate, engine.epochs)
+            # okno kroczące: efektywna liczba wierszy nie rośnie ponad okno, jak przy treningu od zera
+            assert model.state.count == pytest.approx(cold.state.count, abs=1.0 if not expanding else 1e-9)
+            assert model.state.count <= 5.0 + 1e-9 or expanding
+    untrained = WalkForwardBacktester(config, train_rows=5, test_rows=1, horizon=2, epochs=0).fit(matrix)[0]
+    assert untrained.weights == [0.0] * len(matrix.feature_names)
+
+
+def test_vectorized_replay_matches_loop():
+    import random
+
+    from elbotto.exec.strategies.microstructure import MicrostructureStrategy
+    from elbotto.microstructure.features import build_feature_matrix
+
+    matrix = build_feature_matrix(load_order_book_csv(DATA_PATH)["BTCUSDT"], horizon=2)
+    rng = random.Random(7)
+    probs = [rng.random() for _ in range(len(matrix))]
+    strategy = MicrostructureStrategy(StrategyConfig(decision_threshold=0.2, max_position=0.5), None, matrix, probs)
+    loop, fast = strategy.run(vectorized=False), strategy.run()
+    assert fast.metrics == loop.metrics
+    assert fast.equity_curve == loop.equity_curve
+    assert fast.spot_balance == loop.spot_balance
+    assert list(fast.trades) == loop.trades
+
+
+def test_parameter_sweep_matches_backtester(tmp_path):
+    from dataclasses import replace
+
+    from elbotto.backtest.sweep import ParameterSweep
+
+    datasets = load_order_book_csv(DATA_PATH)
+    base = StrategyConfig(training_ratio=0.6)
+    grid = {"decision_threshold": [0.0001, 0.2, 0.58], "max_position": [0.1, 0.75], "fee_rate": [0.0, 0.0004], "standardize": [False, True]}
+    table = ParameterSweep(base).run(datasets, grid)
+    assert len(table) == len(datasets) * 24
+    for row in table.rows:
+        config = replace(base, **{name: row[name] for name in grid})
+        report = Backtester(config).run({row["symbol"]: datasets[row["symbol"]]})[row["symbol"]]
+        assert {key: row[key] for key in report.state.metrics} == report.state.metrics
+        assert row["validation_loss"] == report.validation_loss
+    assert table.to_csv(tmp_path / "sweep.csv").read_text(encoding="utf-8").startswith("symbol,decision_threshold")
+    with pytest.raises(ValueError):
+        ParameterSweep(base).run(datasets, {"risk_limits": [None]})
+
+
+def test_successive_halving_writes_adapter_config(tmp_path):
+    import json
+
+    from elbotto.backtest.search import DEFAULT_SPACE, rung_schedule, sample_candidates, successive_halving, write_best_config
+
+    assert rung_schedule(100, 10, 3) == [10, 30, 90, None]
+    datasets = load_order_book_csv(DATA_PATH)
+    space = {"decision_threshold": [0.5, 0.58], "training_ratio": [0.5, 0.6], "horizon": [2, 3], "epochs": [50]}
+    candidates = sample_candidates(10, space, seed=1)
+    assert len(candidates) == 8 and len({repr(c) for c in candidates}) == 8
+    serial = successive_halving(datasets, candidates, min_rows=4, eta=2)
+    parallel = successive_halving(datasets, candidates, min_rows=4, eta=2, workers=2)
+    assert [item.rows for item in serial.history] == [4] * 8 + [8] * 4 + [None] * 2
+    assert serial.best == parallel.best
+    payload = json.loads(write_best_config(serial, tmp_path / "best_config.json").read_text(encoding="utf-8"))
+    assert payload["strategy"]["decision_threshold"] == serial.best.candidate.config.decision_threshold
+    assert {"horizon", "epochs", "max_position"} <= set(payload["strategy"])
+    assert "fee_rate" not in DEFAULT_SPACE
+
+
+def test_best_config_round_trips_to_live_overrides(tmp_path, monkeypatch):
+    import json
+
+    import live_allinone as live
+    from elbotto.backtest.search import CandidateScore, SearchCandidate, SearchResult, write_best_config
+
+    candidate = SearchCandidate(StrategyConfig(decision_threshold=0.55, max_position=0.75))
+    result = SearchResult(best=CandidateScore(candidate, None, 1.0, 3, 0.5))
+    monkeypatch.chdir(tmp_path)
+    best = json.loads(write_best_config(result, "results/best_config.json", risk_per_trade=0.02).read_text(encoding="utf-8"))
+    overrides = {"threshold": 0.5, "risk_per_trade": 0.01, "max_position": 1.0}
+    overrides.update(best)  # jak elbotto_runtime_adapter.py
+    Path("results/runtime_overrides.json").write_text(json.dumps(overrides), encoding="utf-8")
+    # domyślny tryb porównuje próg z surowym micro_imb – wynik wyszukiwania go nie rusza
+    assert live.read_overrides() == (0.5, 0.02, 1)
+    thr, risk, maxpos = live.read_overrides(online=True)
+    assert thr == pytest.approx(0.1) and risk == 0.02 and maxpos == 1
+    cached = live.CachedOverrides(every=0.0)
+    assert cached.get() == (0.5, 0.02, 1) and cached.get(online=True) == (thr, risk, maxpos)
+    for prob in (0.54, 0.56):
+        assert (2.0 * prob - 1.0 > thr) == (prob > candidate.config.decision_threshold)
+
+
+def test_rolling_statistics_match_window_recomputation():
+    import random
+    import statistics
+
+    from elbotto.microstructure.rolling import EWMA, rolling_max, rolling_min, rolling_quantile, rolling_std
+
+    rng = random.Random(5)
+    values = [rng.choice([rng.random(), 1.0, 0.25]) for _ in range(400)]
+    window = 17
+    quantiles = rolling_quantile(values, window, 0.8)
+    lows, highs, stds = rolling_min(values, window), rolling_max(values, window), rolling_std(values, window)
+    for idx in range(len(values)):
+        chunk = values[max(0, idx - window + 1) : idx + 1]
+        assert quantiles[idx] == sorted(chunk)[int(0.8 * (len(chunk) - 1))]
+        assert (lows[idx], highs[idx]) == (min(chunk), max(chunk))
+        assert stds[idx] ** 2 == pytest.approx(statistics.pvariance(chunk), abs=1e-12)
+    ewma = EWMA(alpha=0.5)
+    assert [ewma.push(value) for value in (1.0, 2.0, 3.0)] == [1.0, 1.5, 2.25]
+
+
+def test_rolling_std_backends_agree_on_price_levels():
+    import random
+
+    from elbotto.microstructure.rolling import rolling_mean, rolling_std
+
+    np = pytest.importorskip("numpy")
+    rng = random.Random(11)
+    level = 60_000.0
+    values = []
+    for _ in range(50_000):
+        level += rng.gauss(0, 0.8)
+        values.append(level)
+    window = 300
+    fast, slow = rolling_std(np.asarray(values), window), rolling_std(values, window)
+    assert float(np.max(np.abs(fast - np.asarray(slow)))) < 1e-8
+    assert int(np.count_nonzero(fast[1:] == 0.0)) == 0
+    assert list(rolling_mean(np.asarray(values), window)) == pytest.approx(list(rolling_mean(values, window)), rel=1e-12)
+
+
+def test_depth_recorder_roundtrip_and_recovery(tmp_path):
+    from elbotto.data.recorder import DepthRecorder, DepthRecording
+
+    path = tmp_path / "BTCUSDT_depth2_20240304.elbrec"
+    start = 1_709_539_140_000  # 2024-03-04 07:59:00 UTC
+    rows = [[start + idx * 500, 100 - idx * 0.01, 99.9, 1.0 + idx, 2.0, 100.1, 100.2, 3.0, 4.0] for idx in range(300)]
+    for codec in ("none", "zlib"):
+        path.unlink(missing_ok=True)
+        path.with_name(path.name + ".idx").unlink(missing_ok=True)
+        with DepthRecorder(path, "btcusdt", 2, codec=codec, block_rows=64) as recorder:
+            for row in rows[:150]:
+                recorder.append(row)
+        with path.open("ab") as handle:
+            handle.write(b"BLK1 partial")
+        torn = DepthRecording(path)
+        assert len(torn) == 150
+        torn_size, kept = torn.blocks[-1].size, 150 - torn.blocks[-1].rows
+        torn.close()
+        with path.open("r+b") as handle:
+            # nagłówek ostatniego bloku na dysku, dane jeszcze nie (zera)
+            handle.seek(-(torn_size + len(b"BLK1 partial")), 2)
+            handle.write(bytes(torn_size))
+        with DepthRecording(path) as check:
+            assert len(check) == kept
+        with DepthRecorder(path, "BTCUSDT", 2, codec=codec, block_rows=64) as recorder:
+            for row in rows[kept:150]:
+                recorder.append(row)
+        with DepthRecorder(path, "BTCUSDT", 2, codec=codec, block_rows=64) as recorder:
+            for row in rows[150:]:
+                recorder.append(row)
+        recording = DepthRecording(path)
+        data = recording.read()
+        assert list(data["ts"]) == [row[0] for row in rows]
+        assert list(data["bid1_qty"]) == [row[3] for row in rows]
+        assert list(recording.hours()) == ["20240304_07", "20240304_08"]
+        assert len(recording.read(start_ms=start + 60_000)["ts"]) == 180
+        recording.close()
+        original = path.read_bytes()[recording.blocks[1].offset + 40 : recording.blocks[1].offset + 48]
+        with path.open("r+b") as handle:
+            handle.seek(recording.blocks[1].offset + 40)
+            handle.write(b"\xff" * 8)
+        with DepthRecording(path) as damaged, pytest.raises(ValueError, match="uszkodzony"):
+            damaged.read()
+        with path.open("r+b") as handle:
+            handle.seek(recording.blocks[1].offset + 40)
+            handle.write(original)
+    series = load_order_book_csv(path)["BTCUSDT"]
+    assert series.timestamps[0] == start * 1_000_000
+    assert list(series.ask_price_2[:2]) == [100.2, 100.2]
+
+
+def test_depth_recording_close_releases_uncompressed_views(tmp_path):
+    from elbotto.data.recorder import DepthRecorder, DepthRecording
+
+    path = tmp_path / "BTCUSDT_depth1_20240304.elbrec"
+    with DepthRecorder(path, "BTCUSDT", 1, codec="none", block_rows=4) as recorder:
+        for idx in range(10):
+            recorder.append([1_709_539_200_000 + idx, 100.0, 1.0, 100.1, 2.0])
+        with pytest.raises(ValueError):
+            recorder.append([1_709_539_200_010, 100.0, 1.0])
+    recording = DepthRecording(path)
+    batches = [cols for cols, _ in recording.iter_batches(batch_rows=1)]
+    columns = recording.block_columns(recording.blocks[0])
+    assert [len(cols["ts"]) for cols in batches] == [4, 4, 2]
+    assert list(batches[0]["ask1_qty"]) == [2.0] * 4
+    recording.close()
+    with pytest.raises(ValueError):
+        columns[0].tolist()
+    with DepthRecording(path) as recording:
+        assert len(recording.read(end_ms=1_709_539_200_003)["ts"]) == 3
+
+
+def test_fast_timestamp_parser_matches_slow_path():
+    values = [
+        "2024-03-04T08:00:00Z",
+        "2024-03-04T08:00:00.125Z",
+        "2024-03-04T08:00:00.5Z",
+        "2024-03-04T08:00:01",
+        "2024-03-04T10:00:01+02:00",
+        "2024-03-04 08:00:02.000001+00:00",
+    ]
+    parsed = parse_timestamps_ns(values)
+    assert list(parsed) == [datetime_to_ns(_parse_timestamp(value)) for value in values]
+    assert list(parse_timestamps_ns(["1761314400082"])) == [1_761_314_400_082_000_000]
+    with pytest.raises(ValueError):
+        parse_timestamps_ns(["2024-13-04T08:00:00Z"])
+
+
 def test_dependencies_and_bootstrap():
     datasets = load_order_book_csv(DATA_PATH)
     deps = analyse_dependencies(datasets)
@@ -76,3 +483,485 @@ def test_package_release():
     with zipfile.ZipFile(archive) as bundle:
         assert "pyproject.toml" in bundle.namelist()
     archive.unlink()
+
+
+def _depth_books(count, levels=3, start=1_709_539_140_000):
+    import random
+
+    rng = random.Random(7)
+    mid = 100.0
+    books = []
+    for idx in range(count):
+        mid += rng.gauss(0, 0.02)
+        bids = [(round(mid - 0.01 * (k + 1), 2), round(rng.random() * 3, 5)) for k in range(levels)]
+        asks = [(round(mid + 0.01 * (k + 1), 2), round(rng.random() * 3, 5)) for k in range(levels)]
+        books.append((start + 100 * idx, bids, asks))
+    return books
+
+
+def test_replay_matches_live_loop_for_csv_and_recordings(tmp_path, monkeypatch):
+    import asyncio
+    import csv
+
+    import live_allinone as live
+    from elbotto.data.recorder import DepthRecorder
+
+    monkeypatch.chdir(tmp_path)
+    Path("results").mkdir()
+    Path("results/runtime_overrides.json").write_text('{"threshold": 0.002}', encoding="utf-8")
+    books = _depth_books(400)
+
+    async def direct():
+        q = asyncio.Queue()
+        for book in books:
+            q.put_nowait(book)
+        q.put_nowait(None)
+        writer = live.BatchedWriter()
+        try:
+            return await live.live_loop(q, "BTCUSDT", 3, None, writer, "none", results_dir="direct")
+        finally:
+            writer.close()
+
+    expected = asyncio.run(direct())
+    assert expected["ticks"] == 400 and expected["equity"] != 0.0
+    direct_equity = Path("direct/equity_paper.csv").read_bytes()
+
+    with open("BTCUSDT_depth3_20240304_07.csv", "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(live.lob_header(3))
+        writer.writerows(live.lob_row(*book, 3) for book in books)
+    sources = ["BTCUSDT_depth3_20240304_07.csv"]
+    for codec in ("none", "zlib"):
+        name = f"BTCUSDT_depth3_20240304_{codec}.elbrec"
+        with DepthRecorder(name, "BTCUSDT", 3, codec=codec, block_rows=64) as recorder:
+            for book in books:
+                recorder.append_book(*book)
+        sources.append(name)
+    digests = set()
+    for source in sources:
+        result = asyncio.run(live.run_replay(live.replay_paths(source), "BTCUSDT", 3))
+        assert (result["ticks"], result["equity"], result["pos"]) == (400, expected["equity"], expected["pos"])
+        assert Path("results/replay/equity_paper.csv").read_bytes() == direct_equity
+        digests.add(result["equity_sha256"])
+    assert len(digests) == 1
+
+
+def test_batched_writer_and_cached_overrides(tmp_path, monkeypatch):
+    import asyncio
+    import json
+    import os
+    import time
+
+    import live_allinone as live
+
+    first, second = tmp_path / "a.csv", tmp_path / "b.csv"
+    first.write_text("x,y\r\n0,0\r\n", encoding="utf-8")
+    writer = live.BatchedWriter(flush_rows=3, flush_sec=0.05, chunk_rows=2, max_chunks=2)
+    for idx in range(25):
+        writer.write(first, [idx, idx * 2], ["x", "y"])
+        writer.write(second, [idx], ["n"])
+    writer.release(second)
+    writer.write(second, [25], ["n"])
+    writer.close()
+    assert first.read_text(encoding="utf-8").splitlines() == ["x,y", "0,0"] + [f"{i},{i * 2}" for i in range(25)]
+    assert second.read_text(encoding="utf-8").splitlines() == ["n"] + [str(i) for i in range(26)]
+
+    class SlowDisk(live.BatchedWriter):
+        def _write_chunk(self, chunk):
+            time.sleep(0.05)
+            return live.BatchedWriter._write_chunk(self, chunk)
+
+    slow_path = tmp_path / "slow.csv"
+    slow = SlowDisk(flush_rows=10, flush_sec=0.05, chunk_rows=2, max_chunks=1)
+    started = time.perf_counter()
+    for idx in range(200):
+        slow.write(slow_path, [idx], ["n"])
+    # pełna kolejka nie blokuje wywołującego (blokujące put czekałoby ~5 s)
+    assert time.perf_counter() - started < 1.0 and slow.deferred > 0
+    slow.close()
+    assert slow_path.read_text(encoding="utf-8").splitlines() == ["n"] + [str(i) for i in range(200)]
+
+    path = tmp_path / "runtime_overrides.json"
+    path.write_text(json.dumps({"threshold": 0.2, "max_position": 3}), encoding="utf-8")
+    cached, lazy = live.CachedOverrides(path, every=0.0), live.CachedOverrides(path, every=3600.0)
+    assert cached.get() == lazy.get() == (0.2, 0.005, 3)
+    path.write_text(json.dumps({"threshold": 0.3}), encoding="utf-8")
+    os.utime(path, ns=(0, 10**18))
+    assert cached.get() == (0.3, 0.005, 1)
+    assert lazy.get() == (0.2, 0.005, 3)
+
+    monkeypatch.chdir(tmp_path)
+    q = asyncio.Queue()
+    for book in _depth_books(5):
+        q.put_nowait(book)
+    q.put_nowait(None)
+    assert asyncio.run(live.live_loop(q, "BTCUSDT", 3, raw_format="none", results_dir="out"))["ticks"] == 5
+    assert len(Path("out/equity_paper.csv").read_text(encoding="utf-8").splitlines()) == 6
+
+
+def test_regime_tracker_matches_window_and_tails_appended_rows(tmp_path):
+    import json
+    import random
+    import statistics
+
+    from elbotto_ob.regime.online import RegimeEngine, RegimeTracker, classify, tail_csv_rows
+
+    rng = random.Random(3)
+    rows = [(100 + rng.gauss(0, 0.5), rng.random(), rng.gauss(0, 1)) for _ in range(120)]
+    tracker, window = RegimeTracker(window=20), 20
+    for mid, spread, ofi in rows:
+        tracker.push(mid, spread, ofi)
+    rets = [((b[0] - a[0]) / (a[0] + 1e-9)) ** 2 for a, b in zip(rows, rows[1:])][-window:]
+    ofis = [(b[2] - a[2]) ** 2 for a, b in zip(rows, rows[1:])][-window:]
+    spreads = [row[1] for row in rows[-window:]]
+    state = tracker.state()
+    assert state["rv"] == pytest.approx(statistics.fmean(rets))
+    assert state["ofi_var"] == pytest.approx(statistics.fmean(ofis))
+    assert state["spread_p80"] == sorted(spreads)[int(0.8 * (window - 1))]
+    assert state["regime"] == classify(state["rv"], state["spread_p80"], state["ofi_var"])
+
+    engine = RegimeEngine(tmp_path / "regime_state.json", window=5, tolerance=0.5)
+    assert engine.push(100.0, 0.1, 0.0) and not engine.push(100.0, 0.1, 0.0)
+    assert json.loads((tmp_path / "regime_state.json").read_text(encoding="utf-8"))["ticks"] == 1
+
+    feed = tmp_path / "features.csv"
+    feed.write_bytes(b"mid,spread,ofi\n1,0.1,0\n2,0.2")
+    lines = tail_csv_rows(feed, poll_sec=0.0, follow=True)
+    assert next(lines) == {"mid": "1", "spread": "0.1", "ofi": "0"}
+    with feed.open("ab") as handle:
+        handle.write(b",1\n")
+    assert next(lines) == {"mid": "2", "spread": "0.2", "ofi": "1"}
+    feed.write_bytes(b"mid,spread,ofi\n3,0.3,2\n")
+    assert next(lines)["mid"] == "3"
+
+
+def _write_lob_csv(path, books, levels=3):
+    import csv
+
+    import live_allinone as live
+
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(live.lob_header(levels))
+        writer.writerows(live.lob_row(*book, levels) for book in books)
+    return path
+
+
+def test_vectorized_featurizer_matches_row_reference(tmp_path):
+    np = pytest.importorskip("numpy")
+    from elbotto_ob.ob.featurizer import compute_feature_columns, microprice, read_columns
+
+    books = _depth_books(50)
+    feats = compute_feature_columns(read_columns(_write_lob_csv(tmp_path / "lob.csv", books)), levels=3)
+
+    def slope(side):
+        prices, qty = [p for p, _ in side], np.cumsum([q for _, q in side])
+        return np.polyfit(qty, prices, 1)[0]
+
+    for idx, (t_ms, bids, asks) in enumerate(books):
+        (b1, qb), (a1, qa) = bids[0], asks[0]
+        bsum, asum = sum(q for _, q in bids), sum(q for _, q in asks)
+        assert feats["ts"][idx] == str(t_ms)
+        assert feats["mid"][idx] == pytest.approx((b1 + a1) / 2)
+        assert feats["microprice"][idx] == pytest.approx(microprice(b1, a1, qb, qa))
+        assert feats["depth_imbalance"][idx] == pytest.approx((bsum - asum) / (bsum + asum + 1e-9))
+        assert feats["book_slope"][idx] == pytest.approx(slope(bids) - slope(asks), rel=1e-6, abs=1e-9)
+
+
+def test_bar_aggregator_time_weights_and_batching():
+    pytest.importorskip("numpy")
+    from elbotto_ob.ob.aggregate import BAR_COLUMNS, BarAggregator, aggregate_bars
+
+    base = 1_700_000_000_000  # ms; wartości < 1e11 byłyby sekundami
+    imb = [0.1, 0.5, -0.2, 0.3, 0.9]
+    feats = {
+        "ts": [str(base + ms) for ms in (0, 400, 1200, 1500, 2600)],
+        "mid": [10.0, 11.0, 9.0, 12.0, 13.0],
+        "spread": [1.0, 3.0, 2.0, 2.0, 1.0],
+        "microprice": [10.1, 11.1, 9.1, 12.1, 13.1],
+        "microprice_imb": imb,
+        "q_imb": imb,
+        "depth_imbalance": imb,
+        "ofi": [1.0, 2.0, 3.0, 4.0, 5.0],
+        "book_slope": [0.0, 2.0, 1.0, 3.0, 4.0],
+    }
+    bars = [dict(zip(BAR_COLUMNS, row)) for row in aggregate_bars(feats, 1.0)]
+    assert [bar["ts"] for bar in bars] == [str(base + ms) for ms in (0, 1000, 2000)]
+    first, second, last = bars
+    assert (first["mid_open"], first["mid_high"], first["mid_low"], first["mid"]) == (10.0, 11.0, 10.0, 11.0)
+    assert (first["spread"], first["spread_max"], first["ofi"], first["n"]) == (2.0, 3.0, 3.0, 2)
+    assert first["microprice_imb"] == pytest.approx((400 * 0.1 + 600 * 0.5) / 1000)
+    # początek baru do pierwszego snapshotu waży poprzednia wartość
+    assert second["q_imb"] == pytest.approx((200 * 0.5 + 300 * -0.2 + 500 * 0.3) / 1000)
+    assert last["depth_imbalance"] == pytest.approx(0.3) and last["n"] == 1
+
+    agg, streamed = BarAggregator(1.0), []
+    for idx in range(5):
+        streamed += agg.push({name: values[idx : idx + 1] for name, values in feats.items()})
+        if idx == 3:
+            assert len(streamed) == 1 and agg.pending_rows == 2
+            assert agg.checkpoint()["prev"]["q_imb"] == pytest.approx(0.5)
+    streamed += agg.close()
+    assert streamed == [list(row) for row in aggregate_bars(feats, 1.0)]
+
+
+def test_featurize_file_resume_matches_single_run(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    from elbotto_ob.ob import featurizer
+
+    src = _write_lob_csv(tmp_path / "lob.csv", _depth_books(300))
+    whole, resumed = tmp_path / "whole.csv", tmp_path / "resumed.csv"
+    rows = featurizer.featurize_file(src, whole, levels=3, agg_sec=1.0, batch_rows=37)
+
+    real = featurizer.iter_batches
+
+    def interrupted(*args, **kwargs):
+        for idx, batch in enumerate(real(*args, **kwargs)):
+            if idx == 3:
+                raise KeyboardInterrupt
+            yield batch
+
+    monkeypatch.setattr(featurizer, "iter_batches", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        featurizer.featurize_file(src, resumed, levels=3, agg_sec=1.0, batch_rows=37)
+    monkeypatch.setattr(featurizer, "iter_batches", real)
+    # niedokończony zapis za punktem kontrolnym musi zostać przycięty
+    with open(resumed, "ab") as handle:
+        handle.write(b"1709539149000,half-written")
+
+    assert featurizer.featurize_file(src, resumed, levels=3, agg_sec=1.0, batch_rows=37, resume=True) == rows
+    assert resumed.read_bytes() == whole.read_bytes()
+    with pytest.raises(ValueError):
+        featurizer.featurize_file(src, resumed, levels=3, agg_sec=2.0, resume=True)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_featurize_hourly_merge_matches_single_file(tmp_path, workers):
+    pytest.importorskip("numpy")
+    from elbotto_ob.ob.featurizer import featurize_file
+    from elbotto_ob.ob.hourly import featurize_hourly
+
+    books = _depth_books(300)
+    hourly = tmp_path / "hourly"
+    hourly.mkdir()
+    # granice plików w środku barów sekundowych
+    for hour, (lo, hi) in enumerate([(0, 95), (95, 212), (212, 300)]):
+        _write_lob_csv(hourly / f"BTCUSDT_depth3_20240304_{hour:02d}.csv", books[lo:hi])
+    featurize_file(_write_lob_csv(tmp_path / "all.csv", books), tmp_path / "single.csv", levels=3, agg_sec=1.0)
+
+    (merged,) = featurize_hourly(hourly, tmp_path / "merged.csv", levels=3, agg_sec=1.0, workers=workers, batch_rows=40)
+    assert merged.read_bytes() == (tmp_path / "single.csv").read_bytes()
+
+
+def _depth_frame(book, stream=None, levels=3):
+    import json
+
+    t_ms, bids, asks = book
+    data = {"E": t_ms, "bids": [[str(p), str(q)] for p, q in bids[:levels]], "asks": [[str(p), str(q)] for p, q in asks[:levels]]}
+    return json.dumps({"stream": stream, "data": data} if stream else data)
+
+
+def test_decode_depth_frames_and_decode_loop_stats():
+    import asyncio
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    import live_allinone as live
+
+    frames = [
+        (json.dumps({"E": 1000, "bids": [["100", "1"], ["99", "2"]], "asks": [["101", "3"]]}), 5.0),
+        ("{not json", 6.0),
+        ("[1, 2]", 6.0),
+        (json.dumps({"bids": [["7", "1"], ["oops", "1"]], "asks": [["8", "1"]]}), 6.0),
+        (json.dumps({"stream": "ethusdt@depth5@100ms", "data": {"lastUpdateId": 1, "bids": [["10", "1"], ["9", "1"], ["8", "1"]],
+                                                                "asks": [["11", "2"], ["12", "4"]]}}), 7.0),
+        (json.dumps({"bids": [], "asks": [["1", "1"]]}), 8.0),
+        (json.dumps({"result": None, "id": 1}), 9.0),
+    ]
+    ts, values, counts, recv, symbols, errors = live.decode_depth_frames(frames, 2)
+    assert errors == 3
+    assert list(ts) == [1000, 7] and list(recv) == [5.0, 7.0] and symbols == [None, "ETHUSDT"]
+    assert list(counts) == [2, 1, 2, 2]
+    assert list(live.iter_snapshots(ts, values, counts, 2)) == [
+        (1000, [(100.0, 1.0), (99.0, 2.0)], [(101.0, 3.0)]),
+        (7, [(10.0, 1.0), (9.0, 1.0)], [(11.0, 2.0), (12.0, 4.0)]),
+    ]
+
+    books = _depth_books(6)
+
+    async def run():
+        raw_q, q = asyncio.Queue(), asyncio.Queue(maxsize=2)
+        for book in books:
+            raw_q.put_nowait((_depth_frame(book), book[0]))
+        stats = live.DecodeStats()
+        with ThreadPoolExecutor(1) as pool:
+            task = asyncio.create_task(live.decode_loop(raw_q, q, 3, stats, pool, max_batch=2))
+            while not q.full() or stats.batches < 2:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            # pełna kolejka wstrzymuje dekodowanie – reszta ramek czeka w raw_q
+            pending = raw_q.qsize()
+            out = [await asyncio.wait_for(q.get(), 5) for _ in books]
+            task.cancel()
+        return pending, out, stats, stats.summary(raw_q, q)
+
+    pending, out, stats, summary = asyncio.run(run())
+    assert pending == 2
+    assert [t_ms for t_ms, _, _ in out] == [t_ms for t_ms, _, _ in books]
+    assert out[0][1] == books[0][1]
+    assert (stats.frames, stats.snapshots, stats.batches) == (6, 6, 3)
+    assert (stats.raw_max, stats.q_max) == (4, 2)
+    assert summary["batch_avg"] == 2.0 and summary["raw_q"] == summary["q"] == 0
+    assert set(summary) == {"frames_per_sec", "batch_avg", "errors", "decode_ms_avg", "decode_ms_max", "lag_ms_avg", "lag_ms_max",
+                            "raw_q", "raw_q_max", "q", "q_max"}
+
+
+def test_combined_stream_routing_and_shard_plan():
+    import asyncio
+
+    import live_allinone as live
+
+    assert live.combined_url(["BTCUSDT", "ethusdt"], 5, "ws://local") == (
+        "ws://local/stream?streams=btcusdt@depth5@100ms/ethusdt@depth5@100ms"
+    )
+    books = _depth_books(6)
+
+    async def run():
+        raw_q = asyncio.Queue()
+        queues = {"BTCUSDT": asyncio.Queue(), "ETHUSDT": asyncio.Queue()}
+        for idx, book in enumerate(books):
+            stream = ("btcusdt", "ethusdt", "dogeusdt")[idx % 3] + "@depth3@100ms"
+            raw_q.put_nowait((_depth_frame(book, stream), book[0]))
+        task = asyncio.create_task(live.decode_loop(raw_q, queues, 3, max_batch=4))
+        while not raw_q.empty() or sum(q.qsize() for q in queues.values()) < 4:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        return {symbol: [q.get_nowait()[0] for _ in range(q.qsize())] for symbol, q in queues.items()}
+
+    routed = asyncio.run(run())
+    # ramki pary bez kolejki (DOGEUSDT) są pomijane
+    assert routed == {"BTCUSDT": [books[0][0], books[3][0]], "ETHUSDT": [books[1][0], books[4][0]]}
+
+    symbols = [f"s{idx}usdt" for idx in range(10)]
+    # 10 ramek/s × 10 ms = 0.1 rdzenia na parę -> 7 par na proces przy budżecie 0.7
+    plan = live.plan_shards(symbols, 3, tick_cost=0.01)
+    assert plan == [[s.upper() for s in symbols[0::2]], [s.upper() for s in symbols[1::2]]]
+    assert live.plan_shards(symbols, 3, tick_cost=1e-6) == [[s.upper() for s in symbols]]
+    assert [len(part) for part in live.plan_shards(symbols, 3, shards=3)] == [4, 3, 3]
+    assert len(live.plan_shards(symbols[:2], 3, shards=8)) == 2
+
+
+def test_local_binance_stand_in_streams_recordings(tmp_path):
+    pytest.importorskip("numpy")
+    import json
+    import random
+
+    from elbotto.data.recorder import DepthRecorder
+    from elbotto_ob.stream.binance_ws_local import StreamFeed, collect_recordings, parse_streams
+
+    assert parse_streams("/stream?streams=btcusdt@depth5@100ms/ethusdt@bookTicker") == (
+        ["btcusdt@depth5@100ms", "ethusdt@bookTicker"], True
+    )
+    assert parse_streams("/ws/btcusdt@depth10") == (["btcusdt@depth10"], False)
+    for bad in ("/ws/btcusdt@trade", "/stream?streams=", "/other/btcusdt@depth5"):
+        with pytest.raises(ValueError):
+            parse_streams(bad)
+
+    books = _depth_books(6)
+    _write_lob_csv(tmp_path / "BTCUSDT_depth3_20240304_08.csv", books[:3])
+    with DepthRecorder(tmp_path / "BTCUSDT_depth3_20240304_09.elbrec", "BTCUSDT", 3, codec="zlib") as recorder:
+        for book in books[3:]:
+            recorder.append_book(*book)
+    _write_lob_csv(tmp_path / "ETHUSDT_depth3_20240304_08.csv", books[:2])
+    (tmp_path / "notes.txt").write_text("x", encoding="utf-8")
+    groups = collect_recordings(tmp_path)
+    assert {key: [p.name for p in paths] for key, paths in groups.items()} == {
+        "BTCUSDT": ["BTCUSDT_depth3_20240304_08.csv", "BTCUSDT_depth3_20240304_09.elbrec"],
+        "ETHUSDT": ["ETHUSDT_depth3_20240304_08.csv"],
+    }
+
+    feed = StreamFeed("btcusdt@depth5@100ms", groups["BTCUSDT"], loop=False)
+    messages = [json.loads(msg) for msg in iter(feed.next_message, None)]
+    assert [m["lastUpdateId"] for m in messages] == list(range(1001, 1007))
+    assert [m["bids"] for m in messages] == [[[f"{p:.8f}", f"{q:.8f}"] for p, q in bids] for _, bids, _ in books]
+    assert feed.sent == 6 and feed.interval == pytest.approx(0.1)
+
+    ticker = StreamFeed("btcusdt@bookTicker", groups["BTCUSDT"], combined=True)
+    first = json.loads(ticker.next_message())
+    (bid, bid_qty), (ask, ask_qty) = books[0][1][0], books[0][2][0]
+    assert first == {"stream": "btcusdt@bookTicker", "data": {"u": 1001, "s": "BTCUSDT", "b": f"{bid:.8f}", "B": f"{bid_qty:.8f}",
+                                                               "a": f"{ask:.8f}", "A": f"{ask_qty:.8f}"}}
+    # zapętlone nagranie wraca do pierwszej księgi
+    assert [json.loads(ticker.next_message())["data"]["u"] for _ in range(6)] == list(range(1002, 1008))
+    assert json.loads(ticker.next_message())["data"]["b"] == f"{books[1][1][0][0]:.8f}"
+
+    stale = StreamFeed("btcusdt@depth5", groups["BTCUSDT"], stale_prob=1.0, rng=random.Random(1))
+    sent = [stale.next_message() for _ in range(3)]
+    assert sent[0] == sent[1] == sent[2] and (stale.sent, stale.stale) == (3, 2)
+    assert stale.interval == pytest.approx(1.0)
+
+
+def test_featurizer_without_timestamps_and_unordered_bars(tmp_path):
+    pytest.importorskip("numpy")
+    import csv
+
+    from elbotto_ob.ob.aggregate import BarAggregator
+    from elbotto_ob.ob.featurizer import OUTPUT_COLUMNS, featurize_file
+
+    src = tmp_path / "nots.csv"
+    src.write_text("bid1,ask1,bid1_qty,ask1_qty\n100,101,1,3\n100,102,2,2\n", encoding="utf-8")
+    assert featurize_file(src, tmp_path / "raw.csv", levels=1) == 2
+    with open(tmp_path / "raw.csv", newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    assert tuple(rows[0]) == OUTPUT_COLUMNS and [r["ts"] for r in rows] == ["", ""]
+    assert float(rows[0]["mid"]) == 100.5
+    with pytest.raises(ValueError, match="ts/timestamp"):
+        featurize_file(src, tmp_path / "bars.csv", levels=1, agg_sec=1.0)
+    assert not (tmp_path / "bars.csv").exists()
+
+    feats = {name: [0.0, 0.0] for name in OUTPUT_COLUMNS}
+    agg = BarAggregator(1.0)
+    agg.push({**feats, "ts": ["1709539141000", "1709539142000"]})
+    with pytest.raises(ValueError, match="maleją"):
+        agg.push({**feats, "ts": ["1709539143000", "1709539140500"]})
+    with pytest.raises(ValueError, match="maleją"):
+        BarAggregator(1.0).push({**feats, "ts": ["1709539141000", "1709539140000"]})
+
+
+def test_decode_loop_survives_malformed_frames_and_executor_errors():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    import live_allinone as live
+
+    books = _depth_books(3)
+
+    class Flaky(ThreadPoolExecutor):
+        calls = 0
+
+        def submit(self, fn, *args):
+            Flaky.calls += 1
+            if Flaky.calls == 2:
+                raise RuntimeError("pula padła")
+            return super().submit(fn, *args)
+
+    async def run():
+        raw_q, q = asyncio.Queue(), asyncio.Queue()
+        for item in [(_depth_frame(books[0]), 1.0), ('{"bids": [["x", "1"]], "asks": [["1", "1"]]}', 2.0), ("\x00", 3.0)]:
+            raw_q.put_nowait(item)
+        stats = live.DecodeStats()
+        with Flaky(1) as pool:
+            task = asyncio.create_task(live.decode_loop(raw_q, q, 3, stats, pool, max_batch=3))
+            first = await asyncio.wait_for(q.get(), 5)
+            raw_q.put_nowait((_depth_frame(books[1]), 4.0))  # paczka z błędem puli
+            while stats.batches < 2:
+                await asyncio.sleep(0.01)
+            raw_q.put_nowait((_depth_frame(books[2]), 5.0))
+            last = await asyncio.wait_for(q.get(), 5)
+            task.cancel()
+        return first, last, stats
+
+    first, last, stats = asyncio.run(run())
+    assert (first[0], last[0]) == (books[0][0], books[2][0])
+    assert (stats.frames, stats.snapshots, stats.batches, stats.errors) == (5, 2, 3, 3)